@@ -0,0 +1,8 @@
+"""
+The async serving mode.
+
+The modules of this package mirror the handlers of people.py, notes.py and
+health.py with coroutines that run on aiohttp and query the database through
+SQLAlchemy's async engine, so one process can hold many concurrent requests
+while they wait on the database. aio_app.py is the entry point.
+"""
@@ -0,0 +1,89 @@
+import connexion
+from connexion.resolver import Resolver
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+import config
+import spec_cache
+from cache import create_cache
+from changes import create_bus
+
+# The async driver used in place of each sync driver.
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite"}
+
+
+class AsyncResolver(Resolver):
+    """
+    Resolve the operationIds of swagger.yml to the handlers of this package,
+    e.g. "people.read_one" to aio.people.read_one.
+    """
+
+    def resolve_function_from_operation_id(self, operation_id):
+        return super().resolve_function_from_operation_id(
+            f"aio.{operation_id}"
+        )
+
+
+def async_database_uri(uri):
+    """
+    Switch a database URI to the async driver of its database.
+
+    Args:
+        uri: The database URI of the sync app.
+
+    Returns:
+        The URL to create the async engine with.
+    """
+    url = make_url(uri)
+    drivername = ASYNC_DRIVERS.get(url.drivername, url.drivername)
+    return url.set(drivername=drivername)
+
+
+def create_app(settings=None):
+    """
+    Create the async app serving swagger.yml.
+
+    The app shares its settings with the sync app. The async engine, the
+    session factory, the response cache and the change bus are stored on
+    the aiohttp application, where handlers find them through
+    ``request.config_dict``.
+
+    Args:
+        settings: Optional settings overriding those of config.app.
+
+    Returns:
+        A connexion AioHttpApp.
+    """
+    settings = {**config.app.config, **(settings or {})}
+    uri = settings["SQLALCHEMY_DATABASE_URI"]
+
+    app = connexion.AioHttpApp(__name__, specification_dir=config.basedir)
+    app.add_api(
+        spec_cache.load(
+            config.basedir / "swagger.yml", settings["OPENAPI_SPEC_CACHE"]
+        ),
+        resolver=AsyncResolver(),
+        pass_context_arg_name="request",
+    )
+
+    options = config.engine_options(uri)
+    if options:
+        # aiosqlite defaults to NullPool for database files, which would
+        # open a connection, and run the pragmas, for every request.
+        options["poolclass"] = AsyncAdaptedQueuePool
+    engine = create_async_engine(async_database_uri(uri), **options)
+    config.apply_sqlite_pragmas(engine.sync_engine, settings["SQLITE_PRAGMAS"])
+    config.engines.add(engine.sync_engine)
+    app.app["config"] = settings
+    app.app["engine"] = engine
+    app.app["db"] = async_sessionmaker(engine, expire_on_commit=False)
+    app.app["cache"] = create_cache(settings)
+    app.app["changes"] = create_bus(settings)
+    app.app.on_cleanup.append(dispose_engine)
+    return app
+
+
+async def dispose_engine(application):
+    """Close the pooled database connections when the app shuts down."""
+    await application["engine"].dispose()
@@ -0,0 +1,28 @@
+import batch
+
+
+async def create(session, model, rows, errors, mode):
+    """
+    Insert a batch of rows like batch.create(), on an async session.
+
+    Args:
+        session: The AsyncSession.
+        model: The SQLAlchemy model class to insert into.
+        rows: The loaded rows, with None for invalid items.
+        errors: A dict mapping the index of each invalid item to its errors.
+        mode: "atomic" or "partial".
+
+    Returns:
+        A tuple of the response body and status code.
+    """
+    rejected = batch.reject(rows, errors, mode)
+    if rejected is not None:
+        return rejected
+
+    valid = [row for row in rows if row is not None]
+    new_ids = []
+    if valid:
+        result = await session.execute(batch.insert_statement(model), valid)
+        new_ids = sorted(result.scalars())
+        await session.commit()
+    return batch.result(rows, errors, new_ids), 201
@@ -0,0 +1,66 @@
+import asyncio
+
+from aiohttp import web
+
+from changes import HEARTBEAT, pending, preamble, resume_point
+
+
+async def stream(request, timeout=None):
+    """
+    Stream the changes to people and notes as Server-Sent Events, like
+    changes.stream().
+
+    The stream waits for events on the event loop, without holding a thread.
+
+    Args:
+        request: The aiohttp request.
+        timeout: The seconds after which the stream ends, instead of
+            CHANGES_STREAM_TIMEOUT. 0 sends the missed events and ends.
+
+    Returns:
+        The aiohttp StreamResponse, once the stream has ended.
+    """
+    config = request.config_dict["config"]
+    bus = request.config_dict["changes"]
+    if timeout is None:
+        timeout = config["CHANGES_STREAM_TIMEOUT"]
+    heartbeat = config["CHANGES_HEARTBEAT"]
+    after = resume_point(request.headers.get("Last-Event-ID"))
+
+    response = web.StreamResponse(
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    response.content_type = "text/event-stream"
+    await response.prepare(request)
+
+    loop = asyncio.get_running_loop()
+    ready = asyncio.Event()
+
+    def notify():
+        # Events may be published from another thread.
+        loop.call_soon_threadsafe(ready.set)
+
+    bus.subscribe(notify)
+    try:
+        if after is None or not bus.issued(after):
+            after = bus.last_id()
+        await response.write(preamble(after))
+        deadline = loop.time() + timeout
+        while True:
+            ready.clear()
+            chunk, after = pending(bus, after)
+            if chunk:
+                await response.write(chunk)
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(
+                    ready.wait(), min(remaining, heartbeat)
+                )
+            except asyncio.TimeoutError:
+                await response.write(HEARTBEAT)
+    finally:
+        bus.unsubscribe(notify)
+    await response.write_eof()
+    return response
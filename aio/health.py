@@ -0,0 +1,38 @@
+from sqlalchemy.exc import OperationalError
+from werkzeug.exceptions import abort
+
+from config import pragma_values
+
+
+async def read(request):
+    """
+    Report the health of the async app, like health.read().
+
+    Args:
+        request: The aiohttp request.
+
+    Returns:
+        A JSON object with the status, the active engine profile and the
+        counters of the response cache and the change bus.
+
+    Raises:
+        503 error: If the database can't be reached.
+    """
+    engine = request.config_dict["engine"]
+    profile = {"dialect": engine.dialect.name}
+    try:
+        if engine.dialect.name == "sqlite":
+            async with engine.connect() as connection:
+                profile["pragmas"] = await connection.run_sync(pragma_values)
+    except OperationalError as error:
+        abort(503, f"Database unavailable: {error.orig}")
+    profile["pool"] = {
+        "class": type(engine.pool).__name__,
+        "status": engine.pool.status(),
+    }
+    return {
+        "status": "ok",
+        "database": profile,
+        "cache": request.config_dict["cache"].stats(),
+        "changes": request.config_dict["changes"].stats(),
+    }
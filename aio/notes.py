@@ -0,0 +1,368 @@
+from aiohttp import web
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+from werkzeug.exceptions import abort
+
+import aio.batch
+import batch
+import conditional
+import updates
+from aio.responses import (
+    aggregate,
+    encoded_response,
+    json_response,
+    not_modified,
+)
+from cache import note_key, stale_keys
+from changes import publish
+from models import Note, Person, note_schema
+from notes import (
+    NOTES_PAGE_SIZE,
+    insert_schema,
+    match_expression,
+    note_validators,
+    person_notes_filters,
+    person_notes_link,
+    person_notes_page,
+    person_notes_sources,
+    person_notes_statement,
+    person_notes_validators,
+    reject_missing_people,
+    search_page,
+    search_statement,
+    update_schema,
+)
+from serializers import dump_note, encode
+
+
+async def read_one(request, note_id):
+    """
+    Retrieve a single note based on the note_id, like notes.read_one().
+
+    Args:
+    - request: The aiohttp request.
+    - note_id: The ID of the note to be retrieved.
+
+    Returns:
+    - The serialized note, from the response cache when possible, or a 304
+      status code if the client's copy is still current.
+    - If the note does not exist, returns a 404 error message.
+    """
+    cache = request.config_dict["cache"]
+    key = note_key(note_id)
+    cached = cache.get(key) if key else None
+
+    if cached is None:
+        generation = cache.generation(key) if key else None
+        async with request.config_dict["db"]() as session:
+            note = await _get(session, note_id)
+        current = note_validators(note)
+        response = not_modified(current, request)
+        if response is not None:
+            return response
+        cached = (encode(dump_note(note)), current)
+        if key:
+            cache.set(key, cached, generation)
+        return encoded_response(cached[0], 200, conditional.headers(current))
+
+    data, current = cached
+    response = not_modified(current, request)
+    if response is not None:
+        return response
+    return encoded_response(data, 200, conditional.headers(current))
+
+
+async def update(request, note_id, note):
+    """
+    Replace the content of an existing note, like notes.update().
+
+    Args:
+    - request: The aiohttp request.
+    - note_id: The ID of the note to be updated.
+    - note: The new content to be added to the note.
+
+    Returns:
+    - The serialized updated note and a 201 status code, with the note's
+      new ETag.
+    - If the note does not exist, returns a 404 error message.
+    - If If-Match doesn't match the note's current ETag, returns a 412 error
+      message.
+    - If the content is invalid, returns the validation errors and a 422
+      status code.
+    """
+    return await _update(request, note_id, note, False, 201)
+
+
+async def patch(request, note_id, note):
+    """
+    Update only the supplied fields of an existing note, like notes.patch().
+
+    Args:
+    - request: The aiohttp request.
+    - note_id: The ID of the note to be updated.
+    - note: The fields to change.
+
+    Returns:
+    - The serialized updated note and a 200 status code, with the note's
+      new ETag.
+    - If the note does not exist, returns a 404 error message.
+    - If If-Match doesn't match the note's current ETag, returns a 412 error
+      message.
+    - If a field is invalid, returns the validation errors and a 422 status
+      code.
+    """
+    return await _update(request, note_id, note, True, 200)
+
+
+async def _update(request, note_id, fields, partial, status):
+    """
+    Validate the fields of a PUT or PATCH body and apply them with a single
+    UPDATE statement, like notes._update().
+
+    Args:
+    - request: The aiohttp request.
+    - note_id: The ID of the note to be updated.
+    - fields: The raw request body.
+    - partial: True to validate only the supplied fields.
+    - status: The status code of a successful update.
+
+    Returns:
+    - The response of the update.
+    """
+    values, errors = updates.load(update_schema, fields, partial)
+    if errors:
+        return {"errors": errors}, 422
+    async with request.config_dict["db"]() as session:
+        if "If-Match" in request.headers:
+            connection = await session.connection()
+            await connection.run_sync(conditional.begin_write)
+            existing_note = await session.get(Note, note_id)
+            if existing_note is None:
+                abort(404, f"Note with ID {note_id} not found")
+            conditional.require_match(
+                note_validators(existing_note), request.headers
+            )
+
+        statement = updates.update_statement(Note, note_id, values)
+        row = (await session.execute(statement)).one_or_none()
+        if row is None:
+            abort(404, f"Note with ID {note_id} not found")
+        await session.commit()
+    request.config_dict["cache"].delete(
+        *stale_keys([row.person_id], [row.id])
+    )
+    publish("note.updated", [dump_note(row)], request.config_dict["changes"])
+    headers = conditional.headers(note_validators(row))
+    return dump_note(row), status, headers
+
+
+async def delete(request, note_id):
+    """
+    Delete an existing note, like notes.delete().
+
+    Args:
+    - request: The aiohttp request.
+    - note_id: The ID of the note to be deleted.
+
+    Returns:
+    - If the note exists, returns a 204 status code and a success message.
+    - If the note does not exist, returns a 404 error message.
+    - If If-Match doesn't match the note's current ETag, returns a 412 error
+      message.
+    """
+    async with request.config_dict["db"]() as session:
+        if "If-Match" in request.headers:
+            connection = await session.connection()
+            await connection.run_sync(conditional.begin_write)
+        existing_note = await _get(session, note_id)
+        conditional.require_match(
+            note_validators(existing_note), request.headers
+        )
+
+        deleted = {
+            "id": existing_note.id,
+            "person_id": existing_note.person_id,
+        }
+        await session.delete(existing_note)
+        await session.commit()
+    request.config_dict["cache"].delete(
+        *stale_keys([deleted["person_id"]], [note_id])
+    )
+    publish("note.deleted", [deleted], request.config_dict["changes"])
+    return web.Response(status=204)
+
+
+async def create(request, note):
+    """
+    Create a new note, like notes.create().
+
+    Args:
+    - request: The aiohttp request.
+    - note: The note data to be used to create the new note.
+
+    Returns:
+    - If the person exists, returns the serialized new note and a 201 status
+      code.
+    - If the person does not exist, returns a 404 error message.
+    """
+    person_id = note.get("person_id")
+    async with request.config_dict["db"]() as session:
+        person = await session.scalar(
+            select(Person.id).where(Person.id == person_id)
+        )
+        if person is None:
+            abort(404, f"Person not found for ID: {person_id}")
+
+        new_note = note_schema.load(note, transient=True)
+        new_note.person_id = person
+        session.add(new_note)
+        await session.commit()
+    request.config_dict["cache"].delete(*stale_keys([person_id]))
+    payload = dump_note(new_note)
+    publish("note.created", [payload], request.config_dict["changes"])
+    return payload, 201
+
+
+async def create_batch(request, notes, mode="atomic"):
+    """
+    Create many notes with a single INSERT statement, like
+    notes.create_batch().
+
+    Args:
+    - request: The aiohttp request.
+    - notes: A list of note data, each with a person_id and content.
+    - mode: "atomic" or "partial".
+
+    Returns:
+    - A JSON object with the new IDs in request order and the errors of the
+      invalid notes, including notes whose person does not exist.
+    """
+    rows, errors = batch.validate(insert_schema, notes)
+
+    person_ids = {row.get("person_id") for row in rows if row is not None}
+    async with request.config_dict["db"]() as session:
+        existing = set(
+            await session.scalars(
+                select(Person.id).where(Person.id.in_(person_ids))
+            )
+        )
+        reject_missing_people(rows, errors, existing)
+        body, status = await aio.batch.create(
+            session, Note, rows, errors, mode
+        )
+    request.config_dict["cache"].delete(
+        *stale_keys({row["person_id"] for row in rows if row is not None})
+    )
+    changes = request.config_dict["changes"]
+    publish("note.created", batch.created(rows, body), changes)
+    return body, status
+
+
+async def search(request, q, limit=20, offset=0):
+    """
+    Search note content with the full-text index, like notes.search().
+
+    Args:
+    - request: The aiohttp request.
+    - q: The words to search for. A word ending in * matches as a prefix.
+    - limit: The maximum number of notes to return.
+    - offset: The number of matching notes to skip.
+
+    Returns:
+    - A list of serialized notes, each with a highlighted "snippet" and its
+      bm25 "rank", where lower is better.
+    """
+    expression = match_expression(q)
+    if not expression:
+        return json_response([])
+
+    async with request.config_dict["db"]() as session:
+        try:
+            result = await session.execute(
+                search_statement(expression, limit, offset)
+            )
+        except OperationalError as error:
+            abort(400, f"Invalid search query: {error.orig}")
+        rows = result.all()
+
+    base_url = str(request.url.with_query(None))
+    results, headers = search_page(base_url, rows, q, limit, offset)
+    return json_response(results, 200, headers)
+
+
+async def read_by_person(
+    request,
+    person_id,
+    limit=NOTES_PAGE_SIZE,
+    cursor=None,
+    since=None,
+    until=None,
+    count=False,
+):
+    """
+    Retrieve a page of a person's notes, newest first, like
+    notes.read_by_person().
+
+    Args:
+    - request: The aiohttp request.
+    - person_id: The ID of the person.
+    - limit: The maximum number of notes to return.
+    - cursor: The cursor of the page, or None for the first page.
+    - since, until: The ISO 8601 bounds of the time range, or None.
+    - count: Return the number of matching notes instead of a page.
+
+    Returns:
+    - A list of serialized notes, or an object with the "count" of matching
+      notes, or a 304 status code if the client's copy is still current.
+    - If the person does not exist, returns a 404 error message.
+    - If a cursor or datetime is invalid, returns a 400 error message.
+    """
+    criteria, position = person_notes_filters(person_id, cursor, since, until)
+    async with request.config_dict["db"]() as session:
+        stats = await aggregate(
+            session, *person_notes_sources(person_id, criteria)
+        )
+        current = person_notes_validators(
+            person_id, (limit, cursor, since, until, count), stats
+        )
+        if current is None:
+            abort(404, f"Person with ID {person_id} not found")
+        response = not_modified(current, request)
+        if response is not None:
+            return response
+
+        headers = conditional.headers(current)
+        if count:
+            return json_response({"count": stats[1][0]}, 200, headers)
+        result = await session.execute(
+            person_notes_statement(criteria, position, limit)
+        )
+        rows = result.all()
+
+    results, next_cursor = person_notes_page(rows, limit)
+    if next_cursor is not None:
+        base_url = str(request.url.with_query(None))
+        headers["Link"] = person_notes_link(
+            base_url, limit, next_cursor, since, until
+        )
+    return json_response(results, 200, headers)
+
+
+async def _get(session, note_id):
+    """
+    Load a note by its ID.
+
+    Args:
+    - session: The AsyncSession.
+    - note_id: The ID of the note.
+
+    Returns:
+    - The Note.
+
+    Raises:
+    - 404 error: If the note does not exist.
+    """
+    note = await session.scalar(select(Note).where(Note.id == note_id))
+    if note is None:
+        abort(404, f"Note with ID {note_id} not found")
+    return note
@@ -0,0 +1,452 @@
+from aiohttp import web
+from sqlalchemy import select
+from werkzeug.exceptions import abort
+
+import aio.batch
+import batch
+import conditional
+import deletes
+import updates
+from aio.responses import (
+    aggregate,
+    encoded_response,
+    json_response,
+    not_modified,
+)
+from cache import person_key, stale_keys
+from changes import publish
+from models import Note, Person, load_notes, person_schema
+from notes import NOTES_PAGE_SIZE, person_notes_statement
+from people import (
+    STREAM_CHUNK_SIZE,
+    STREAM_THRESHOLD,
+    dump_note_page,
+    encode_chunk,
+    insert_schema,
+    next_link,
+    notes_statement,
+    page_boundary_statement,
+    page_fields,
+    page_sources,
+    page_validators,
+    person_sources,
+    person_validators,
+    update_schema,
+    updated_person,
+)
+from serializers import columns, dump_people, dump_person, encode
+
+
+async def read_all(
+    request, limit=100, after=0, fields=None, include=("notes",)
+):
+    """
+    Retrieve a page of people, like people.read_all().
+
+    Args:
+        request: The aiohttp request.
+        limit: The maximum number of people to return.
+        after: Only return people whose ID is greater than this cursor.
+        fields: An optional list of field names to include for each person.
+        include: The relationships to include.
+
+    Returns:
+        A JSON list of people, or a 304 if the client's copy of the page is
+        still current.
+
+    Raises:
+        400 error: If ``fields`` names a field the person schema doesn't have.
+    """
+    only, include = page_fields(fields, _include(request, include))
+
+    async with request.config_dict["db"]() as session:
+        result = await session.execute(page_boundary_statement(limit, after))
+        ids = result.all()
+        last_id = ids[0].id if len(ids) == 2 else None
+        sources = page_sources(after, last_id, include)
+        stats = await aggregate(session, *sources)
+        current = page_validators(after, last_id, only, include, stats)
+        response = not_modified(current, request)
+        if response is not None:
+            return response
+
+        if "notes" in include:
+            statement = select(Person)
+        else:
+            names = columns(Person) if only is None else only or ("id",)
+            statement = select(*(getattr(Person, name) for name in names))
+        statement = statement.where(Person.id > after).order_by(Person.id)
+        if last_id is not None:
+            statement = statement.where(Person.id <= last_id)
+        else:
+            statement = statement.limit(limit)
+
+        headers = conditional.headers(current)
+        if last_id is not None:
+            base_url = str(request.url.with_query(None))
+            headers["Link"] = next_link(
+                base_url, limit, last_id, fields, include
+            )
+
+        if limit < STREAM_THRESHOLD:
+            if "notes" in include:
+                statement = statement.options(_load_notes(request))
+            result = await session.execute(statement)
+            if "notes" in include:
+                result = result.unique().scalars()
+            payload = dump_people(result.all(), only, include)
+            return json_response(payload, 200, headers)
+
+        if "notes" in include:
+            statement = statement.options(load_notes("selectin"))
+        return await _stream_people(
+            request, session, statement, only, include, headers
+        )
+
+
+async def _stream_people(request, session, statement, only, include, headers):
+    """
+    Stream the people selected by a statement as a chunked JSON list.
+
+    Args:
+        request: The aiohttp request.
+        session: The AsyncSession to stream the rows with.
+        statement: The statement selecting the people of the page.
+        only: The column names to dump, or None for all of them.
+        include: The relationships to include.
+        headers: The response headers.
+
+    Returns:
+        The aiohttp StreamResponse, once the whole list has been written.
+    """
+    response = web.StreamResponse(headers=headers)
+    response.content_type = "application/json"
+    await response.prepare(request)
+
+    result = await session.stream(
+        statement.execution_options(yield_per=STREAM_CHUNK_SIZE)
+    )
+    if "notes" in include:
+        result = result.scalars()
+    separator = b"["
+    async for people in result.partitions():
+        await response.write(separator + encode_chunk(people, only, include))
+        separator = b","
+    await response.write(b"[]" if separator == b"[" else b"]")
+    await response.write_eof()
+    return response
+
+
+async def create(request, person):
+    """
+    Create a new person, like people.create().
+
+    Args:
+        request: The aiohttp request.
+        person: A dictionary containing the information for the new person.
+
+    Returns:
+        A JSON representation of the newly created person.
+    """
+    new_person = person_schema.load(person, transient=True)
+    async with request.config_dict["db"]() as session:
+        session.add(new_person)
+        await session.commit()
+        await session.refresh(new_person, ["notes"])
+    changes = request.config_dict["changes"]
+    publish("person.created", [dump_person(new_person, include=())], changes)
+    return dump_person(new_person), 201
+
+
+async def create_batch(request, people, mode="atomic"):
+    """
+    Create many people with a single INSERT statement, like
+    people.create_batch().
+
+    Args:
+        request: The aiohttp request.
+        people: A list of dictionaries with the information for each person.
+        mode: "atomic" or "partial".
+
+    Returns:
+        A JSON object with the new IDs in request order and the errors of
+        the invalid people.
+    """
+    rows, errors = batch.validate(insert_schema, people)
+    async with request.config_dict["db"]() as session:
+        body, status = await aio.batch.create(
+            session, Person, rows, errors, mode
+        )
+    changes = request.config_dict["changes"]
+    publish("person.created", batch.created(rows, body), changes)
+    return body, status
+
+
+async def read_one(request, person_id, include=("notes",)):
+    """
+    Retrieve a single person by their ID, like people.read_one().
+
+    Args:
+        request: The aiohttp request.
+        person_id: The ID of the person to retrieve.
+        include: The relationships to include.
+
+    Returns:
+        A JSON representation of the requested person, served from the
+        response cache when possible, or a 304 if the client's copy is still
+        current.
+
+    Raises:
+        404 error: If the person with the given ID does not exist.
+    """
+    include = _include(request, include)
+    cache = request.config_dict["cache"]
+    key = person_key(person_id, include)
+    cached = cache.get(key) if key else None
+
+    if cached is None:
+        generation = cache.generation(key) if key else None
+        async with request.config_dict["db"]() as session:
+            stats = await aggregate(session, *person_sources(person_id))
+            current = person_validators(person_id, stats)
+            if current is None:
+                abort(404, f"Person with ID {person_id} not found")
+            response = not_modified(current, request)
+            if response is not None:
+                return response
+
+            statement = select(Person).where(Person.id == person_id)
+            if "notes" in include and "note_page" not in include:
+                statement = statement.options(_load_notes(request))
+            result = await session.execute(statement)
+            person = result.unique().scalar_one_or_none()
+            if person is None:
+                abort(404, f"Person with ID {person_id} not found")
+            if "note_page" in include:
+                statement = person_notes_statement(
+                    [Note.person_id == person_id], None, NOTES_PAGE_SIZE
+                )
+                rows = (await session.execute(statement)).all()
+                payload = dump_note_page(person, stats, rows)
+            else:
+                payload = dump_person(person, include=include)
+            cached = (encode(payload), current)
+        if key:
+            cache.set(key, cached, generation)
+
+    data, current = cached
+    response = not_modified(current, request)
+    if response is not None:
+        return response
+    return encoded_response(data, 200, conditional.headers(current))
+
+
+async def update(request, person_id, person):
+    """
+    Replace the fields of an existing person, like people.update().
+
+    Args:
+        request: The aiohttp request.
+        person_id: The ID of the person to update.
+        person: A dictionary containing the updated information for the person.
+
+    Returns:
+        A JSON representation of the updated person, with its new ETag, or
+        the validation errors with a 422.
+
+    Raises:
+        404 error: If the person with the given ID does not exist.
+        412 error: If If-Match doesn't match the person's current ETag.
+    """
+    fields = {"fname": None, **person}
+    return await _update(request, person_id, fields, False, 201)
+
+
+async def patch(request, person_id, person):
+    """
+    Update only the supplied fields of an existing person, like
+    people.patch().
+
+    Args:
+        request: The aiohttp request.
+        person_id: The ID of the person to update.
+        person: A dictionary with the fields to change.
+
+    Returns:
+        A JSON representation of the updated person, with its new ETag, or
+        the validation errors with a 422.
+
+    Raises:
+        404 error: If the person with the given ID does not exist.
+        412 error: If If-Match doesn't match the person's current ETag.
+    """
+    return await _update(request, person_id, person, True, 200)
+
+
+async def _update(request, person_id, fields, partial, status):
+    """
+    Validate the fields of a PUT or PATCH body and apply them with a single
+    UPDATE statement, like people._update().
+
+    Args:
+        request: The aiohttp request.
+        person_id: The ID of the person to update.
+        fields: The raw request body.
+        partial: True to validate only the supplied fields.
+        status: The status code of a successful update.
+
+    Returns:
+        The response of the update.
+    """
+    values, errors = updates.load(update_schema, fields, partial)
+    if errors:
+        return {"errors": errors}, 422
+    async with request.config_dict["db"]() as session:
+        if "If-Match" in request.headers:
+            connection = await session.connection()
+            await connection.run_sync(conditional.begin_write)
+            stats = await aggregate(session, *person_sources(person_id))
+            current = person_validators(person_id, stats)
+            if current is None:
+                abort(404, f"Person with ID {person_id} not found")
+            conditional.require_match(current, request.headers)
+
+        statement = updates.update_statement(Person, person_id, values)
+        row = (await session.execute(statement)).one_or_none()
+        if row is None:
+            abort(404, f"Person with ID {person_id} not found")
+        notes = (await session.execute(notes_statement(person_id))).all()
+        await session.commit()
+    request.config_dict["cache"].delete(*stale_keys(person_ids=[row.id]))
+    changes = request.config_dict["changes"]
+    publish("person.updated", [dump_person(row, include=())], changes)
+    payload, current = updated_person(person_id, row, notes)
+    return payload, status, conditional.headers(current)
+
+
+async def delete(request, person_id):
+    """
+    Delete an existing person with a single DELETE statement, like
+    people.delete().
+
+    Args:
+        request: The aiohttp request.
+        person_id: The ID of the person to delete.
+
+    Returns:
+        A success message if the person was successfully deleted.
+
+    Raises:
+        404 error: If the person with the given ID does not exist.
+        412 error: If If-Match doesn't match the person's current ETag.
+    """
+    async with request.config_dict["db"]() as session:
+        if "If-Match" in request.headers:
+            connection = await session.connection()
+            await connection.run_sync(conditional.begin_write)
+            stats = await aggregate(session, *person_sources(person_id))
+            current = person_validators(person_id, stats)
+            if current is None:
+                abort(404, f"Person with ID {person_id} not found")
+            conditional.require_match(current, request.headers)
+
+        person_ids, note_ids = await _delete(session, Person.id == person_id)
+        if not person_ids:
+            abort(404, f"Person with ID {person_id} not found")
+        await session.commit()
+    request.config_dict["cache"].delete(*stale_keys(person_ids, note_ids))
+    changes = request.config_dict["changes"]
+    deleted = [{"id": row_id} for row_id in person_ids]
+    publish("person.deleted", deleted, changes)
+    return web.Response(text=f"{person_id} successfully deleted", status=200)
+
+
+async def purge(request, purge, batch_size=deletes.PURGE_BATCH_SIZE):
+    """
+    Delete many people, by ID or by age, in batches, like people.purge().
+
+    Args:
+        request: The aiohttp request.
+        purge: A dictionary with either ``ids`` or ``before``.
+        batch_size: The number of people deleted per batch.
+
+    Returns:
+        A JSON object with the number of people deleted and of batches run.
+
+    Raises:
+        400 error: If the body has both or neither of ``ids`` and
+            ``before``, or if ``before`` isn't a datetime.
+    """
+    try:
+        ids, before = deletes.purge_selection(purge)
+    except ValueError as error:
+        abort(400, str(error))
+
+    cache = request.config_dict["cache"]
+    changes = request.config_dict["changes"]
+    deleted = batches = 0
+    async with request.config_dict["db"]() as session:
+        for condition in deletes.purge_conditions(ids, before, batch_size):
+            person_ids, note_ids = await _delete(session, condition)
+            await session.commit()
+            cache.delete(*stale_keys(person_ids, note_ids))
+            publish(
+                "person.deleted",
+                [{"id": row_id} for row_id in person_ids],
+                changes,
+            )
+            deleted += len(person_ids)
+            batches += 1
+            if deletes.is_last(ids, person_ids, batch_size):
+                break
+    return {"deleted": deleted, "batches": batches}, 200
+
+
+async def _delete(session, condition):
+    """
+    Delete the people matching a condition with a single DELETE statement.
+
+    Args:
+        session: The AsyncSession.
+        condition: The criterion selecting the people.
+
+    Returns:
+        A tuple of the IDs of the deleted people and of their notes.
+    """
+    result = await session.execute(deletes.note_ids_statement(condition))
+    note_ids = result.scalars().all()
+    result = await session.execute(deletes.delete_statement(condition))
+    return result.scalars().all(), note_ids
+
+
+def _include(request, include):
+    """
+    Restore an empty ``include`` parameter.
+
+    Connexion's aiohttp API drops blank query values, so ``include=`` would
+    arrive as the default instead of as an empty list.
+
+    Args:
+        request: The aiohttp request.
+        include: The include argument passed by Connexion.
+
+    Returns:
+        The relationships to include.
+    """
+    if request.query.get("include") == "":
+        return ()
+    return include
+
+
+def _load_notes(request):
+    """
+    Build the loader option for Person.notes configured for the app.
+
+    Args:
+        request: The aiohttp request.
+
+    Returns:
+        A loader option to pass to Select.options().
+    """
+    config = request.config_dict["config"]
+    return load_notes(config.get("NOTES_LOADING_STRATEGY", "selectin"))
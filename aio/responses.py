@@ -0,0 +1,71 @@
+from aiohttp import web
+
+import conditional
+from serializers import encode
+
+
+def encoded_response(data, status=200, headers=None):
+    """
+    Build a JSON response from an already encoded body.
+
+    Args:
+        data: The JSON body as bytes.
+        status: The HTTP status code.
+        headers: Optional response headers.
+
+    Returns:
+        An aiohttp Response.
+    """
+    return web.Response(
+        body=data,
+        status=status,
+        headers=headers,
+        content_type="application/json",
+    )
+
+
+def json_response(payload, status=200, headers=None):
+    """
+    Build a JSON response, encoded like the sync app's responses.
+
+    Args:
+        payload: The data to encode.
+        status: The HTTP status code.
+        headers: Optional response headers.
+
+    Returns:
+        An aiohttp Response.
+    """
+    return encoded_response(encode(payload), status, headers)
+
+
+def not_modified(current, request):
+    """
+    Check the conditional headers of a request.
+
+    Args:
+        current: The Validators of the requested resource.
+        request: The aiohttp request.
+
+    Returns:
+        A 304 response if the client's copy is still current, else None.
+    """
+    if not conditional.is_fresh(current, request.headers):
+        return None
+    return web.Response(status=304, headers=conditional.headers(current))
+
+
+async def aggregate(session, *sources):
+    """
+    Run conditional.aggregate() on an async session.
+
+    Args:
+        session: The AsyncSession.
+        *sources: Tuples of a model followed by the criteria selecting the
+            collection's rows.
+
+    Returns:
+        A list of (count, newest timestamp) tuples, one per source.
+    """
+    result = await session.execute(conditional.aggregate_statement(*sources))
+    return conditional.aggregate_pairs(result.one())
@@ -0,0 +1,17 @@
+"""
+The async entry point: the API of flask_app.py served by aiohttp with an
+async database driver, for workloads with many concurrent connections.
+
+Run it with ``python aio_app.py``, or under gunicorn with
+``gunicorn aio_app:application --worker-class aiohttp.GunicornWebWorker``.
+The home page is only served by the sync app in flask_app.py.
+"""
+from aio.app import create_app
+
+app = create_app()
+
+# The underlying aiohttp application, which gunicorn's aiohttp worker finds.
+application = app.app
+
+if __name__ == "__main__":
+    app.run(port=8000)
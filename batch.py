@@ -0,0 +1,137 @@
+from marshmallow import ValidationError
+from sqlalchemy import insert
+
+from config import db
+
+# "atomic" inserts nothing if any item is invalid, "partial" inserts the
+# valid items and reports the invalid ones.
+MODES = ("atomic", "partial")
+
+
+def validate(schema, items):
+    """
+    Validate and deserialize a list of items with a schema.
+
+    Args:
+        schema: A schema created with ``load_instance=False``, so that items
+            are loaded as plain dicts ready to be inserted.
+        items: The raw items from the request body.
+
+    Returns:
+        A tuple of the loaded rows, with None for invalid items, and a dict
+        mapping the index of each invalid item to its error messages.
+    """
+    rows = []
+    errors = {}
+    for index, item in enumerate(items):
+        try:
+            rows.append(schema.load(item))
+        except ValidationError as error:
+            rows.append(None)
+            errors[index] = error.messages
+    return rows, errors
+
+
+def create(model, rows, errors, mode):
+    """
+    Insert a batch of rows in a single statement and transaction.
+
+    Args:
+        model: The SQLAlchemy model class to insert into.
+        rows: The loaded rows, with None for invalid items.
+        errors: A dict mapping the index of each invalid item to its errors.
+        mode: "atomic" or "partial".
+
+    Returns:
+        A tuple of the response body and status code. The body lists the new
+        IDs in request order, with None for items that weren't inserted, and
+        the per-item errors, if any.
+    """
+    rejected = reject(rows, errors, mode)
+    if rejected is not None:
+        return rejected
+
+    valid = [row for row in rows if row is not None]
+    new_ids = []
+    if valid:
+        new_ids = sorted(
+            db.session.execute(insert_statement(model), valid).scalars()
+        )
+        db.session.commit()
+    return result(rows, errors, new_ids), 201
+
+
+def reject(rows, errors, mode):
+    """
+    Build the 422 response of an atomic batch with invalid items.
+
+    Args:
+        rows: The loaded rows, with None for invalid items.
+        errors: A dict mapping the index of each invalid item to its errors.
+        mode: "atomic" or "partial".
+
+    Returns:
+        A tuple of the response body and status code, or None if the valid
+        rows should be inserted.
+    """
+    if errors and mode == "atomic":
+        return result(rows, errors, ()), 422
+    return None
+
+
+def insert_statement(model):
+    """
+    Build the INSERT statement of a batch, returning the new IDs.
+
+    Asking SQLAlchemy to keep RETURNING in parameter order makes it fall
+    back to one INSERT per row on SQLite. Row IDs are assigned in increasing
+    order as the rows are inserted, so callers sort the returned IDs to
+    restore the request order instead.
+
+    Args:
+        model: The SQLAlchemy model class to insert into.
+
+    Returns:
+        An insert statement to execute with the list of valid rows.
+    """
+    return insert(model).returning(model.id)
+
+
+def result(rows, errors, new_ids):
+    """
+    Build the response body of a batch.
+
+    Args:
+        rows: The loaded rows, with None for invalid items.
+        errors: A dict mapping the index of each invalid item to its errors.
+        new_ids: The sorted IDs of the inserted rows.
+
+    Returns:
+        A dict with the IDs in request order, None for items that weren't
+        inserted, and the list of per-item errors.
+    """
+    new_ids = iter(new_ids)
+    ids = [None if row is None else next(new_ids, None) for row in rows]
+    error_list = [
+        {"index": index, "errors": messages}
+        for index, messages in sorted(errors.items())
+    ]
+    return {"ids": ids, "errors": error_list}
+
+
+def created(rows, body):
+    """
+    List the rows a batch inserted, for publishing.
+
+    Args:
+        rows: The loaded rows, with None for invalid items.
+        body: The response body built by result().
+
+    Returns:
+        A list of the inserted rows with their new IDs.
+    """
+    return [
+        {"id": new_id, **row}
+        for row, new_id in zip(rows, body["ids"])
+        if new_id is not None
+    ]
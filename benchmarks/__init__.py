@@ -0,0 +1,17 @@
+"""
+Benchmarks for the MAIGEE APP.
+
+Run a benchmark module from the project root, e.g.
+``python -m benchmarks.serializers``:
+
+- ``benchmarks.dataset`` generates a deterministic database of people and
+  notes.
+- ``benchmarks.micro`` times the schemas, primary key lookups and commits.
+- ``benchmarks.load`` sends concurrent HTTP requests to every operation in
+  swagger.yml.
+- ``benchmarks.wire`` measures the bytes on the wire and the time to first
+  byte of large responses, with and without compression.
+- ``benchmarks.startup`` times the import, app creation and first request
+  of fresh processes.
+- ``benchmarks.report`` compares the JSON reports of two runs.
+"""
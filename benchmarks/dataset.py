@@ -0,0 +1,183 @@
+"""
+Generate a deterministic synthetic dataset of people and notes.
+
+The same arguments always produce the same rows, IDs and timestamps, so
+benchmark runs on separately generated databases can be compared.
+
+Usage: python -m benchmarks.dataset DATABASE_URI [people] [notes_per_person]
+           [seed]
+"""
+import random
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+
+from config import app, apply_sqlite_pragmas, db
+from migrations import rebuild_note_search, transaction, upgrade
+from models import NOTE_SEARCH_DDL, Note, Person
+
+# Rows inserted per executemany() call and per transaction.
+CHUNK_SIZE = 10000
+
+# The triggers keeping the note search index up to date.
+SEARCH_TRIGGERS = ("note_fts_insert", "note_fts_delete", "note_fts_update")
+
+# The timestamp of the first generated row. Later rows are a second apart.
+EPOCH = datetime(2022, 1, 1)
+
+FIRST_NAMES = [
+    "Tooth", "Knecht", "Easter", "Ada", "Grace", "Alan", "Edsger",
+    "Barbara", "Donald", "Margaret", "Ken", "Dennis", "Guido", "Linus",
+]
+
+WORDS = [
+    "brush", "teeth", "meal", "friend", "gram", "better", "year", "deeds",
+    "inflation", "rate", "eggs", "hide", "remember", "call", "birthday",
+    "gift", "visit", "garden", "letter", "recipe", "holiday", "train",
+    "weather", "coffee", "book", "music", "photo", "dinner", "walk", "plan",
+]
+
+
+def person_rows(people, rng):
+    """
+    Generate the rows of the person table.
+
+    Args:
+        people: The number of people.
+        rng: The random.Random instance to draw names from.
+
+    Yields:
+        A dict per person, with IDs starting at 1.
+    """
+    for person_id in range(1, people + 1):
+        yield {
+            "id": person_id,
+            "lname": f"Last{person_id}",
+            "fname": rng.choice(FIRST_NAMES),
+            "timestamp": EPOCH + timedelta(seconds=person_id),
+        }
+
+
+def note_rows(people, notes_per_person, rng):
+    """
+    Generate the rows of the note table.
+
+    Args:
+        people: The number of people the notes belong to.
+        notes_per_person: The number of notes each person gets.
+        rng: The random.Random instance to draw the content from.
+
+    Yields:
+        A dict per note, with IDs starting at 1.
+    """
+    note_id = 0
+    for person_id in range(1, people + 1):
+        for _ in range(notes_per_person):
+            note_id += 1
+            yield {
+                "id": note_id,
+                "person_id": person_id,
+                "content": " ".join(rng.choices(WORDS, k=rng.randint(3, 12))),
+                "timestamp": EPOCH + timedelta(seconds=note_id),
+            }
+
+
+def chunks(rows, size):
+    """
+    Split an iterable of rows into lists of at most size rows.
+
+    Args:
+        rows: The rows.
+        size: The maximum number of rows per list.
+
+    Yields:
+        Lists of rows.
+    """
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def generate(engine, people, notes_per_person, seed=0, progress=None):
+    """
+    Create the schema and bulk-insert a synthetic dataset.
+
+    The note search triggers are dropped while the notes are inserted and
+    the search index is rebuilt once at the end, which is much faster than
+    indexing row by row.
+
+    Args:
+        engine: The engine of an empty database.
+        people: The number of people to insert.
+        notes_per_person: The number of notes each person gets.
+        seed: The seed of the random content.
+        progress: An optional callable receiving a message per chunk.
+
+    Returns:
+        A tuple of the number of people and notes inserted.
+    """
+    db.metadata.create_all(engine)
+    # upgrade() reports on stdout, which benchmarks keep for their reports.
+    with redirect_stdout(sys.stderr):
+        upgrade(engine)
+    rng = random.Random(seed)
+
+    with transaction(engine) as connection:
+        for name in SEARCH_TRIGGERS:
+            connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+    try:
+        for model, rows in (
+            (Person, person_rows(people, rng)),
+            (Note, note_rows(people, notes_per_person, rng)),
+        ):
+            inserted = 0
+            for chunk in chunks(rows, CHUNK_SIZE):
+                with engine.begin() as connection:
+                    connection.execute(insert(model.__table__), chunk)
+                inserted += len(chunk)
+                if progress:
+                    progress(f"{model.__tablename__}: {inserted} rows")
+    finally:
+        with transaction(engine) as connection:
+            # NOTE_SEARCH_DDL creates the search table and then its triggers.
+            for statement in NOTE_SEARCH_DDL[1:]:
+                connection.exec_driver_sql(statement)
+            rebuild_note_search(connection)
+    return people, people * notes_per_person
+
+
+def main(uri, people=1000, notes_per_person=5, seed=0):
+    """
+    Generate a dataset into the database at uri.
+
+    Args:
+        uri: The database URI. The database should be empty.
+        people: The number of people to insert.
+        notes_per_person: The number of notes each person gets.
+        seed: The seed of the random content.
+    """
+    engine = create_engine(uri)
+    apply_sqlite_pragmas(engine, app.config["SQLITE_PRAGMAS"])
+    started = time.perf_counter()
+    generate(
+        engine,
+        people,
+        notes_per_person,
+        seed,
+        progress=lambda message: print(message, file=sys.stderr),
+    )
+    elapsed = time.perf_counter() - started
+    rows = people * (notes_per_person + 1)
+    print(f"{rows} rows in {elapsed:.1f} s ({rows / elapsed:.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1], *(int(arg) for arg in sys.argv[2:]))
@@ -0,0 +1,422 @@
+"""
+An in-process HTTP load driver for every operation in swagger.yml.
+
+The operations run one after the other, in the order of the spec, against a
+generated database. Each one is sent a fixed number of requests from
+concurrent clients, and the report lists its latency percentiles and
+throughput as JSON, which benchmarks.report can compare between runs.
+
+Usage: python -m benchmarks.load --help
+"""
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlencode
+
+import yaml
+from flask import json
+from sqlalchemy import create_engine
+
+import config
+from benchmarks import dataset, report
+from flask_app import create_app
+
+# The HTTP methods an OpenAPI path item can define operations for.
+METHODS = ("get", "put", "post", "delete", "patch")
+
+# The number of items sent to each batch endpoint per request.
+BATCH_SIZE = 10
+
+
+def operations(spec_path=config.basedir / "swagger.yml"):
+    """
+    List the operations of an OpenAPI spec in the order they appear.
+
+    Args:
+        spec_path: The spec file.
+
+    Returns:
+        A list of (operationId, method, path template) tuples, with the
+        server's base path prepended to the paths.
+    """
+    with open(spec_path) as file:
+        spec = yaml.safe_load(file)
+    base_path = spec["servers"][0]["url"]
+    return [
+        (operation["operationId"], method.upper(), base_path + path)
+        for path, item in spec["paths"].items()
+        for method, operation in item.items()
+        if method in METHODS
+    ]
+
+
+class Workload:
+    """
+    Build the requests of every operation from the generated dataset.
+
+    Each operation has a method named after its operationId, with the dot
+    replaced by an underscore, returning the path parameters, the query
+    parameters and the JSON body of one request. Deletes remove the rows
+    the create operations made, so the dataset seen by the reads stays
+    intact.
+
+    Args:
+        people: The number of generated people.
+        notes_per_person: The number of notes each person has.
+        seed: The seed of the random IDs and content.
+    """
+
+    def __init__(self, people, notes_per_person, seed=0):
+        self.people = people
+        self.notes = people * notes_per_person
+        self.rng = random.Random(seed)
+        self.created = {"people": [], "notes": []}
+        self.lock = threading.Lock()
+
+    def request(self, operation_id, method, path):
+        """
+        Build one request of an operation.
+
+        Args:
+            operation_id: The operationId.
+            method: The HTTP method.
+            path: The path template.
+
+        Returns:
+            A tuple of the method, the URL and the JSON body, or None.
+
+        Raises:
+            LookupError: If the workload has no method for the operation.
+        """
+        build = getattr(self, operation_id.replace(".", "_"), None)
+        if build is None:
+            raise LookupError(f"Add a Workload method for {operation_id}")
+        path_params, query, body = build()
+        url = path.format(**path_params)
+        if query:
+            url += f"?{urlencode(query)}"
+        return method, url, body
+
+    def record(self, operation_id, body):
+        """
+        Remember the IDs of the people and notes created by a request.
+
+        Args:
+            operation_id: The operationId of the request.
+            body: The decoded response body.
+        """
+        kind, name = operation_id.split(".")
+        if name == "create":
+            ids = [body["id"]]
+        elif name == "create_batch":
+            ids = [new_id for new_id in body["ids"] if new_id is not None]
+        else:
+            return
+        with self.lock:
+            self.created[kind].extend(ids)
+
+    def take(self, kind):
+        """
+        Pick a row to delete, preferring rows created during the run.
+
+        Args:
+            kind: "people" or "notes".
+
+        Returns:
+            The ID of the row.
+        """
+        if self.created[kind]:
+            return self.created[kind].pop()
+        # Without created rows, delete generated ones from the end.
+        taken = getattr(self, kind)
+        setattr(self, kind, taken - 1)
+        return taken
+
+    def person_id(self):
+        return self.rng.randint(1, self.people)
+
+    def note_id(self):
+        return self.rng.randint(1, self.notes)
+
+    def content(self):
+        return " ".join(self.rng.choices(dataset.WORDS, k=8))
+
+    def people_read_all(self):
+        after = self.rng.randint(0, max(0, self.people - 100))
+        return {}, {"limit": 100, "after": after}, None
+
+    def people_create(self):
+        return {}, {}, {"lname": "Load", "fname": f"Driver{self.person_id()}"}
+
+    def people_create_batch(self):
+        people = [{"lname": "Batch", "fname": "Driver"}] * BATCH_SIZE
+        return {}, {"mode": "partial"}, people
+
+    def people_read_one(self):
+        return {"person_id": self.person_id()}, {}, None
+
+    def people_update(self):
+        body = {"lname": "Updated", "fname": f"Driver{self.person_id()}"}
+        return {"person_id": self.person_id()}, {}, body
+
+    def people_patch(self):
+        body = {"fname": f"Patched{self.person_id()}"}
+        return {"person_id": self.person_id()}, {}, body
+
+    def people_delete(self):
+        return {"person_id": self.take("people")}, {}, None
+
+    def people_purge(self):
+        # A small purge, so the run doesn't use up the generated people.
+        ids = [self.take("people") for _ in range(2)]
+        return {}, {}, {"ids": ids}
+
+    def notes_create(self):
+        body = {"person_id": str(self.person_id()), "content": self.content()}
+        return {}, {}, body
+
+    def notes_create_batch(self):
+        notes = [
+            {"person_id": str(self.person_id()), "content": self.content()}
+            for _ in range(BATCH_SIZE)
+        ]
+        return {}, {"mode": "partial"}, notes
+
+    def notes_search(self):
+        return {}, {"q": self.rng.choice(dataset.WORDS)}, None
+
+    def notes_read_by_person(self):
+        return {"person_id": self.person_id()}, {"limit": 10}, None
+
+    def notes_read_one(self):
+        return {"note_id": self.note_id()}, {}, None
+
+    def notes_update(self):
+        return {"note_id": self.note_id()}, {}, {"content": self.content()}
+
+    def notes_patch(self):
+        return {"note_id": self.note_id()}, {}, {"content": self.content()}
+
+    def notes_delete(self):
+        return {"note_id": self.take("notes")}, {}, None
+
+    def health_read(self):
+        return {}, {}, None
+
+    def changes_stream(self):
+        # A stream that ends at once, instead of holding a client.
+        return {}, {"timeout": 0}, None
+
+
+def drive_sync(uri, selected, workload, requests, concurrency):
+    """
+    Load the sync app from a pool of threads, one test client each.
+
+    Args:
+        uri: The database URI.
+        selected: The (operationId, method, path) tuples to run.
+        workload: The Workload building the requests.
+        requests: The number of requests per operation.
+        concurrency: The number of concurrent clients.
+
+    Returns:
+        A dict mapping each operationId to its summary.
+    """
+    app = create_app({"SQLALCHEMY_DATABASE_URI": uri}).app
+    local = threading.local()
+
+    def send(request):
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+        method, url, body = request
+        started = time.perf_counter()
+        response = local.client.open(url, method=method, json=body)
+        data = response.get_data()
+        return time.perf_counter() - started, response.status_code, data
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        return drive(
+            selected,
+            workload,
+            requests,
+            lambda batch: list(pool.map(send, batch)),
+        )
+
+
+async def drive_async(uri, selected, workload, requests, concurrency):
+    """
+    Load the async app of aio_app.py with concurrent tasks.
+
+    Args:
+        uri: The database URI.
+        selected: The (operationId, method, path) tuples to run.
+        workload: The Workload building the requests.
+        requests: The number of requests per operation.
+        concurrency: The number of concurrent requests.
+
+    Returns:
+        A dict mapping each operationId to its summary.
+    """
+    from aiohttp.test_utils import TestClient, TestServer
+
+    from aio.app import create_app
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": uri})
+    client = TestClient(TestServer(app.app))
+    await client.start_server()
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    async def send(request):
+        method, url, body = request
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            data = await response.read()
+            return time.perf_counter() - started, response.status, data
+
+    async def send_all(batch):
+        return await asyncio.gather(*(send(request) for request in batch))
+
+    try:
+        # drive() is synchronous, so it runs in a thread that hands each
+        # batch of requests back to the event loop.
+        return await loop.run_in_executor(
+            None,
+            drive,
+            selected,
+            workload,
+            requests,
+            lambda batch: asyncio.run_coroutine_threadsafe(
+                send_all(batch), loop
+            ).result(),
+        )
+    finally:
+        await client.close()
+
+
+def drive(selected, workload, requests, send_all):
+    """
+    Run every selected operation and summarize its responses.
+
+    Args:
+        selected: The (operationId, method, path) tuples to run.
+        workload: The Workload building the requests.
+        requests: The number of requests per operation.
+        send_all: A callable sending a list of requests concurrently and
+            returning a (latency, status, body) tuple for each.
+
+    Returns:
+        A dict mapping each operationId to its summary.
+    """
+    results = {}
+    for operation_id, method, path in selected:
+        print(f"Running {operation_id}", file=sys.stderr)
+        batch = [
+            workload.request(operation_id, method, path)
+            for _ in range(requests)
+        ]
+        started = time.perf_counter()
+        responses = send_all(batch)
+        elapsed = time.perf_counter() - started
+
+        errors = 0
+        for latency, status, body in responses:
+            if status >= 400:
+                errors += 1
+            elif method == "POST":
+                workload.record(operation_id, json.loads(body))
+        results[operation_id] = report.summarize(
+            [latency for latency, status, body in responses], elapsed, errors
+        )
+    return results
+
+
+def main(argv=None):
+    """
+    Generate a database, load every operation and write the JSON report.
+
+    Args:
+        argv: The command line arguments, defaulting to sys.argv.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.load", description=__doc__.split("\n\n")[0]
+    )
+    parser.add_argument("--mode", choices=("sync", "async"), default="sync")
+    parser.add_argument("--people", type=int, default=10000)
+    parser.add_argument("--notes-per-person", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--operation",
+        action="append",
+        help="Only run this operationId. Can be given more than once.",
+    )
+    parser.add_argument("--output", help="Write the report to this file.")
+    args = parser.parse_args(argv)
+
+    spec_operations = operations()
+    unknown = set(args.operation or ()).difference(
+        operation_id for operation_id, _, _ in spec_operations
+    )
+    if unknown:
+        parser.error(f"unknown operationId {', '.join(sorted(unknown))}")
+    selected = [
+        operation
+        for operation in spec_operations
+        if not args.operation or operation[0] in args.operation
+    ]
+    missing = [
+        operation_id
+        for operation_id, _, _ in selected
+        if not hasattr(Workload, operation_id.replace(".", "_"))
+    ]
+    if missing:
+        parser.error(f"no Workload method for {', '.join(missing)}")
+    workload = Workload(args.people, args.notes_per_person, args.seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        uri = f"sqlite:///{Path(directory) / 'benchmark.db'}"
+        engine = create_engine(uri)
+        config.apply_sqlite_pragmas(
+            engine, config.app.config["SQLITE_PRAGMAS"]
+        )
+        dataset.generate(
+            engine, args.people, args.notes_per_person, args.seed
+        )
+        engine.dispose()
+
+        drive_mode = drive_sync if args.mode == "sync" else drive_async
+        results = drive_mode(
+            uri, selected, workload, args.requests, args.concurrency
+        )
+        if args.mode == "async":
+            results = asyncio.run(results)
+
+    report.write(
+        {
+            "environment": report.environment(
+                benchmark="load",
+                mode=args.mode,
+                people=args.people,
+                notes_per_person=args.notes_per_person,
+                requests=args.requests,
+                concurrency=args.concurrency,
+                seed=args.seed,
+                response_cache=config.app.config["RESPONSE_CACHE"],
+            ),
+            "results": results,
+        },
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
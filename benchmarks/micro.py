@@ -0,0 +1,147 @@
+"""
+Microbenchmarks of the schemas, primary key lookups and commit paths.
+
+Every benchmark runs on a generated database file and reports its latency
+percentiles and throughput as JSON, which benchmarks.report can compare
+between runs.
+
+Usage: python -m benchmarks.micro [people] [notes_per_person] [iterations]
+           [output.json]
+"""
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from flask import Flask
+
+from benchmarks import dataset, report
+from config import app as default_app, apply_sqlite_pragmas, db
+from models import Person, load_notes, note_schema, person_schema
+
+
+def benchmarks(people, rng):
+    """
+    Define the microbenchmarks.
+
+    Args:
+        people: The number of people in the database.
+        rng: The random.Random instance picking the rows to work on.
+
+    Returns:
+        A dict mapping benchmark names to functions running one iteration.
+    """
+    def random_id():
+        return rng.randint(1, people)
+
+    person = Person.query.options(load_notes()).get(1)
+    note = person.notes[0]
+    person_data = {"lname": "Benchmark", "fname": "Micro"}
+    note_data = {"person_id": 1, "content": "A benchmark note"}
+
+    def get_person():
+        Person.query.get(random_id())
+        db.session.expunge_all()
+
+    def get_person_with_notes():
+        Person.query.options(load_notes()).get(random_id())
+        db.session.expunge_all()
+
+    def insert_person():
+        db.session.add(person_schema.load(person_data, session=db.session))
+        db.session.commit()
+
+    def update_person():
+        existing = Person.query.get(random_id())
+        existing.fname = f"Micro{rng.random()}"
+        db.session.commit()
+        db.session.expunge_all()
+
+    def insert_note():
+        db.session.add(note_schema.load(note_data, session=db.session))
+        db.session.commit()
+
+    return {
+        "schema.dump.person": lambda: person_schema.dump(person),
+        "schema.dump.note": lambda: note_schema.dump(note),
+        "schema.load.person": lambda: person_schema.load(
+            person_data, session=db.session, transient=True
+        ),
+        "schema.load.note": lambda: note_schema.load(
+            note_data, session=db.session, transient=True
+        ),
+        "query.get.person": get_person,
+        "query.get.person_with_notes": get_person_with_notes,
+        "commit.insert.person": insert_person,
+        "commit.update.person": update_person,
+        "commit.insert.note": insert_note,
+    }
+
+
+def run(func, iterations):
+    """
+    Time every iteration of a benchmark.
+
+    Args:
+        func: The function running one iteration.
+        iterations: The number of iterations.
+
+    Returns:
+        The benchmark's summary, see report.summarize().
+    """
+    func()  # Warm up caches and compiled statements.
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        before = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - before)
+    return report.summarize(latencies, time.perf_counter() - started)
+
+
+def main(people=10000, notes_per_person=5, iterations=1000, output=None):
+    """
+    Generate a database and run every microbenchmark on it.
+
+    Args:
+        people: The number of people to generate.
+        notes_per_person: The number of notes each person gets.
+        iterations: The number of iterations per benchmark.
+        output: The file to write the JSON report to, or None for stdout.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        uri = f"sqlite:///{Path(directory) / 'benchmark.db'}"
+        app = Flask(__name__)
+        app.config.update(default_app.config)
+        app.config["SQLALCHEMY_DATABASE_URI"] = uri
+        db.init_app(app)
+        with app.app_context():
+            apply_sqlite_pragmas(db.engine, app.config["SQLITE_PRAGMAS"])
+            dataset.generate(db.engine, people, notes_per_person)
+
+            rng = random.Random(0)
+            results = {}
+            for name, func in benchmarks(people, rng).items():
+                print(f"Running {name}", file=sys.stderr)
+                results[name] = run(func, iterations)
+            db.session.remove()
+            db.engine.dispose()
+
+    report.write(
+        {
+            "environment": report.environment(
+                benchmark="micro",
+                people=people,
+                notes_per_person=notes_per_person,
+                iterations=iterations,
+            ),
+            "results": results,
+        },
+        output,
+    )
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(*(int(arg) for arg in args[:3]), *args[3:4])
@@ -0,0 +1,166 @@
+"""
+Summarize benchmark timings as JSON reports and compare reports.
+
+Usage: python -m benchmarks.report BASELINE.json CURRENT.json
+"""
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+import sqlalchemy
+
+# The summary fields compared between reports, and whether higher is better.
+COMPARED = {
+    "throughput": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "bytes": False,
+}
+
+
+def percentile(ordered, fraction):
+    """
+    Pick a percentile from sorted values with the nearest-rank method.
+
+    Args:
+        ordered: The values, sorted in increasing order.
+        fraction: The percentile as a fraction, e.g. 0.95.
+
+    Returns:
+        The value at the percentile.
+    """
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, elapsed, errors=0):
+    """
+    Summarize the latencies of a benchmark.
+
+    Args:
+        latencies: The duration of every call, in seconds.
+        elapsed: The wall-clock time the calls took together, in seconds.
+        errors: The number of calls that failed.
+
+    Returns:
+        A dict with the call count, errors, throughput in calls per second
+        and the mean, p50, p95, p99 and max latencies in milliseconds.
+    """
+    ordered = sorted(latencies)
+    if not ordered:
+        return {"requests": 0, "errors": errors}
+    milliseconds = [latency * 1000 for latency in ordered]
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "throughput": round(len(ordered) / elapsed, 1),
+        "mean_ms": round(sum(milliseconds) / len(milliseconds), 3),
+        "p50_ms": round(percentile(milliseconds, 0.50), 3),
+        "p95_ms": round(percentile(milliseconds, 0.95), 3),
+        "p99_ms": round(percentile(milliseconds, 0.99), 3),
+        "max_ms": round(milliseconds[-1], 3),
+    }
+
+
+def environment(**settings):
+    """
+    Describe the environment a benchmark ran in.
+
+    Args:
+        **settings: The benchmark's own settings, e.g. the dataset size.
+
+    Returns:
+        A dict with the settings, the versions and the git commit.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        **settings,
+        "commit": commit,
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlalchemy": sqlalchemy.__version__,
+        "platform": platform.platform(),
+    }
+
+
+def write(report, path=None):
+    """
+    Write a report as JSON.
+
+    Args:
+        report: The report dict.
+        path: The file to write to, or None for stdout.
+    """
+    text = json.dumps(report, indent=2, sort_keys=True) + "\n"
+    if path is None:
+        sys.stdout.write(text)
+    else:
+        with open(path, "w") as file:
+            file.write(text)
+
+
+def compare(baseline, current):
+    """
+    Compare the results of two reports.
+
+    Args:
+        baseline: The report to compare against.
+        current: The new report.
+
+    Returns:
+        A dict mapping each benchmark present in both reports to the ratio
+        of every compared field, current over baseline.
+    """
+    ratios = {}
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if not before:
+            continue
+        ratios[name] = {
+            field: round(result[field] / before[field], 3)
+            for field in COMPARED
+            if result.get(field) and before.get(field)
+        }
+    return ratios
+
+
+def main(baseline_path, current_path):
+    """
+    Print how the results of a report changed against a baseline.
+
+    Args:
+        baseline_path: The baseline report file.
+        current_path: The new report file.
+    """
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+    with open(current_path) as file:
+        current = json.load(file)
+
+    print(f"{'benchmark':<28}" + "".join(f"{field:>12}" for field in COMPARED))
+    for name, ratios in compare(baseline, current).items():
+        cells = []
+        for field, higher_is_better in COMPARED.items():
+            ratio = ratios.get(field)
+            if ratio is None:
+                cells.append(f"{'-':>12}")
+                continue
+            better = ratio > 1 if higher_is_better else ratio < 1
+            mark = "+" if better and ratio != 1 else " "
+            cells.append(f"{ratio:>10.2f}x{mark}")
+        print(f"{name:<28}" + "".join(cells))
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:3])
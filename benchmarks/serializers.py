@@ -0,0 +1,80 @@
+"""
+Compare the marshmallow schemas with the fast-path serializers.
+
+Usage: python -m benchmarks.serializers [people] [notes_per_person]
+"""
+import sys
+import timeit
+
+from flask import Flask, json
+
+from config import db
+from models import Note, Person, load_notes, people_schema
+from serializers import dump_people, encode
+
+
+def populate(people, notes_per_person):
+    """
+    Fill the database with generated people and notes.
+
+    Args:
+        people: The number of people to create.
+        notes_per_person: The number of notes each person gets.
+    """
+    for index in range(people):
+        person = Person(lname=f"Last{index}", fname=f"First{index}")
+        for number in range(notes_per_person):
+            person.notes.append(Note(content=f"Note {number} of {index}"))
+        db.session.add(person)
+    db.session.commit()
+
+
+def measure(label, func, repeat=5):
+    """
+    Time a function and print the best run.
+
+    Args:
+        label: The name printed next to the timing.
+        func: The function to time.
+        repeat: How many times to run it.
+
+    Returns:
+        The best run time in seconds.
+    """
+    best = min(timeit.repeat(func, number=1, repeat=repeat))
+    print(f"{label:<28} {best * 1000:9.2f} ms")
+    return best
+
+
+def main(people=1000, notes_per_person=5):
+    """
+    Run the serializer benchmarks against an in-memory database.
+
+    Args:
+        people: The number of people to generate.
+        notes_per_person: The number of notes each person gets.
+    """
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        populate(people, notes_per_person)
+        rows = Person.query.options(load_notes("selectin")).all()
+
+        print(f"{people} people with {notes_per_person} notes each")
+        slow = measure("marshmallow dump", lambda: people_schema.dump(rows))
+        fast = measure("fast dump", lambda: dump_people(rows))
+        print(f"{'speedup':<28} {slow / fast:9.1f} x")
+
+        payload = people_schema.dump(rows)
+        slow = measure(
+            "flask json encode",
+            lambda: (json.dumps(payload, indent=2) + "\n").encode(),
+        )
+        fast = measure("fast encode", lambda: encode(payload))
+        print(f"{'speedup':<28} {slow / fast:9.1f} x")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
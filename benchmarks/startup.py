@@ -0,0 +1,111 @@
+"""
+Benchmark how long a fresh process takes to serve its first request.
+
+Every run starts a new interpreter, which imports flask_app, creates the app
+with create_app() and sends it one request. The import time, the app
+creation time, the first request time and the wall-clock time of the whole
+process are reported as JSON, with the spec loaded from its compiled
+artifact and parsed from the YAML. Importing flask_app loads no module the
+app is built from, so ``python -X importtime -c "import flask_app;
+flask_app.create_app()"`` breaks the startup time down by module.
+
+Usage: python -m benchmarks.startup [runs] [output.json]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks import report
+from config import basedir
+from spec_cache import compile_spec
+
+# The script each run executes in a new interpreter.
+CHILD = """
+import json, time
+started = time.perf_counter()
+import flask_app
+imported = time.perf_counter()
+app = flask_app.create_app()
+created = time.perf_counter()
+status = app.app.test_client().get("/api/health").status_code
+answered = time.perf_counter()
+print(json.dumps({
+    "status": status,
+    "import": imported - started,
+    "create_app": created - imported,
+    "first_request": answered - created,
+}))
+"""
+
+# The phases every run reports, in order.
+PHASES = ("import", "create_app", "first_request", "process")
+
+
+def run(spec_cache):
+    """
+    Start a process and time its phases.
+
+    Args:
+        spec_cache: The MAIGEE_OPENAPI_SPEC_CACHE of the process, or "" to
+            parse the YAML.
+
+    Returns:
+        A dict mapping each phase to its duration in seconds.
+    """
+    env = {**os.environ, "MAIGEE_OPENAPI_SPEC_CACHE": spec_cache}
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        cwd=basedir,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    elapsed = time.perf_counter() - started
+    timings = json.loads(result.stdout.splitlines()[-1])
+    if timings.pop("status") != 200:
+        raise RuntimeError(f"The first request failed:\n{result.stderr}")
+    return {**timings, "process": elapsed}
+
+
+def main(runs=10, output=None):
+    """
+    Time the startup of fresh processes with and without the spec artifact.
+
+    Args:
+        runs: The number of processes to start per mode.
+        output: The file to write the JSON report to, or None for stdout.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        artifact = str(Path(directory) / "swagger.json")
+        compile_spec(basedir / "swagger.yml", artifact)
+        os.environ["MAIGEE_DATABASE_URI"] = (
+            f"sqlite:///{Path(directory) / 'startup.db'}"
+        )
+        for mode, spec_cache in (("compiled", artifact), ("yaml", "")):
+            print(f"Running {mode}", file=sys.stderr)
+            runs_timings = [run(spec_cache) for _ in range(runs)]
+            for phase in PHASES:
+                durations = [timings[phase] for timings in runs_timings]
+                results[f"{mode}.{phase}"] = report.summarize(
+                    durations, sum(durations)
+                )
+
+    report.write(
+        {
+            "environment": report.environment(benchmark="startup", runs=runs),
+            "results": results,
+        },
+        output,
+    )
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(*(int(arg) for arg in args[:1]), *args[1:2])
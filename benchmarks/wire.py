@@ -0,0 +1,147 @@
+"""
+Benchmark the bytes on the wire and time to first byte of large responses.
+
+The sync app is served over real sockets by a threaded Werkzeug server on a
+generated database. Every case is requested without compression and with
+each encoding the app can produce. The compressed size of the body, the
+time to its first byte and the time to its last byte are reported as JSON,
+which benchmarks.report can compare between runs.
+
+Usage: python -m benchmarks.wire [people] [notes_per_person] [requests]
+           [output.json]
+"""
+import http.client
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from werkzeug.serving import make_server
+
+import compression
+from benchmarks import dataset, report
+from config import app as default_app, apply_sqlite_pragmas
+from flask_app import create_app
+from people import STREAM_THRESHOLD
+
+# The responses compared, by name.
+CASES = {
+    "home": "/",
+    "people.page": "/api/people?limit=100",
+    "people.streamed": f"/api/people?limit={STREAM_THRESHOLD}",
+    "static.js": "/static/js/people.js",
+}
+
+
+def fetch(port, path, encoding):
+    """
+    Request a path and time the response.
+
+    Args:
+        port: The port the app listens on.
+        path: The path and query string to request.
+        encoding: The Accept-Encoding value, or "identity".
+
+    Returns:
+        A tuple of the body size in bytes as sent, the seconds to the first
+        byte of the body and the seconds to its last byte.
+    """
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    started = time.perf_counter()
+    connection.request("GET", path, headers={"Accept-Encoding": encoding})
+    response = connection.getresponse()
+    if response.status != 200:
+        raise RuntimeError(f"GET {path} returned {response.status}")
+    size = len(response.read(1))
+    first_byte = time.perf_counter() - started
+    size += len(response.read())
+    last_byte = time.perf_counter() - started
+    connection.close()
+    return size, first_byte, last_byte
+
+
+def measure(port, path, encoding, requests):
+    """
+    Time repeated requests of a path with one encoding.
+
+    Args:
+        port: The port the app listens on.
+        path: The path and query string to request.
+        encoding: The Accept-Encoding value.
+        requests: The number of requests.
+
+    Returns:
+        A dict with the summaries of the time to first byte and to last
+        byte, each with the body size in bytes.
+    """
+    fetch(port, path, encoding)  # Warm up caches and compiled statements.
+    sizes, first_bytes, last_bytes = [], [], []
+    started = time.perf_counter()
+    for _ in range(requests):
+        size, first_byte, last_byte = fetch(port, path, encoding)
+        sizes.append(size)
+        first_bytes.append(first_byte)
+        last_bytes.append(last_byte)
+    elapsed = time.perf_counter() - started
+    size = max(sizes)
+    return {
+        "ttfb": {**report.summarize(first_bytes, elapsed), "bytes": size},
+        "total": {**report.summarize(last_bytes, elapsed), "bytes": size},
+    }
+
+
+def main(people=2000, notes_per_person=5, requests=20, output=None):
+    """
+    Generate a database and measure every case with every encoding.
+
+    Args:
+        people: The number of people to generate.
+        notes_per_person: The number of notes each person gets.
+        requests: The number of requests per case and encoding.
+        output: The file to write the JSON report to, or None for stdout.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        uri = f"sqlite:///{Path(directory) / 'benchmark.db'}"
+        engine = create_engine(uri)
+        apply_sqlite_pragmas(engine, default_app.config["SQLITE_PRAGMAS"])
+        dataset.generate(engine, people, notes_per_person)
+        engine.dispose()
+
+        application = create_app(
+            {"SQLALCHEMY_DATABASE_URI": uri, "RESPONSE_CACHE": "none"}
+        ).app
+        server = make_server("127.0.0.1", 0, application, threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            for name, path in CASES.items():
+                for encoding in ("identity", *compression.encodings()):
+                    print(f"Running {name} {encoding}", file=sys.stderr)
+                    timings = measure(server.port, path, encoding, requests)
+                    for phase, summary in timings.items():
+                        results[f"{name}.{encoding}.{phase}"] = summary
+        finally:
+            server.shutdown()
+            thread.join()
+
+    report.write(
+        {
+            "environment": report.environment(
+                benchmark="wire",
+                people=people,
+                notes_per_person=notes_per_person,
+                requests=requests,
+                encodings=compression.encodings(),
+            ),
+            "results": results,
+        },
+        output,
+    )
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(*(int(arg) for arg in args[:3]), *args[3:4])
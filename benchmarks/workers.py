@@ -0,0 +1,220 @@
+"""
+Benchmark how the throughput of the production server grows with its
+number of worker processes.
+
+The sync app is served by gunicorn, configured by gunicorn.conf.py, on a
+generated database, once per worker count. Each time, client processes with
+a keep-alive connection each request random people with their notes, and
+the latency percentiles and throughput are reported as JSON per worker
+count, which benchmarks.report can compare between runs. The response cache
+is off, so every request reads and serializes its person. Run it on a
+machine with more cores than the largest worker count plus the clients, or
+the clients compete with the workers.
+
+Usage: python -m benchmarks.workers --help
+"""
+import argparse
+import http.client
+import importlib.util
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from sqlalchemy import create_engine
+
+from benchmarks import dataset, report
+from config import app as default_app, apply_sqlite_pragmas, basedir
+
+
+def free_port():
+    """Find a port on localhost that nothing listens on."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(uri, port, workers, threads):
+    """
+    Start gunicorn and wait until it answers.
+
+    Args:
+        uri: The database URI.
+        port: The port to listen on.
+        workers: The number of worker processes.
+        threads: The number of threads per worker.
+
+    Returns:
+        The gunicorn process.
+    """
+    env = {
+        **os.environ,
+        "MAIGEE_DATABASE_URI": uri,
+        "MAIGEE_BIND": f"127.0.0.1:{port}",
+        "MAIGEE_WORKERS": str(workers),
+        "MAIGEE_THREADS": str(threads),
+        "MAIGEE_RESPONSE_CACHE": "none",
+        "MAIGEE_SLOW_QUERY_LOG": "",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn"],
+        cwd=basedir,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("gunicorn exited while starting")
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        try:
+            connection.request("GET", "/api/health")
+            if connection.getresponse().status == 200:
+                return server
+        except OSError:
+            pass
+        finally:
+            connection.close()
+        time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("gunicorn didn't answer within 30 seconds")
+
+
+def client(port, people, requests, seed):
+    """
+    Request random people over one keep-alive connection.
+
+    Args:
+        port: The port the server listens on.
+        people: The number of people in the database.
+        requests: The number of requests to send.
+        seed: The seed of the random IDs.
+
+    Returns:
+        A tuple of the latency of every request, in seconds, and the number
+        of errors.
+    """
+    rng = random.Random(seed)
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    latencies = []
+    errors = 0
+    for _ in range(requests):
+        started = time.perf_counter()
+        connection.request("GET", f"/api/people/{rng.randint(1, people)}")
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - started)
+        if response.status != 200:
+            errors += 1
+    connection.close()
+    return latencies, errors
+
+
+def run(port, people, requests, clients):
+    """
+    Load a running server from concurrent client processes.
+
+    Args:
+        port: The port the server listens on.
+        people: The number of people in the database.
+        requests: The number of requests per client.
+        clients: The number of client processes.
+
+    Returns:
+        The summary of the requests.
+    """
+    with ProcessPoolExecutor(clients) as pool:
+        # Start the clients before timing them.
+        list(pool.map(abs, range(clients)))
+        started = time.perf_counter()
+        results = list(
+            pool.map(
+                client,
+                [port] * clients,
+                [people] * clients,
+                [requests] * clients,
+                range(clients),
+            )
+        )
+        elapsed = time.perf_counter() - started
+    latencies = [latency for result, _ in results for latency in result]
+    errors = sum(errors for _, errors in results)
+    return report.summarize(latencies, elapsed, errors)
+
+
+def main(argv=None):
+    """
+    Generate a database, load gunicorn with each worker count and write the
+    JSON report.
+
+    Args:
+        argv: The command line arguments, defaulting to sys.argv.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.workers",
+        description=__doc__.split("\n\n")[0],
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4],
+        help="The worker counts to compare.",
+    )
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--people", type=int, default=10000)
+    parser.add_argument("--notes-per-person", type=int, default=5)
+    parser.add_argument("--output", help="Write the report to this file.")
+    args = parser.parse_args(argv)
+    if importlib.util.find_spec("gunicorn") is None:
+        parser.error("gunicorn is not installed")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        uri = f"sqlite:///{Path(directory) / 'benchmark.db'}"
+        engine = create_engine(uri)
+        apply_sqlite_pragmas(engine, default_app.config["SQLITE_PRAGMAS"])
+        dataset.generate(engine, args.people, args.notes_per_person)
+        engine.dispose()
+
+        for workers in args.workers:
+            port = free_port()
+            server = start_server(uri, port, workers, args.threads)
+            try:
+                summary = run(port, args.people, args.requests, args.clients)
+            finally:
+                server.terminate()
+                server.wait()
+            results[f"workers.{workers}"] = summary
+            print(
+                f"{workers} workers: {summary['throughput']} requests/s",
+                file=sys.stderr,
+            )
+
+    report.write(
+        {
+            "environment": report.environment(
+                benchmark="workers",
+                threads=args.threads,
+                clients=args.clients,
+                requests=args.requests,
+                people=args.people,
+                notes_per_person=args.notes_per_person,
+                cpus=os.cpu_count(),
+            ),
+            "results": results,
+        },
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
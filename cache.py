@@ -0,0 +1,319 @@
+"""
+Read-through cache for serialized read_one responses.
+
+Handlers look up the encoded JSON payload of a person or note, along with
+its validators, by ID before touching the database, and writes invalidate
+the affected entries after they commit. A handler that misses takes the
+key's generation before loading the payload, and the cache drops the
+payload if the key was invalidated since, as it may have been loaded
+before the write committed. Entries also expire after a TTL.
+
+The home page keeps the rendered HTML of each person card in a second
+cache, the fragment cache. Its keys carry the version of the person and of
+their notes, so a write makes the old entry unreachable instead of
+invalidating it, and it ages out of the cache.
+
+The in-process LRUCache is the default backend. A shared backend, e.g. one
+backed by Redis or memcached, only needs to implement the Cache interface
+and be added to BACKENDS.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+# The include variants person payloads are cached under, in order of
+# precedence.
+PERSON_VARIANTS = ("note_page", "notes", "")
+
+
+class Cache:
+    """
+    The interface every cache backend implements.
+
+    Keys are strings. The values of the response cache are tuples of an
+    encoded response body, as bytes, and the Validators it was served with,
+    those of the fragment cache rendered HTML.
+    """
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss."""
+        raise NotImplementedError
+
+    def generation(self, key):
+        """
+        Return the generation of key, which delete() changes, to pass to
+        set() once the value is loaded.
+        """
+        raise NotImplementedError
+
+    def set(self, key, value, generation=None):
+        """
+        Store a value under key, unless a generation is given and key was
+        deleted since it was taken.
+        """
+        raise NotImplementedError
+
+    def delete(self, *keys):
+        """Remove the given keys, ignoring ones that aren't cached."""
+        raise NotImplementedError
+
+    def stats(self):
+        """Return a dict of counters describing the cache's activity."""
+        raise NotImplementedError
+
+
+class NullCache(Cache):
+    """A backend that caches nothing, used to switch caching off."""
+
+    def __init__(self, maxsize=0, ttl=0):
+        self.misses = 0
+
+    def get(self, key):
+        self.misses += 1
+        return None
+
+    def generation(self, key):
+        return 0
+
+    def set(self, key, value, generation=None):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def stats(self):
+        return {"backend": "none", "misses": self.misses}
+
+
+class LRUCache(Cache):
+    """
+    A thread-safe, in-process cache bounded by entry count and age.
+
+    Args:
+        maxsize: The maximum number of entries. The least recently used
+            entry is evicted to make room for a new one.
+        ttl: The number of seconds an entry stays valid.
+    """
+
+    def __init__(self, maxsize=10000, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Generations are ticks of a clock that every delete() advances.
+        # The tick of the last deletion of up to maxsize keys is kept, and
+        # forgetting an older one raises the floor below which every
+        # generation is taken to be outdated.
+        self.clock = 0
+        self.deleted = OrderedDict()
+        self.floor = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.outdated = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def generation(self, key):
+        with self.lock:
+            return self.clock
+
+    def set(self, key, value, generation=None):
+        with self.lock:
+            if generation is not None and (
+                generation < self.floor
+                or self.deleted.get(key, 0) > generation
+            ):
+                self.outdated += 1
+                return
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self.lock:
+            self.clock += 1
+            for key in keys:
+                self.entries.pop(key, None)
+                self.deleted[key] = self.clock
+                self.deleted.move_to_end(key)
+            while len(self.deleted) > self.maxsize:
+                _, self.floor = self.deleted.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "backend": "lru",
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "outdated": self.outdated,
+            }
+
+
+BACKENDS = {"lru": LRUCache, "none": NullCache}
+
+
+def response_cache():
+    """
+    Return the response cache of the current app, creating it on first use.
+
+    The backend is chosen by the RESPONSE_CACHE setting and sized by
+    RESPONSE_CACHE_SIZE and RESPONSE_CACHE_TTL.
+
+    Returns:
+        A Cache instance.
+    """
+    app = current_app
+    cache = app.extensions.get("response_cache")
+    if cache is None:
+        cache = app.extensions.setdefault(
+            "response_cache", create_cache(app.config)
+        )
+    return cache
+
+
+def fragment_cache():
+    """
+    Return the fragment cache of the current app, creating it on first use.
+
+    The backend is chosen by the FRAGMENT_CACHE setting and sized by
+    FRAGMENT_CACHE_SIZE and FRAGMENT_CACHE_TTL.
+
+    Returns:
+        A Cache instance.
+    """
+    app = current_app
+    cache = app.extensions.get("fragment_cache")
+    if cache is None:
+        cache = app.extensions.setdefault(
+            "fragment_cache", create_cache(app.config, "FRAGMENT_CACHE")
+        )
+    return cache
+
+
+def create_cache(config, setting="RESPONSE_CACHE"):
+    """
+    Create a cache backend from its settings.
+
+    Args:
+        config: The app config.
+        setting: The name of the setting choosing the backend, which also
+            prefixes the _SIZE and _TTL settings.
+
+    Returns:
+        A Cache instance.
+    """
+    backend = BACKENDS[config.get(setting, "lru")]
+    return backend(
+        maxsize=config.get(f"{setting}_SIZE", 10000),
+        ttl=config.get(f"{setting}_TTL", 60),
+    )
+
+
+def person_key(person_id, include=("notes",)):
+    """
+    Build the cache key of a person payload.
+
+    Args:
+        person_id: The person ID, as an int or a numeric string.
+        include: The relationships included in the payload.
+
+    Returns:
+        The key, or None if the ID isn't an integer and can't be cached.
+    """
+    try:
+        person_id = int(person_id)
+    except (TypeError, ValueError):
+        return None
+    variant = next((name for name in PERSON_VARIANTS if name in include), "")
+    return f"person:{person_id}:{variant}"
+
+
+def note_key(note_id):
+    """
+    Build the cache key of a note payload.
+
+    Args:
+        note_id: The note ID, as an int or a numeric string.
+
+    Returns:
+        The key, or None if the ID isn't an integer and can't be cached.
+    """
+    try:
+        return f"note:{int(note_id)}"
+    except (TypeError, ValueError):
+        return None
+
+
+def fragment_key(version):
+    """
+    Build the fragment cache key of a person card.
+
+    Args:
+        version: A row with the person's id and timestamp, and the count and
+            newest timestamp of their notes, which change with every write
+            to the person or their notes.
+
+    Returns:
+        The key.
+    """
+    return "fragment:person:{}:{}:{}:{}".format(
+        version.id, version.timestamp, version.notes, version.notes_modified
+    )
+
+
+def invalidate(person_ids=(), note_ids=()):
+    """
+    Remove the cached payloads of the given people and notes.
+
+    Args:
+        person_ids: The IDs of people whose payloads changed, including
+            people whose notes changed.
+        note_ids: The IDs of notes that changed.
+    """
+    response_cache().delete(*stale_keys(person_ids, note_ids))
+
+
+def stale_keys(person_ids=(), note_ids=()):
+    """
+    List the cache keys made stale by changes to people and notes.
+
+    Args:
+        person_ids: The IDs of people whose payloads changed.
+        note_ids: The IDs of notes that changed.
+
+    Returns:
+        A list of keys.
+    """
+    keys = [
+        person_key(person_id, (variant,))
+        for person_id in person_ids
+        if person_id is not None
+        for variant in PERSON_VARIANTS
+    ]
+    keys += [note_key(note_id) for note_id in note_ids]
+    return [key for key in keys if key is not None]
@@ -0,0 +1,341 @@
+"""
+Publish-subscribe bus of the changes made through the API, streamed to
+clients as Server-Sent Events by GET /api/changes.
+
+Write handlers publish an event once their transaction commits, e.g.
+"person.updated" with the new person or "note.deleted" with the IDs of the
+deleted notes. Every event gets the next ID of the bus, and the bus keeps
+the last CHANGES_HISTORY events, so a client reconnecting with the
+Last-Event-ID of the last event it received is sent the ones it missed. A
+client whose last event the bus issued but no longer keeps is sent a
+"reset" event instead, on which it reloads the page. An ID the bus never
+issued, e.g. one of another worker process's bus or from before a restart,
+resumes from the bus's newest event.
+
+The in-process MemoryBus is the default backend. It only reaches the
+clients connected to its own process, so several worker processes need a
+shared broker, e.g. Redis pub/sub with a stream holding the history, which
+only needs to implement the Bus interface and be added to BACKENDS.
+"""
+import threading
+import time
+from collections import deque, namedtuple
+from itertools import islice
+
+from flask import Response, current_app, request
+
+from serializers import encode_items
+
+# An event of the bus, with its data already encoded as a compact JSON list,
+# which fits on the single data line of a Server-Sent Event.
+Event = namedtuple("Event", "id name data")
+
+# The milliseconds a client waits before reconnecting to a closed stream.
+RETRY_MS = 3000
+
+# Sent on an idle stream, so proxies don't time the connection out.
+HEARTBEAT = b": keep-alive\n\n"
+
+
+class Bus:
+    """
+    The interface every change bus backend implements.
+
+    Event IDs are integers that increase by one with every event published.
+    Callbacks may be called from any thread.
+    """
+
+    def publish(self, name, items):
+        """Publish an event with a list of items and return it."""
+        raise NotImplementedError
+
+    def last_id(self):
+        """Return the ID of the newest event."""
+        raise NotImplementedError
+
+    def issued(self, event_id):
+        """
+        Return whether the bus issued an event ID, or started from it, even
+        if the event is no longer kept.
+        """
+        raise NotImplementedError
+
+    def read(self, after):
+        """
+        Return the events published after the event with the ID after, or
+        None if some of them are no longer kept.
+        """
+        raise NotImplementedError
+
+    def subscribe(self, callback):
+        """Call callback, without arguments, after every event published."""
+        raise NotImplementedError
+
+    def unsubscribe(self, callback):
+        """Stop calling a subscribed callback."""
+        raise NotImplementedError
+
+    def stats(self):
+        """Return a dict of counters describing the bus's activity."""
+        raise NotImplementedError
+
+
+class MemoryBus(Bus):
+    """
+    A thread-safe, in-process bus keeping a bounded history of events.
+
+    Args:
+        history: The number of events kept for clients to resume from.
+    """
+
+    def __init__(self, history=1000):
+        self.events = deque(maxlen=history)
+        # IDs start from the current time in microseconds, so those of
+        # another bus, e.g. from before a restart, are unlikely to be taken
+        # for this one's.
+        self.first = self.last = time.time_ns() // 1000
+        self.lock = threading.Lock()
+        self.callbacks = []
+        self.published = 0
+
+    def publish(self, name, items):
+        data = b"[%s]" % encode_items(items)
+        with self.lock:
+            self.last += 1
+            event = Event(self.last, name, data)
+            self.events.append(event)
+            self.published += 1
+            callbacks = list(self.callbacks)
+        for callback in callbacks:
+            callback()
+        return event
+
+    def last_id(self):
+        with self.lock:
+            return self.last
+
+    def issued(self, event_id):
+        with self.lock:
+            return self.first <= event_id <= self.last
+
+    def read(self, after):
+        with self.lock:
+            oldest = self.events[0].id - 1 if self.events else self.last
+            if not oldest <= after <= self.last:
+                return None
+            return list(islice(self.events, after - oldest, None))
+
+    def subscribe(self, callback):
+        with self.lock:
+            self.callbacks.append(callback)
+
+    def unsubscribe(self, callback):
+        with self.lock:
+            self.callbacks.remove(callback)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "backend": "memory",
+                "last_id": self.last,
+                "history": len(self.events),
+                "maxlen": self.events.maxlen,
+                "published": self.published,
+                "subscribers": len(self.callbacks),
+            }
+
+
+BACKENDS = {"memory": MemoryBus}
+
+
+def change_bus():
+    """
+    Return the change bus of the current app, creating it on first use.
+
+    Returns:
+        A Bus instance.
+    """
+    app = current_app
+    bus = app.extensions.get("change_bus")
+    if bus is None:
+        bus = app.extensions.setdefault("change_bus", create_bus(app.config))
+    return bus
+
+
+def create_bus(config):
+    """
+    Create a change bus backend from the CHANGE_BUS settings.
+
+    Args:
+        config: The app config.
+
+    Returns:
+        A Bus instance.
+    """
+    backend = BACKENDS[config.get("CHANGE_BUS", "memory")]
+    return backend(history=config.get("CHANGES_HISTORY", 1000))
+
+
+def publish(name, items, bus=None):
+    """
+    Publish the rows a write changed, unless it changed none.
+
+    Args:
+        name: The event name, e.g. "person.created".
+        items: The list of changed rows, as dicts.
+        bus: The bus to publish on. Defaults to the current app's.
+    """
+    if items:
+        (bus or change_bus()).publish(name, items)
+
+
+def resume_point(last_event_id):
+    """
+    Read the event a stream resumes after from a Last-Event-ID header.
+
+    Args:
+        last_event_id: The header value, or None for a new client.
+
+    Returns:
+        The event ID, None to start with the next event, or -1, which no
+        bus issues, if the header isn't an event ID.
+    """
+    if last_event_id is None:
+        return None
+    try:
+        return int(last_event_id)
+    except ValueError:
+        return -1
+
+
+def pending(bus, after):
+    """
+    Encode the events published after an event.
+
+    Args:
+        bus: The Bus.
+        after: The ID of the last event the client received.
+
+    Returns:
+        A tuple of the events as Server-Sent Events, or a "reset" event if
+        some of them are no longer kept, and the ID of the last event sent.
+    """
+    events = bus.read(after)
+    if events is None:
+        after = bus.last_id()
+        return b"id: %d\nevent: reset\ndata: {}\n\n" % after, after
+    chunk = b"".join(
+        b"id: %d\nevent: %s\ndata: %s\n\n"
+        % (event.id, event.name.encode(), event.data)
+        for event in events
+    )
+    return chunk, events[-1].id if events else after
+
+
+def preamble(after):
+    """
+    Encode the start of a stream.
+
+    The stream's starting point is sent as an event ID without an event, so
+    the client resumes from it even if it reconnects before any event.
+
+    Args:
+        after: The ID of the last event the client received.
+
+    Returns:
+        The reconnection delay and event ID fields, as bytes.
+    """
+    return b"retry: %d\nid: %d\n\n" % (RETRY_MS, after)
+
+
+def event_stream(bus, after, timeout, heartbeat):
+    """
+    Stream the events published after an event as they are published.
+
+    Args:
+        bus: The Bus.
+        after: The ID of the last event the client received, or None to
+            start with the next event, as for an ID the bus never issued.
+        timeout: The seconds after which the stream ends.
+        heartbeat: The seconds of idleness after which a comment is sent.
+
+    Yields:
+        Server-Sent Events, as bytes.
+    """
+    ready = threading.Event()
+    bus.subscribe(ready.set)
+    try:
+        if after is None or not bus.issued(after):
+            after = bus.last_id()
+        yield preamble(after)
+        deadline = time.monotonic() + timeout
+        while True:
+            ready.clear()
+            chunk, after = pending(bus, after)
+            if chunk:
+                yield chunk
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if not ready.wait(min(remaining, heartbeat)):
+                yield HEARTBEAT
+    finally:
+        bus.unsubscribe(ready.set)
+
+
+def stream_slots():
+    """
+    Return the semaphore bounding the streams of the current app, creating
+    it on first use.
+
+    Returns:
+        A BoundedSemaphore with CHANGES_SYNC_STREAMS slots.
+    """
+    app = current_app
+    slots = app.extensions.get("change_streams")
+    if slots is None:
+        slots = app.extensions.setdefault(
+            "change_streams",
+            threading.BoundedSemaphore(app.config["CHANGES_SYNC_STREAMS"]),
+        )
+    return slots
+
+
+def stream(timeout=None):
+    """
+    Stream the changes to people and notes as Server-Sent Events.
+
+    Every open stream holds a request thread, so the streams of a process
+    are limited to CHANGES_SYNC_STREAMS, leaving the other threads to the
+    API, and each ends after CHANGES_SYNC_STREAM_TIMEOUT seconds at most.
+    A client finding every slot taken is only sent the events it missed.
+    In either case the client reconnects with the Last-Event-ID of the last
+    event it received, after RETRY_MS. The aio app streams without holding
+    a thread, see aio/changes.py.
+
+    Args:
+        timeout: The seconds after which the stream ends, up to
+            CHANGES_SYNC_STREAM_TIMEOUT. 0 sends the missed events and ends.
+
+    Returns:
+        A streamed text/event-stream response.
+    """
+    config = current_app.config
+    limit = config["CHANGES_SYNC_STREAM_TIMEOUT"]
+    timeout = limit if timeout is None else min(timeout, limit)
+    after = resume_point(request.headers.get("Last-Event-ID"))
+    slots = stream_slots()
+    held = timeout > 0 and slots.acquire(blocking=False)
+    response = Response(
+        event_stream(
+            change_bus(),
+            after,
+            timeout if held else 0,
+            config["CHANGES_HEARTBEAT"],
+        ),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    if held:
+        response.call_on_close(slots.release)
+    return response
@@ -0,0 +1,237 @@
+"""
+Command line tools for the MAIGEE APP.
+
+Run them through Flask, e.g. ``flask --app flask_app maigee export
+backup.ndjson.gz`` and ``flask --app flask_app maigee import
+backup.ndjson.gz``.
+"""
+import gzip
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy.exc import IntegrityError
+
+from config import basedir, db
+from models import Note, Person
+from routing import copy_database
+from serializers import columns, encode_lines, serializer
+from spec_cache import compile_spec
+
+try:
+    import orjson
+
+    loads = orjson.loads
+except ImportError:
+    from json import loads
+
+maigee = AppGroup("maigee", help="Manage the MAIGEE APP data.")
+
+# Rows read from, or written to, the database per round trip.
+BATCH_SIZE = 5000
+
+# Record types in export files, in the order they are written and imported.
+MODELS = {"person": Person, "note": Note}
+
+
+@contextmanager
+def open_file(path, mode, compress):
+    """
+    Open an NDJSON file, or standard input or output for "-".
+
+    Args:
+        path: The file path, or "-".
+        mode: "rb" or "wb".
+        compress: Whether the file is gzip-compressed. None guesses from a
+            ".gz" suffix.
+
+    Yields:
+        A binary file object. Standard streams are flushed, not closed.
+    """
+    if compress is None:
+        compress = path.endswith(".gz")
+    if path != "-":
+        opener = gzip.open if compress else open
+        with opener(path, mode) as stream:
+            yield stream
+        return
+
+    stream = sys.stdin.buffer if mode == "rb" else sys.stdout.buffer
+    if compress:
+        with gzip.GzipFile(fileobj=stream, mode=mode) as wrapped:
+            yield wrapped
+    else:
+        yield stream
+    if mode == "wb":
+        stream.flush()
+
+
+def report(verb, count, started):
+    """
+    Print a throughput line to standard error.
+
+    Args:
+        verb: What happened to the rows, e.g. "Exported".
+        count: The number of rows.
+        started: The time.perf_counter() value the work started at.
+    """
+    elapsed = time.perf_counter() - started
+    rate = count / elapsed if elapsed else 0
+    click.echo(
+        f"{verb} {count} rows in {elapsed:.2f} s ({rate:,.0f} rows/s)",
+        err=True,
+    )
+
+
+def export_rows(model):
+    """
+    Stream the rows of a table as dicts ready to be written.
+
+    Only the table's columns are selected, and the result is read through a
+    server-side cursor in batches, so memory use doesn't grow with the table.
+
+    Args:
+        model: The Person or Note model class.
+
+    Yields:
+        Lists of up to BATCH_SIZE serialized rows.
+    """
+    dump = serializer(model)
+    statement = (
+        db.select(*(getattr(model, name) for name in columns(model)))
+        .order_by(model.id)
+        .execution_options(stream_results=True, yield_per=BATCH_SIZE)
+    )
+    for rows in db.session.execute(statement).partitions():
+        yield [dump(row) for row in rows]
+
+
+@maigee.command("export")
+@click.argument("path", default="-")
+@click.option(
+    "--gzip/--no-gzip",
+    "compress",
+    default=None,
+    help="Compress the output. Defaults to on for paths ending in .gz.",
+)
+def export_command(path, compress):
+    """Export all people and notes to an NDJSON file."""
+    started = time.perf_counter()
+    count = 0
+    with open_file(path, "wb", compress) as output:
+        for kind, model in MODELS.items():
+            for batch in export_rows(model):
+                for row in batch:
+                    row["type"] = kind
+                output.write(encode_lines(batch))
+                count += len(batch)
+    report("Exported", count, started)
+
+
+def parse_row(model, record):
+    """
+    Convert an exported record back into column values.
+
+    Args:
+        model: The Person or Note model class.
+        record: The decoded JSON object.
+
+    Returns:
+        A dict with the model's columns, timestamps parsed to datetimes.
+    """
+    row = {name: record.get(name) for name in columns(model)}
+    if row["timestamp"] is not None:
+        row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+    return row
+
+
+@maigee.command("import")
+@click.argument("path", default="-")
+@click.option(
+    "--gzip/--no-gzip",
+    "compress",
+    default=None,
+    help="Read compressed input. Defaults to on for paths ending in .gz.",
+)
+def import_command(path, compress):
+    """
+    Import people and notes from an NDJSON file written by export.
+
+    Missing tables are created first. IDs are kept, so notes stay attached
+    to their people. Rows are inserted with one executemany per batch and
+    committed batch by batch.
+    """
+    db.create_all()
+    started = time.perf_counter()
+    count = 0
+    pending = {kind: [] for kind in MODELS}
+
+    def flush(kind):
+        rows = pending[kind]
+        if not rows:
+            return
+        try:
+            db.session.execute(MODELS[kind].__table__.insert(), rows)
+            db.session.commit()
+        except IntegrityError as error:
+            db.session.rollback()
+            raise click.ClickException(
+                f"Could not import {kind} rows: {error.orig}"
+            )
+        rows.clear()
+
+    with open_file(path, "rb", compress) as source:
+        for number, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+            record = loads(line)
+            kind = record.get("type")
+            if kind not in MODELS:
+                raise click.ClickException(
+                    f"Line {number}: unknown record type {kind!r}"
+                )
+            if kind == "note":
+                flush("person")
+            pending[kind].append(parse_row(MODELS[kind], record))
+            if len(pending[kind]) >= BATCH_SIZE:
+                flush(kind)
+            count += 1
+    for kind in MODELS:
+        flush(kind)
+    report("Imported", count, started)
+
+
+@maigee.command("compile-spec")
+def compile_spec_command():
+    """
+    Compile swagger.yml to the artifact apps load their spec from.
+
+    Run it when deploying, so the first worker to start doesn't have to.
+    """
+    artifact = current_app.config["OPENAPI_SPEC_CACHE"]
+    if not artifact:
+        raise click.ClickException("MAIGEE_OPENAPI_SPEC_CACHE is not set")
+    compile_spec(basedir / "swagger.yml", artifact)
+    click.echo(f"Compiled swagger.yml to {artifact}")
+
+
+@maigee.command("copy-replica")
+@click.argument("path")
+def copy_replica_command(path):
+    """
+    Copy the SQLite database to a file, to serve as a local read replica.
+
+    Run it again to bring the replica up to date with the primary.
+    """
+    if db.engine.dialect.name != "sqlite":
+        raise click.ClickException("Only SQLite databases can be copied")
+    started = time.perf_counter()
+    copy_database(db.engine, path)
+    click.echo(
+        f"Copied the database to {path} in "
+        f"{time.perf_counter() - started:.2f}s"
+    )
@@ -0,0 +1,244 @@
+"""
+Negotiated gzip and brotli compression of the Flask app's responses.
+
+The encoding is picked from the request's Accept-Encoding header. brotli is
+offered when the brotli package is installed, gzip always. Buffered
+responses are compressed in one piece when they reach COMPRESSION_MIN_SIZE
+bytes. Streamed responses are compressed chunk by chunk and flushed after
+every chunk, so their first bytes still go out before the rest is ready.
+Files under static/ are compressed once, at the highest level, and served
+from a cache keyed by their path, size and modification time.
+
+ETags are left as they are: they identify the state of a resource, which
+every content coding of it shares, as every include variant of a person
+already does.
+"""
+import os
+import zlib
+from functools import lru_cache
+
+from flask import current_app, request
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Media types worth compressing. Images, fonts and archives already are.
+COMPRESSIBLE = (
+    "text/",
+    "application/json",
+    "application/problem+json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+# Compressed static files kept in memory.
+STATIC_CACHE_SIZE = 256
+
+
+def encodings():
+    """
+    List the content codings the app can produce, preferred first.
+
+    Returns:
+        A tuple of encoding names.
+    """
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encodings):
+    """
+    Pick the content coding of a response.
+
+    Args:
+        accept_encodings: The request's parsed Accept-Encoding header.
+
+    Returns:
+        The encoding name, or None to send the response uncompressed.
+    """
+    return accept_encodings.best_match(encodings())
+
+
+def compress(data, encoding, level):
+    """
+    Compress a whole body.
+
+    Args:
+        data: The body as bytes.
+        encoding: "br" or "gzip".
+        level: The brotli quality, 0 to 11, or the gzip level, 1 to 9.
+
+    Returns:
+        The compressed body.
+    """
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_stream(chunks, encoding, level):
+    """
+    Compress a streamed body chunk by chunk.
+
+    Every chunk is flushed, so a client can decode what has been sent so
+    far without waiting for the end of the stream.
+
+    Args:
+        chunks: An iterable of str or bytes chunks.
+        encoding: "br" or "gzip".
+        level: The brotli quality or the gzip level.
+
+    Yields:
+        The compressed chunks.
+    """
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=level)
+
+        def flush():
+            return compressor.flush()
+
+        def finish():
+            return compressor.finish()
+
+        process = compressor.process
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+        def flush():
+            return compressor.flush(zlib.Z_SYNC_FLUSH)
+
+        def finish():
+            return compressor.flush()
+
+        process = compressor.compress
+
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            if chunk:
+                yield process(chunk) + flush()
+        yield finish()
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+
+@lru_cache(maxsize=STATIC_CACHE_SIZE)
+def compressed_file(path, size, mtime, encoding, level):
+    """
+    Compress a static file, once per version of the file.
+
+    The size and modification time are part of the cache key, so a changed
+    file is compressed again.
+
+    Args:
+        path: The file path.
+        size: The file size, in bytes.
+        mtime: The file modification time.
+        encoding: "br" or "gzip".
+        level: The brotli quality or the gzip level.
+
+    Returns:
+        The compressed file.
+    """
+    with open(path, "rb") as file:
+        return compress(file.read(), encoding, level)
+
+
+def levels(config, encoding):
+    """
+    Read the compression levels of an encoding from the app settings.
+
+    Args:
+        config: The app config.
+        encoding: "br" or "gzip".
+
+    Returns:
+        A tuple of the level for dynamic responses and for static files.
+    """
+    if encoding == "br":
+        return config["BROTLI_QUALITY"], 11
+    return config["GZIP_LEVEL"], 9
+
+
+def compress_response(response):
+    """
+    Compress a response, if the client accepts an encoding the app can
+    produce and the response is worth it.
+
+    Args:
+        response: The Flask response.
+
+    Returns:
+        The response, compressed or not.
+    """
+    minimum = current_app.config["COMPRESSION_MIN_SIZE"]
+    if (
+        minimum < 0
+        or request.method == "HEAD"
+        or response.status_code < 200
+        or response.status_code in (204, 206, 304)
+        or "Content-Encoding" in response.headers
+        or "no-transform" in response.headers.get("Cache-Control", "")
+        or not (response.mimetype or "").startswith(COMPRESSIBLE)
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate(request.accept_encodings)
+    if encoding is None:
+        return response
+    level, static_level = levels(current_app.config, encoding)
+
+    if request.endpoint == "static":
+        filename = request.view_args["filename"]
+        path = safe_join(current_app.static_folder, filename)
+        if path is None or not os.path.isfile(path):
+            return response
+        stat = os.stat(path)
+        if stat.st_size < minimum:
+            return response
+        data = compressed_file(
+            path, stat.st_size, stat.st_mtime, encoding, static_level
+        )
+        # The cached bytes replace the file send_file() opened.
+        close = getattr(response.response, "close", None)
+        if close is not None:
+            close()
+        response.direct_passthrough = False
+        response.set_data(data)
+        response.headers.pop("Accept-Ranges", None)
+    elif response.direct_passthrough:
+        return response
+    elif response.is_streamed:
+        response.response = compress_stream(
+            response.response, encoding, level
+        )
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < minimum:
+            return response
+        compressed = compress(data, encoding, level)
+        if len(compressed) >= len(data):
+            return response
+        response.set_data(compressed)
+
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def init_app(app):
+    """
+    Compress the responses of an app.
+
+    Args:
+        app: The Flask app.
+    """
+    app.after_request(compress_response)
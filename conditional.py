@@ -0,0 +1,185 @@
+"""
+Conditional requests with ETag and Last-Modified validators.
+
+Validators are derived from IDs, timestamps and row counts, which cheap
+queries return without loading or serializing the resource, so a 304 Not
+Modified can be answered before any serialization. Writes check If-Match
+against the same validators and return the new ones, so a client can chain
+optimistic updates without reading the resource in between.
+"""
+from collections import namedtuple
+
+from flask import Response, abort, request
+from sqlalchemy import func, select
+from werkzeug.http import generate_etag, http_date, parse_etags
+from werkzeug.sansio.http import is_resource_modified
+
+from config import db
+
+# The ETag, without quotes, and the Last-Modified datetime of a resource.
+Validators = namedtuple("Validators", ["etag", "last_modified"])
+
+
+def validators(*parts, timestamps=()):
+    """
+    Build the validators of a resource.
+
+    Args:
+        *parts: Values that together identify the state of the resource,
+            such as its ID, timestamps and the number of related rows.
+        timestamps: The timestamps the resource depends on. The newest one
+            is used as the Last-Modified date.
+
+    Returns:
+        A Validators tuple.
+    """
+    etag = generate_etag(":".join(map(str, parts)).encode())
+    newest = [timestamp for timestamp in timestamps if timestamp is not None]
+    return Validators(etag, max(newest, default=None))
+
+
+def aggregate(*sources):
+    """
+    Count the rows of several collections and find their newest timestamps.
+
+    All aggregates are computed with a single statement.
+
+    Args:
+        *sources: Tuples of a model with a ``timestamp`` column followed by
+            the criteria selecting the collection's rows.
+
+    Returns:
+        A list of (count, newest timestamp) tuples, one per source.
+    """
+    row = db.session.execute(aggregate_statement(*sources)).one()
+    return aggregate_pairs(row)
+
+
+def aggregate_statement(*sources):
+    """
+    Build the statement behind aggregate(), for callers with their own
+    session.
+
+    Args:
+        *sources: Tuples of a model followed by the criteria selecting the
+            collection's rows.
+
+    Returns:
+        A select statement returning a single row.
+    """
+    columns = []
+    for model, *criteria in sources:
+        columns.append(
+            select(func.count()).select_from(model).where(*criteria)
+            .scalar_subquery()
+        )
+        columns.append(
+            select(func.max(model.timestamp)).where(*criteria)
+            .scalar_subquery()
+        )
+    return select(*columns)
+
+
+def aggregate_pairs(row):
+    """
+    Split the row returned by aggregate_statement() into one pair per source.
+
+    Args:
+        row: The result row.
+
+    Returns:
+        A list of (count, newest timestamp) tuples.
+    """
+    return [tuple(row[index:index + 2]) for index in range(0, len(row), 2)]
+
+
+def headers(current):
+    """
+    Build the response headers carrying a resource's validators.
+
+    ``Cache-Control: no-cache`` lets clients store the response but makes
+    them revalidate it before every use.
+
+    Args:
+        current: The Validators of the resource.
+
+    Returns:
+        A dict of headers.
+    """
+    headers = {"ETag": f'"{current.etag}"', "Cache-Control": "no-cache"}
+    if current.last_modified is not None:
+        headers["Last-Modified"] = http_date(current.last_modified)
+    return headers
+
+
+def is_fresh(current, request_headers):
+    """
+    Check a request's If-None-Match and If-Modified-Since headers.
+
+    Args:
+        current: The Validators of the requested resource.
+        request_headers: The request headers.
+
+    Returns:
+        True if the client's copy of the resource is still current.
+    """
+    return not is_resource_modified(
+        http_if_none_match=request_headers.get("If-None-Match"),
+        http_if_modified_since=request_headers.get("If-Modified-Since"),
+        etag=current.etag,
+        last_modified=current.last_modified,
+    )
+
+
+def not_modified(current):
+    """
+    Check the conditional headers of the current Flask request.
+
+    Args:
+        current: The Validators of the requested resource.
+
+    Returns:
+        A 304 response if the client's copy is still current, else None.
+    """
+    if not is_fresh(current, request.headers):
+        return None
+    return Response(status=304, headers=headers(current))
+
+
+def require_match(current, request_headers):
+    """
+    Check a request's If-Match header before a write.
+
+    Args:
+        current: The Validators of the resource about to be changed.
+        request_headers: The request headers.
+
+    Raises:
+        412 error: If If-Match is set and doesn't match the current ETag.
+    """
+    if_match = parse_etags(request_headers.get("If-Match"))
+    if if_match and not if_match.contains(current.etag):
+        abort(412, "The resource was changed since it was read")
+
+
+def begin_write(connection):
+    """
+    Take the database's write lock for a session's transaction, before an
+    If-Match check.
+
+    pysqlite runs reads outside of any transaction, and SQLite only takes
+    the write lock at the first write, so another writer could commit
+    between the check and the write it guards and have its change lost.
+    BEGIN IMMEDIATE takes the lock at once, so the check and the write see
+    the same rows, and other writers wait until the session commits or
+    rolls back. Nothing is done if the connection is already in a
+    transaction, or isn't SQLite.
+
+    Args:
+        connection: The session's connection, e.g. db.session.connection(),
+            or the sync connection an AsyncConnection.run_sync() passes.
+    """
+    if connection.dialect.name != "sqlite":
+        return
+    if not connection.connection.driver_connection.in_transaction:
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
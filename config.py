@@ -1,20 +1,318 @@
+import os
 import pathlib
+import threading
+import weakref
 
-import connexion
+from flask import Flask
 from flask_marshmallow import Marshmallow
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+
+import routing
+import slow_queries
 
 basedir = pathlib.Path(__file__).parent.resolve()
-connex_app = connexion.App(__name__, specification_dir=basedir)
 
-app = connex_app.app
+# The app holding the default settings. flask_app.create_app() copies its
+# settings into the app serving the API, and scripts run database work in
+# the context of default_app(), which sets up its database on first use.
+app = Flask(__name__)
+
+
+def env(name, default, cast=str):
+    """
+    Read a setting from a MAIGEE_-prefixed environment variable.
+
+    Args:
+        name: The setting name without the prefix, e.g. "SQLITE_CACHE_SIZE".
+        default: The value to use when the variable isn't set.
+        cast: A callable converting the variable's text to the setting type.
+
+    Returns:
+        The setting value.
+    """
+    value = os.environ.get(f"MAIGEE_{name}")
+    return default if value is None else cast(value)
+
 
 # Set the database URI to a SQLite file located in the same directory as this file.
-app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{basedir / 'people.db'}"
+app.config["SQLALCHEMY_DATABASE_URI"] = env(
+    "DATABASE_URI", f"sqlite:///{basedir / 'people.db'}"
+)
+
+# Comma-separated URIs of read replicas of the database. GET requests read
+# from them in turn, except those of a client that wrote in the last
+# READ_YOUR_WRITES_SECONDS, which read from the primary. See routing.py.
+app.config["DATABASE_REPLICAS"] = env(
+    "DATABASE_REPLICAS",
+    [],
+    lambda value: [uri.strip() for uri in value.split(",") if uri.strip()],
+)
+app.config["READ_YOUR_WRITES_SECONDS"] = env(
+    "READ_YOUR_WRITES_SECONDS", 5, float
+)
 
 # Disable SQLAlchemy's modification tracking, which isn't needed in this simple app.
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
-# Create the SQLAlchemy and Marshmallow objects.
-db = SQLAlchemy(app)
-ma = Marshmallow(app)
+# How Person.notes is eager loaded when people are serialized with their notes:
+# "selectin" issues one extra IN query per batch of people, "joined" uses a
+# single LEFT OUTER JOIN.
+app.config["NOTES_LOADING_STRATEGY"] = "selectin"
+
+# Backend, size and TTL in seconds of the cache serving read_one responses.
+# Set MAIGEE_RESPONSE_CACHE=none to switch it off. The cache is per process,
+# so gunicorn.conf.py switches it off when several workers serve the app.
+app.config["RESPONSE_CACHE"] = env("RESPONSE_CACHE", "lru")
+app.config["RESPONSE_CACHE_SIZE"] = env("RESPONSE_CACHE_SIZE", 10000, int)
+app.config["RESPONSE_CACHE_TTL"] = env("RESPONSE_CACHE_TTL", 60, int)
+
+# The home page renders its first HOME_PAGE_SIZE people, from a cache of
+# the HTML of each person card keyed by their version, and the browser loads
+# the others from the API as the page scrolls. Entries are never stale, so
+# the TTL only drops the cards of people who changed or left the page.
+app.config["HOME_PAGE_SIZE"] = env("HOME_PAGE_SIZE", 50, int)
+app.config["FRAGMENT_CACHE"] = env("FRAGMENT_CACHE", "lru")
+app.config["FRAGMENT_CACHE_SIZE"] = env("FRAGMENT_CACHE_SIZE", 10000, int)
+app.config["FRAGMENT_CACHE_TTL"] = env("FRAGMENT_CACHE_TTL", 3600, int)
+
+# The compiled copy of swagger.yml that apps load their spec from, see
+# spec_cache.py. Set MAIGEE_OPENAPI_SPEC_CACHE= to parse the YAML instead.
+app.config["OPENAPI_SPEC_CACHE"] = env(
+    "OPENAPI_SPEC_CACHE", str(basedir / "__pycache__" / "swagger.json")
+)
+
+# Statements running for at least SLOW_QUERY_THRESHOLD_MS are written to a
+# rotating JSON log, with the query plan of their first occurrence. Repeats
+# of a logged statement are sampled at SLOW_QUERY_SAMPLE_RATE. The log is
+# off unless MAIGEE_SLOW_QUERY_LOG names its file, e.g.
+# /var/log/maigee/slow_queries.log. A negative threshold also switches it
+# off.
+app.config["SLOW_QUERY_THRESHOLD_MS"] = env(
+    "SLOW_QUERY_THRESHOLD_MS", 100, float
+)
+app.config["SLOW_QUERY_LOG"] = env("SLOW_QUERY_LOG", "")
+app.config["SLOW_QUERY_LOG_MAX_BYTES"] = env(
+    "SLOW_QUERY_LOG_MAX_BYTES", 10 * 1024 * 1024, int
+)
+app.config["SLOW_QUERY_LOG_BACKUPS"] = env("SLOW_QUERY_LOG_BACKUPS", 5, int)
+app.config["SLOW_QUERY_SAMPLE_RATE"] = env(
+    "SLOW_QUERY_SAMPLE_RATE", 0.1, float
+)
+app.config["SLOW_QUERY_EXPLAIN"] = env(
+    "SLOW_QUERY_EXPLAIN", True, lambda value: value.lower() in ("1", "true")
+)
+
+# Responses of at least COMPRESSION_MIN_SIZE bytes are compressed with gzip,
+# or brotli when the brotli package is installed, if the client accepts it.
+# Streamed responses are always compressed. A negative size switches
+# compression off. See compression.py.
+app.config["COMPRESSION_MIN_SIZE"] = env("COMPRESSION_MIN_SIZE", 1024, int)
+app.config["GZIP_LEVEL"] = env("GZIP_LEVEL", 6, int)
+app.config["BROTLI_QUALITY"] = env("BROTLI_QUALITY", 4, int)
+
+# Writes publish their changes on the CHANGE_BUS backend, which keeps the
+# last CHANGES_HISTORY events for clients of GET /api/changes resuming with
+# Last-Event-ID. A stream of the aio app ends after CHANGES_STREAM_TIMEOUT
+# seconds, and sends a comment after CHANGES_HEARTBEAT idle seconds. A
+# stream of the sync app holds a request thread, so it ends after
+# CHANGES_SYNC_STREAM_TIMEOUT seconds, and a process streams to at most
+# CHANGES_SYNC_STREAMS clients at a time. See changes.py.
+app.config["CHANGE_BUS"] = env("CHANGE_BUS", "memory")
+app.config["CHANGES_HISTORY"] = env("CHANGES_HISTORY", 1000, int)
+app.config["CHANGES_STREAM_TIMEOUT"] = env(
+    "CHANGES_STREAM_TIMEOUT", 300, float
+)
+app.config["CHANGES_SYNC_STREAM_TIMEOUT"] = env(
+    "CHANGES_SYNC_STREAM_TIMEOUT", 30, float
+)
+app.config["CHANGES_SYNC_STREAMS"] = env("CHANGES_SYNC_STREAMS", 1, int)
+app.config["CHANGES_HEARTBEAT"] = env("CHANGES_HEARTBEAT", 15, float)
+
+# With WRITE_QUEUE on, single person and note inserts are committed in
+# groups by one writer thread: the rows queued within WRITE_QUEUE_WINDOW_MS,
+# up to WRITE_QUEUE_MAX_BATCH, share a transaction. A request waits up to
+# WRITE_QUEUE_TIMEOUT seconds for room when WRITE_QUEUE_MAX_DEPTH rows are
+# queued, and as long again for its row's commit, and then gets a 503. See
+# group_commit.py.
+app.config["WRITE_QUEUE"] = env(
+    "WRITE_QUEUE", False, lambda value: value.lower() in ("1", "true")
+)
+app.config["WRITE_QUEUE_MAX_BATCH"] = env("WRITE_QUEUE_MAX_BATCH", 100, int)
+app.config["WRITE_QUEUE_WINDOW_MS"] = env("WRITE_QUEUE_WINDOW_MS", 2, float)
+app.config["WRITE_QUEUE_MAX_DEPTH"] = env("WRITE_QUEUE_MAX_DEPTH", 1000, int)
+app.config["WRITE_QUEUE_TIMEOUT"] = env("WRITE_QUEUE_TIMEOUT", 1, float)
+
+# Pragmas run on every new SQLite connection. WAL lets readers work while a
+# writer commits, and busy_timeout (in milliseconds) makes a blocked writer
+# wait for the lock instead of failing with "database is locked".
+# foreign_keys makes SQLite enforce foreign keys, and run their ON DELETE
+# CASCADE actions, which it doesn't by default.
+app.config["SQLITE_PRAGMAS"] = {
+    "foreign_keys": env("SQLITE_FOREIGN_KEYS", "ON"),
+    "journal_mode": env("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": env("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "cache_size": env("SQLITE_CACHE_SIZE", -64000, int),
+    "mmap_size": env("SQLITE_MMAP_SIZE", 256 * 1024 * 1024, int),
+    "temp_store": env("SQLITE_TEMP_STORE", "MEMORY"),
+    "busy_timeout": env("SQLITE_BUSY_TIMEOUT", 5000, int),
+}
+
+
+def engine_options(uri):
+    """
+    Size the connection pool so connections, and the pragmas set on them,
+    are reused across requests.
+
+    Args:
+        uri: The database URI.
+
+    Returns:
+        A dict of engine options. It's empty for in-memory databases, which
+        always share one connection.
+    """
+    if make_url(uri).database in (None, "", ":memory:"):
+        return {}
+    return {
+        "pool_size": env("DB_POOL_SIZE", 5, int),
+        "max_overflow": env("DB_MAX_OVERFLOW", 10, int),
+        "pool_timeout": env("DB_POOL_TIMEOUT", 30, int),
+    }
+
+
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(
+    app.config["SQLALCHEMY_DATABASE_URI"]
+)
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """
+    Run the given pragmas on every new connection of a SQLite engine.
+
+    Args:
+        engine: The SQLAlchemy engine.
+        pragmas: A dict mapping pragma names to values.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+
+def engine_profile(engine):
+    """
+    Report the settings a database engine is actually running with.
+
+    Args:
+        engine: The SQLAlchemy engine.
+
+    Returns:
+        A dict with the dialect, the pool status and, for SQLite, the value
+        of every configured pragma as reported by the database.
+    """
+    profile = {"dialect": engine.dialect.name}
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as connection:
+            profile["pragmas"] = pragma_values(connection)
+    profile["pool"] = {
+        "class": type(engine.pool).__name__,
+        "status": engine.pool.status(),
+    }
+    return profile
+
+
+def pragma_values(connection):
+    """
+    Read the value of every configured pragma from a SQLite connection.
+
+    Args:
+        connection: A SQLAlchemy connection.
+
+    Returns:
+        A dict mapping pragma names to the values reported by the database.
+    """
+    return {
+        name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+        for name in app.config["SQLITE_PRAGMAS"]
+    }
+
+
+# Every engine the process has set up, see after_fork().
+engines = weakref.WeakSet()
+
+
+def init_engine(app):
+    """
+    Set up the database engine of an app initialized with db, and the
+    engines of its DATABASE_REPLICAS.
+
+    Args:
+        app: The Flask app.
+    """
+    with app.app_context():
+        app_engines = [db.engine]
+        for uri in app.config["DATABASE_REPLICAS"]:
+            app_engines.append(create_engine(uri, **engine_options(uri)))
+        for engine in app_engines:
+            apply_sqlite_pragmas(engine, app.config["SQLITE_PRAGMAS"])
+            slow_queries.init_app(app, engine)
+            engines.add(engine)
+        routing.init_app(app, app_engines[1:])
+
+
+def after_fork():
+    """
+    Give a forked process its own database connections.
+
+    The pooled connections of every engine are copies of those of the
+    parent process, which may still be using them, and a SQLite connection
+    used by two processes can corrupt the database. Run this first thing in
+    the child, e.g. from gunicorn's post_fork hook, so its engines drop them
+    and open new ones. The copies are left open, as closing them in the child
+    would release the locks the parent holds on the database file.
+    """
+    for engine in list(engines):
+        engine.dispose(close=False)
+
+
+def init_db(app):
+    """
+    Initialize an app with db and ma, and set up its database engines.
+
+    Args:
+        app: The Flask app, with its database settings.
+    """
+    db.init_app(app)
+    ma.init_app(app)
+    init_engine(app)
+
+
+default_app_lock = threading.Lock()
+
+
+def default_app():
+    """
+    Return the app holding the default settings, setting up its database
+    engines on first use.
+
+    Importing this module creates no engine, so scripts and tests that don't
+    touch the configured database don't open it.
+
+    Returns:
+        The Flask app.
+    """
+    with default_app_lock:
+        if "sqlalchemy" not in app.extensions:
+            init_db(app)
+    return app
+
+
+# The SQLAlchemy and Marshmallow objects, bound to apps by init_db().
+db = SQLAlchemy(session_options={"class_": routing.RoutingSession})
+ma = Marshmallow()
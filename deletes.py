@@ -0,0 +1,116 @@
+from sqlalchemy import delete, select
+
+from models import Note, Person
+from serializers import parse_datetime
+
+# People deleted per statement and transaction by a purge, unless the
+# request asks for another size.
+PURGE_BATCH_SIZE = 1000
+
+
+def delete_statement(condition):
+    """
+    Build the DELETE statement of the people matching a condition.
+
+    Their notes are deleted by the database through the ON DELETE CASCADE
+    foreign key, so none of them is loaded.
+
+    Args:
+        condition: The criterion selecting the people to delete.
+
+    Returns:
+        A delete statement returning the IDs of the deleted people.
+    """
+    return (
+        delete(Person)
+        .where(condition)
+        .returning(Person.id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def note_ids_statement(condition):
+    """
+    Select the IDs of the notes of the people matching a condition, whose
+    cached payloads a delete makes stale.
+
+    Args:
+        condition: The criterion selecting the people.
+
+    Returns:
+        A select statement returning note IDs.
+    """
+    return select(Note.id).join(Person).where(condition)
+
+
+def purge_conditions(ids, before, batch_size):
+    """
+    Yield the condition selecting each batch of people to purge.
+
+    IDs are purged in sorted chunks of batch_size. A purge by age selects
+    the first batch_size people older than the cutoff, which the previous
+    batch's DELETE removed from the selection, and goes on until a batch
+    comes back short.
+
+    Args:
+        ids: The IDs of the people to purge, or None to purge by age.
+        before: The cutoff datetime of a purge by age.
+        batch_size: The number of people per batch.
+
+    Yields:
+        Criteria to pass to delete_statement() and note_ids_statement().
+    """
+    if ids is not None:
+        ids = sorted(set(ids))
+        for start in range(0, len(ids), batch_size):
+            yield Person.id.in_(ids[start:start + batch_size])
+        return
+
+    batch = (
+        select(Person.id)
+        .where(Person.timestamp < before)
+        .order_by(Person.id)
+        .limit(batch_size)
+    )
+    while True:
+        yield Person.id.in_(batch.scalar_subquery())
+
+
+def purge_selection(purge):
+    """
+    Read which people a purge request selects.
+
+    Args:
+        purge: The request body, with either ``ids`` or ``before``.
+
+    Returns:
+        A tuple of the IDs, or None, and the cutoff as a naive UTC datetime
+        like the stored timestamps, or None.
+
+    Raises:
+        ValueError: If the body has both or neither of ``ids`` and
+            ``before``, or if ``before`` isn't an ISO 8601 datetime.
+    """
+    ids = purge.get("ids")
+    before = purge.get("before")
+    if (ids is None) == (before is None):
+        raise ValueError("Pass either ids or before")
+    if before is not None:
+        before = parse_datetime(before)
+    return ids, before
+
+
+def is_last(ids, deleted, batch_size):
+    """
+    Tell whether a purge by age is done after a batch.
+
+    Args:
+        ids: The IDs of a purge by ID, or None for a purge by age.
+        deleted: The IDs the batch deleted.
+        batch_size: The number of people per batch.
+
+    Returns:
+        True if a purge by age deleted fewer people than a full batch. A
+        purge by ID ends with its last chunk.
+    """
+    return ids is None and len(deleted) < batch_size
@@ -1,22 +1,73 @@
-from flask import render_template
+def create_app(settings=None):
+    """
+    Create the app serving swagger.yml and the home page.
+
+    The spec is loaded from its compiled copy when OPENAPI_SPEC_CACHE is
+    set, so creating an app doesn't parse the YAML.
+
+    Args:
+        settings: Optional settings overriding those of config.app.
+
+    Returns:
+        A connexion App. The Flask app is its ``app`` attribute.
+    """
+    # Imported here, so importing this module loads no feature module and
+    # creates no engine.
+    import connexion
+
+    import compression
+    import config
+    import group_commit
+    import metrics
+    import spec_cache
+    from cli import maigee
+    from config import db
+    from pages import home
 
-import config
-from models import Person
+    overrides = settings or {}
+    app = connexion.App(__name__, specification_dir=config.basedir)
+    api = app.add_api(
+        spec_cache.load(
+            config.basedir / "swagger.yml",
+            overrides.get(
+                "OPENAPI_SPEC_CACHE", config.app.config["OPENAPI_SPEC_CACHE"]
+            ),
+        )
+    )
+    app.add_url_rule("/", "home", home)
 
-app = config.connex_app
-app.add_api(config.basedir / "swagger.yml")
+    application = app.app
+    application.config.update(config.app.config)
+    application.config.update(overrides)
+    if "SQLALCHEMY_ENGINE_OPTIONS" not in overrides:
+        uri = application.config["SQLALCHEMY_DATABASE_URI"]
+        application.config["SQLALCHEMY_ENGINE_OPTIONS"] = (
+            config.engine_options(uri)
+        )
+    application.cli.add_command(maigee)
+    config.init_db(application)
+    with application.app_context():
+        metrics.init_app(application, db.engine, api)
+        group_commit.init_app(application, db.engine)
+    compression.init_app(application)
+    return app
 
-7
-@app.route("/")
-def home():
+
+def __getattr__(name):
     """
-    Displays the home page with a list of all people in the database.
+    Create the default app on first access of ``app`` or ``application``.
 
-    :return: The rendered home page template.
+    Importing this module for create_app() doesn't build an app or import
+    the modules it is built from, while the flask command and WSGI servers,
+    which look these names up, still find one.
     """
-    people = Person.query.all()
-    return render_template("home.html", people=people)
-    
+    if name not in ("app", "application"):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    app = globals()["app"] = create_app()
+    # The underlying Flask app, which the flask command and WSGI servers find.
+    globals()["application"] = app.app
+    return globals()[name]
+
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,192 @@
+"""
+The person cards of the home page, rendered once per version of a person.
+
+The home page only renders its first page of people. Each card holds the
+first page of the person's notes, and is kept in the fragment cache under a
+key made of the person's ID and timestamp and the count and newest
+timestamp of their notes. One grouped query reads those versions for the
+whole page, so an unchanged card is served without loading the person or
+their notes, and a changed one is rendered again under its new key.
+
+The browser loads the people and notes after the first pages from the API,
+starting at the URLs the page links to.
+"""
+from urllib.parse import urlencode
+
+from flask import render_template
+from markupsafe import Markup
+from sqlalchemy import func, select
+
+from cache import fragment_cache, fragment_key
+from config import db
+from models import Note, Person
+from notes import person_notes_page
+from serializers import columns
+
+
+def versions_statement(last_id, limit):
+    """
+    Select the version of every person on the first page of the home page.
+
+    Args:
+        last_id: The ID of the last person on the page, or None if everyone
+            fits on it.
+        limit: The number of people on the page.
+
+    Returns:
+        A select statement returning, per person, in ID order, the id and
+        timestamp, and the count and newest timestamp of their notes as
+        ``notes`` and ``notes_modified``.
+    """
+    statement = (
+        select(
+            Person.id,
+            Person.timestamp,
+            func.count(Note.id).label("notes"),
+            func.max(Note.timestamp).label("notes_modified"),
+        )
+        .outerjoin(Note, Note.person_id == Person.id)
+        .group_by(Person.id)
+        .order_by(Person.id)
+    )
+    if last_id is not None:
+        return statement.where(Person.id <= last_id)
+    return statement.limit(limit)
+
+
+def first_notes_statement(person_ids, limit):
+    """
+    Select the first page of notes of each of the given people.
+
+    The notes are numbered per person in the order of
+    notes.person_notes_statement(), so the cursor of the page continues
+    where the API's pages do.
+
+    Args:
+        person_ids: The IDs of the people.
+        limit: The number of notes on a page.
+
+    Returns:
+        A select statement returning up to limit + 1 note rows per person,
+        by person, newest first.
+    """
+    names = columns(Note)
+    position = (
+        func.row_number()
+        .over(
+            partition_by=Note.person_id,
+            order_by=(Note.timestamp.desc(), Note.id),
+        )
+        .label("position")
+    )
+    ranked = (
+        select(*(getattr(Note, name) for name in names), position)
+        .where(Note.person_id.in_(person_ids))
+        .subquery()
+    )
+    return (
+        select(*(ranked.c[name] for name in names))
+        .where(ranked.c.position <= limit + 1)
+        .order_by(ranked.c.person_id, ranked.c.position)
+    )
+
+
+def render_people(person_ids, notes_limit):
+    """
+    Render the cards of the given people.
+
+    Args:
+        person_ids: The IDs of the people.
+        notes_limit: The number of notes on a card.
+
+    Returns:
+        A dict mapping the ID of every person found to their card's HTML.
+    """
+    people = db.session.execute(
+        select(*(getattr(Person, name) for name in columns(Person))).where(
+            Person.id.in_(person_ids)
+        )
+    ).all()
+    notes = {person.id: [] for person in people}
+    statement = first_notes_statement(person_ids, notes_limit)
+    for note in db.session.execute(statement):
+        notes[note.person_id].append(note)
+    return {
+        person.id: render_person(person, notes[person.id], notes_limit)
+        for person in people
+    }
+
+
+def render_person(person, notes, notes_limit):
+    """
+    Render the card of a person with the first page of their notes.
+
+    Args:
+        person: The person row.
+        notes: Up to notes_limit + 1 of their note rows, newest first.
+        notes_limit: The number of notes on a card.
+
+    Returns:
+        The card's HTML.
+    """
+    page, cursor = person_notes_page(notes, notes_limit)
+    notes_next = None
+    if cursor is not None:
+        params = urlencode({"limit": notes_limit, "cursor": cursor})
+        notes_next = f"/api/people/{person.id}/notes?{params}"
+    return render_template(
+        "_person_content.html",
+        person=person,
+        notes=page,
+        notes_next=notes_next,
+    )
+
+
+def person_fragments(last_id, limit, notes_limit):
+    """
+    Yield the cards of the first page of the home page, from the fragment
+    cache when possible.
+
+    Args:
+        last_id: The ID of the last person on the page, or None if everyone
+            fits on it.
+        limit: The number of people on the page.
+        notes_limit: The number of notes on a card.
+
+    Yields:
+        The HTML of each card, in ID order.
+    """
+    cache = fragment_cache()
+    versions = db.session.execute(versions_statement(last_id, limit)).all()
+    keys = [fragment_key(version) for version in versions]
+    fragments = [cache.get(key) for key in keys]
+    missing = [
+        version.id
+        for version, fragment in zip(versions, fragments)
+        if fragment is None
+    ]
+    rendered = render_people(missing, notes_limit) if missing else {}
+
+    for version, key, fragment in zip(versions, keys, fragments):
+        if fragment is None:
+            fragment = rendered.get(version.id)
+            if fragment is None:
+                # Deleted since its version was read.
+                continue
+            cache.set(key, fragment)
+        yield Markup(fragment)
+
+
+def people_page_url(limit, last_id):
+    """
+    Build the API URL of the people after the first page, without notes.
+
+    Args:
+        limit: The number of people per page.
+        last_id: The ID of the last person on the first page.
+
+    Returns:
+        The URL.
+    """
+    params = urlencode({"limit": limit, "after": last_id, "include": ""})
+    return f"/api/people?{params}"
@@ -0,0 +1,355 @@
+"""
+Group commit of the sync app's single person and note inserts.
+
+On SQLite every commit waits for the disk and holds the database's only
+write lock, so requests that each commit one row are limited by the number
+of commits the disk can do. With WRITE_QUEUE on, POST /api/people and
+POST /api/notes hand their row to a bounded queue instead, and a single
+writer thread inserts the rows queued within WRITE_QUEUE_WINDOW_MS, up to
+WRITE_QUEUE_MAX_BATCH of them, in one transaction. Each request waits for
+its own row and gets back its new ID, or its own error: when a batch fails,
+its rows are inserted again one transaction each, so only the bad ones fail.
+
+A request that can't queue its row within WRITE_QUEUE_TIMEOUT seconds,
+because WRITE_QUEUE_MAX_DEPTH rows are already waiting, or whose row isn't
+committed within WRITE_QUEUE_TIMEOUT seconds of the request queueing it,
+gets a 503 with a Retry-After header. A row whose request gave up is left
+out of the group commits, unless the writer already took it. The queue's
+depth and counters are served in the health report and at /metrics.
+"""
+import queue
+import threading
+import time
+from operator import attrgetter
+
+from flask import current_app
+from sqlalchemy import insert
+from werkzeug.exceptions import ServiceUnavailable
+
+from config import db
+
+
+class QueueFull(Exception):
+    """Raised when a row can't be queued before the timeout."""
+
+
+class WriteTimeout(Exception):
+    """Raised when a queued row isn't committed before the timeout."""
+
+
+class Write:
+    """A row waiting in the queue, and the outcome of its insert."""
+
+    __slots__ = (
+        "model", "row", "done", "result", "error", "taken", "cancelled"
+    )
+
+    def __init__(self, model, row):
+        self.model = model
+        self.row = row
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # Both are set under the queue's lock: taken once the writer inserts
+        # the row, cancelled once its request gave up before that.
+        self.taken = False
+        self.cancelled = False
+
+    def finish(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.done.set()
+
+
+class WriteQueue:
+    """
+    A bounded queue of inserts, committed in groups by one writer thread.
+
+    The thread is started by the first write, and again by the first write
+    after it stopped, e.g. in a worker process forked from the one that
+    started it.
+
+    Args:
+        engine: The SQLAlchemy engine to insert with.
+        max_batch: The most rows committed in one transaction.
+        window: The seconds the writer waits for more rows after the first
+            one of a batch.
+        max_depth: The most rows waiting in the queue.
+        timeout: The seconds a write waits for room in a full queue, and
+            then for its commit.
+    """
+
+    def __init__(
+        self, engine, max_batch=100, window=0.002, max_depth=1000, timeout=1.0
+    ):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.window = window
+        self.timeout = timeout
+        self.queue = queue.Queue(max_depth)
+        self.lock = threading.Lock()
+        self.writer = None
+        self.batches = 0
+        self.written = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def submit(self, model, row):
+        """
+        Insert a row with the next group commit.
+
+        Args:
+            model: The SQLAlchemy model class to insert into.
+            row: A dict of the row's column values.
+
+        Returns:
+            The inserted row, with all its columns.
+
+        Raises:
+            QueueFull: If the queue stayed full for the timeout.
+            WriteTimeout: If the row wasn't committed within the timeout of
+                queueing it.
+            Exception: The error inserting the row raised.
+        """
+        write = Write(model, row)
+        self.start()
+        try:
+            self.queue.put(write, timeout=self.timeout)
+        except queue.Full:
+            with self.lock:
+                self.rejected += 1
+            raise QueueFull(f"{self.queue.maxsize} writes queued") from None
+        if not write.done.wait(self.timeout):
+            with self.lock:
+                if not write.done.is_set():
+                    self.timed_out += 1
+                    write.cancelled = not write.taken
+                    raise WriteTimeout(
+                        f"Not committed within {self.timeout} seconds"
+                        + ("" if write.cancelled else ", it may still be")
+                    )
+        if write.error is not None:
+            raise write.error
+        return write.result
+
+    def start(self):
+        """Start the writer thread unless it is running."""
+        with self.lock:
+            if self.writer is None or not self.writer.is_alive():
+                self.writer = threading.Thread(
+                    target=self.run, name="maigee-write-queue", daemon=True
+                )
+                self.writer.start()
+
+    def run(self):
+        while True:
+            writes = self.collect()
+            with self.lock:
+                writes = [write for write in writes if not write.cancelled]
+                for write in writes:
+                    write.taken = True
+            if not writes:
+                continue
+            try:
+                self.commit(writes)
+            except Exception as error:
+                # Keep the writer alive for the writes still to come.
+                pending = [
+                    write for write in writes if not write.done.is_set()
+                ]
+                with self.lock:
+                    self.failed += len(pending)
+                for write in pending:
+                    write.finish(error=error)
+            with self.lock:
+                self.batches += 1
+
+    def collect(self):
+        """
+        Wait for a write, then take those queued within the window.
+
+        Returns:
+            A list of up to max_batch writes, in queue order.
+        """
+        writes = [self.queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(writes) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    writes.append(self.queue.get(timeout=remaining))
+                else:
+                    writes.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return writes
+
+    def commit(self, writes):
+        """
+        Insert writes in one transaction and hand every one its outcome.
+
+        If the transaction fails, each write is inserted again alone, so the
+        error only reaches the writes that cause it.
+
+        Args:
+            writes: A list of writes.
+        """
+        try:
+            results = self.insert(writes)
+        except Exception as error:
+            if len(writes) > 1:
+                for write in writes:
+                    self.commit([write])
+                return
+            with self.lock:
+                self.failed += 1
+            writes[0].finish(error=error)
+            return
+        with self.lock:
+            self.written += len(writes)
+        for write, result in zip(writes, results):
+            write.finish(result)
+
+    def insert(self, writes):
+        """
+        Insert writes in one transaction, one statement per model.
+
+        Row IDs are assigned in increasing order as the rows of a statement
+        are inserted, so the returned rows are sorted to match them with
+        their writes, as in batch.insert_statement().
+
+        Args:
+            writes: A list of writes.
+
+        Returns:
+            The inserted rows, in the order of the writes.
+        """
+        results = [None] * len(writes)
+        with self.engine.begin() as connection:
+            for model in dict.fromkeys(write.model for write in writes):
+                indexes = [
+                    index
+                    for index, write in enumerate(writes)
+                    if write.model is model
+                ]
+                statement = insert(model).returning(*model.__table__.columns)
+                rows = connection.execute(
+                    statement, [writes[index].row for index in indexes]
+                ).all()
+                for index, row in zip(
+                    indexes, sorted(rows, key=attrgetter("id"))
+                ):
+                    results[index] = row
+        return results
+
+    def stats(self):
+        """Return a dict of the queue's depth and counters."""
+        with self.lock:
+            return {
+                "depth": self.queue.qsize(),
+                "max_depth": self.queue.maxsize,
+                "batches": self.batches,
+                "written": self.written,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+            }
+
+    def families(self):
+        """
+        Describe the queue's metrics for metrics.Metrics.render().
+
+        Returns:
+            A list of (name, kind, description, samples) tuples.
+        """
+        stats = self.stats()
+        return [
+            (
+                "maigee_write_queue_depth",
+                "gauge",
+                "Writes waiting for a group commit.",
+                [("", "", stats["depth"])],
+            ),
+            (
+                "maigee_write_queue_batches_total",
+                "counter",
+                "Group commits.",
+                [("", "", stats["batches"])],
+            ),
+            (
+                "maigee_write_queue_writes_total",
+                "counter",
+                "Queued writes by outcome.",
+                [
+                    ("", f'outcome="{outcome}"', stats[outcome])
+                    for outcome in (
+                        "written", "failed", "rejected", "timed_out"
+                    )
+                ],
+            ),
+        ]
+
+
+def write_queue():
+    """
+    Get the write queue of the current app.
+
+    Returns:
+        The WriteQueue, or None if WRITE_QUEUE is off.
+    """
+    return current_app.extensions.get("write_queue")
+
+
+def queued_insert(model, row):
+    """
+    Insert a row through the current app's write queue.
+
+    The request's transaction is ended first, so its connection goes back to
+    the pool for the writer while the request waits.
+
+    Args:
+        model: The SQLAlchemy model class to insert into.
+        row: A dict of the row's column values.
+
+    Returns:
+        The inserted row, with all its columns.
+
+    Raises:
+        503 error: If the queue stayed full for WRITE_QUEUE_TIMEOUT, or the
+            row wasn't committed within WRITE_QUEUE_TIMEOUT of queueing it.
+    """
+    db.session.rollback()
+    try:
+        return write_queue().submit(model, row)
+    except QueueFull as error:
+        raise ServiceUnavailable(
+            f"Too many writes queued: {error}", retry_after=1
+        ) from None
+    except WriteTimeout as error:
+        raise ServiceUnavailable(
+            f"The write timed out: {error}", retry_after=1
+        ) from None
+
+
+def init_app(app, engine):
+    """
+    Give an app a write queue if its WRITE_QUEUE setting is on, and add the
+    queue's metrics to those of the app.
+
+    Args:
+        app: The Flask app.
+        engine: The engine of the app's primary database.
+    """
+    if not app.config["WRITE_QUEUE"]:
+        return
+    writes = app.extensions["write_queue"] = WriteQueue(
+        engine,
+        max_batch=app.config["WRITE_QUEUE_MAX_BATCH"],
+        window=app.config["WRITE_QUEUE_WINDOW_MS"] / 1000,
+        max_depth=app.config["WRITE_QUEUE_MAX_DEPTH"],
+        timeout=app.config["WRITE_QUEUE_TIMEOUT"],
+    )
+    metrics = app.extensions.get("metrics")
+    if metrics is not None:
+        metrics.collectors.append(writes.families)
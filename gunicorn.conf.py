@@ -0,0 +1,73 @@
+"""
+The production server of the sync app: gunicorn with several worker
+processes, each serving requests from a pool of threads.
+
+Run ``gunicorn`` from this directory, which loads this file. The app is
+created once in the master process before the workers are forked, so they
+share its memory, e.g. the loaded spec and the imported modules, until
+they write to it. Each worker then drops the database connections it
+inherited, see config.after_fork().
+
+Every setting can be changed with a MAIGEE_-prefixed environment variable,
+e.g. MAIGEE_WORKERS=8, or a gunicorn command line option. The caches, the
+change bus and the write queue are per worker: a write only clears the
+response cache of the worker that served it, so the response cache is
+switched off when there are several workers, unless MAIGEE_RESPONSE_CACHE
+is set explicitly, see on_starting().
+``python -m benchmarks.workers`` measures how the throughput grows with the
+number of workers.
+"""
+import os
+
+from config import after_fork, env
+
+wsgi_app = "flask_app:application"
+bind = env("BIND", "127.0.0.1:8000")
+
+# SQLite takes one writer at a time, so workers beyond the number of cores
+# only add contention on its lock.
+workers = env("WORKERS", os.cpu_count() or 1, int)
+# More than one thread switches gunicorn to its threaded worker, so a
+# request waiting for the database doesn't hold up the others. A client of
+# GET /api/changes holds a thread for as long as its stream is open, so
+# keep MAIGEE_CHANGES_SYNC_STREAMS below the number of threads, or serve
+# the stream from the aio app, which doesn't hold a thread.
+threads = env("THREADS", 4, int)
+# Seconds a worker may go without checking in before it is restarted, and
+# seconds it gets to finish its requests when it is stopped.
+timeout = env("WORKER_TIMEOUT", 30, int)
+graceful_timeout = env("GRACEFUL_TIMEOUT", 30, int)
+# Seconds an idle keep-alive connection is held open.
+keepalive = env("KEEPALIVE", 5, int)
+# Restart a worker after this many requests, give or take the jitter, to
+# bound the growth of its memory. 0 never restarts it.
+max_requests = env("MAX_REQUESTS", 0, int)
+max_requests_jitter = env("MAX_REQUESTS_JITTER", 0, int)
+
+preload_app = True
+
+
+def on_starting(server):
+    """
+    Switch the response cache off if several workers serve the app, so none
+    of them serves a response another one's write made stale.
+
+    The app is already loaded when it's preloaded, and is otherwise created
+    by each worker from the settings of config.app.
+    """
+    if server.cfg.workers < 2 or "MAIGEE_RESPONSE_CACHE" in os.environ:
+        return
+    # Imported here, as gunicorn would read a module-level config as its
+    # own setting.
+    import config
+
+    for app in (config.app, server.app.callable):
+        if app is not None:
+            app.config["RESPONSE_CACHE"] = "none"
+    server.log.info(
+        "Response cache switched off for %d workers", server.cfg.workers
+    )
+
+
+def post_fork(server, worker):
+    after_fork()
@@ -0,0 +1,35 @@
+from flask import abort
+from sqlalchemy.exc import OperationalError
+
+from cache import response_cache
+from changes import change_bus
+from config import db, engine_profile
+from group_commit import write_queue
+
+
+def read():
+    """
+    Report the health of the app and the database settings it runs with.
+
+    Returns:
+        A JSON object with the status, the active engine profile and the
+        counters of the response cache, the change bus and, if it is on, the
+        write queue.
+
+    Raises:
+        503 error: If the database can't be reached.
+    """
+    try:
+        profile = engine_profile(db.engine)
+    except OperationalError as error:
+        abort(503, f"Database unavailable: {error.orig}")
+    report = {
+        "status": "ok",
+        "database": profile,
+        "cache": response_cache().stats(),
+        "changes": change_bus().stats(),
+    }
+    writes = write_queue()
+    if writes is not None:
+        report["write_queue"] = writes.stats()
+    return report
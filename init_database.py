@@ -1,8 +1,16 @@
 from datetime import datetime
+from sqlalchemy import MetaData, create_engine
 from sqlalchemy.exc import OperationalError
+from sqlalchemy.schema import CreateTable
 
-from config import app, db
-from models import Note, Person
+from config import db, default_app
+from migrations import transaction, upgrade
+from models import NOTE_SEARCH_DDL, Note, Person
+
+# Rows copied per transaction by upgrade_database(). Each chunk holds the
+# write lock only briefly, and an interrupted upgrade resumes after the
+# last committed chunk.
+UPGRADE_CHUNK_SIZE = 10000
 
 PEOPLE_NOTES = [
     {
@@ -106,11 +114,249 @@ def update_database(db, existing_people, existing_notes):
     print("Updated existing database")
 
 
-with app.app_context():
-    existing_people = get_data_from_table(Person)
-    existing_notes = get_data_from_table(Note)
+def table_definition(connection, name):
+    """
+    Describe a table's columns and foreign keys as SQLite reports them.
+
+    Args:
+        connection: A connection to the database.
+        name: The table name.
+
+    Returns:
+        A tuple of the column definitions and the sorted foreign keys.
+    """
+    columns = [
+        (row.name, row.type.upper(), row.notnull, row.pk)
+        for row in connection.exec_driver_sql(f"PRAGMA table_info({name})")
+    ]
+    foreign_keys = sorted(
+        (row[2], row[3], row[4], row[6])
+        for row in connection.exec_driver_sql(
+            f"PRAGMA foreign_key_list({name})"
+        )
+    )
+    return columns, foreign_keys
+
+
+def outdated_tables(db):
+    """
+    Find the tables whose definition differs from the models.
+
+    The models are created in a scratch in-memory database, so the
+    comparison uses exactly what SQLite reports for both sides.
+
+    Args:
+        db: The SQLAlchemy database object to use.
+
+    Returns:
+        The outdated tables, parents before children.
+    """
+    reference = create_engine("sqlite://")
+    db.metadata.create_all(reference)
+    outdated = []
+    with reference.connect() as expected, db.engine.connect() as actual:
+        for table in db.metadata.sorted_tables:
+            if table_definition(actual, table.name) != table_definition(
+                expected, table.name
+            ):
+                outdated.append(table)
+    reference.dispose()
+    return outdated
+
+
+def prepare_upgrade(connection, table):
+    """
+    Create the new version of a table and mirror writes into it.
+
+    Triggers copy every insert, update and delete on the old table to the
+    new one, so rows changed after their chunk was copied stay current. All
+    statements are idempotent, so an interrupted upgrade can run them again.
+
+    Args:
+        connection: The connection to use, inside a transaction.
+        table: The SQLAlchemy table being upgraded.
+    """
+    new_name = f"{table.name}__new"
+    existing = {
+        row.name
+        for row in connection.exec_driver_sql(
+            f"PRAGMA table_info({table.name})"
+        )
+    }
+    columns = [
+        column.name for column in table.columns if column.name in existing
+    ]
+    names = ", ".join(columns)
+    values = ", ".join(f"new.{name}" for name in columns)
+    key = table.primary_key.columns.keys()[0]
+
+    # Foreign keys of the copy still point at the tables' final names. Its
+    # indexes are left out, as their names are still taken by those of the
+    # old table, and created by swap_tables() once it is renamed.
+    scratch = MetaData()
+    for other in db.metadata.sorted_tables:
+        other.to_metadata(scratch)
+    connection.execute(
+        CreateTable(
+            table.to_metadata(scratch, name=new_name), if_not_exists=True
+        )
+    )
+    connection.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS upgrade_progress ("
+        "table_name VARCHAR PRIMARY KEY, last_id INTEGER NOT NULL)"
+    )
+    connection.exec_driver_sql(
+        "INSERT OR IGNORE INTO upgrade_progress VALUES (?, 0)", (table.name,)
+    )
+    for operation in ("insert", "update"):
+        connection.exec_driver_sql(
+            "CREATE TRIGGER IF NOT EXISTS "
+            f"{table.name}__upgrade_{operation} "
+            f"AFTER {operation.upper()} ON {table.name} BEGIN "
+            f"INSERT OR REPLACE INTO {new_name} ({names}) VALUES ({values}); "
+            "END"
+        )
+    connection.exec_driver_sql(
+        f"CREATE TRIGGER IF NOT EXISTS {table.name}__upgrade_delete "
+        f"AFTER DELETE ON {table.name} BEGIN "
+        f"DELETE FROM {new_name} WHERE {key} = old.{key}; "
+        "END"
+    )
+
+
+def copy_rows(engine, table, chunk_size, progress):
+    """
+    Copy a table's rows into its new version, one chunk per transaction.
+
+    The rows are copied by SQLite itself with INSERT ... SELECT, ordered by
+    primary key, so no Python objects are built and memory stays bounded.
+    The last copied key is committed with each chunk.
+
+    Args:
+        engine: The engine of the database being upgraded.
+        table: The SQLAlchemy table being upgraded.
+        chunk_size: The number of rows to copy per transaction.
+        progress: A callable receiving a progress message.
+    """
+    new_name = f"{table.name}__new"
+    key = table.primary_key.columns.keys()[0]
+    with engine.connect() as connection:
+        total = connection.exec_driver_sql(
+            f"SELECT count(*) FROM {table.name}"
+        ).scalar()
+        existing = {
+            row.name
+            for row in connection.exec_driver_sql(
+                f"PRAGMA table_info({table.name})"
+            )
+        }
+    names = ", ".join(
+        column.name for column in table.columns if column.name in existing
+    )
+
+    copied = 0
+    while True:
+        with transaction(engine) as connection:
+            last_id = connection.exec_driver_sql(
+                "SELECT last_id FROM upgrade_progress WHERE table_name = ?",
+                (table.name,),
+            ).scalar()
+            boundary = connection.exec_driver_sql(
+                f"SELECT max({key}) FROM (SELECT {key} FROM {table.name} "
+                f"WHERE {key} > ? ORDER BY {key} LIMIT ?)",
+                (last_id, chunk_size),
+            ).scalar()
+            if boundary is None:
+                break
+            copied += connection.exec_driver_sql(
+                f"INSERT OR IGNORE INTO {new_name} ({names}) "
+                f"SELECT {names} FROM {table.name} "
+                f"WHERE {key} > ? AND {key} <= ?",
+                (last_id, boundary),
+            ).rowcount
+            connection.exec_driver_sql(
+                "UPDATE upgrade_progress SET last_id = ? WHERE table_name = ?",
+                (boundary, table.name),
+            )
+        progress(f"{table.name}: copied {copied} of {total} rows")
+
+
+def swap_tables(engine, tables):
+    """
+    Replace the old tables with their new versions in one transaction.
+
+    Foreign key enforcement is switched off while the tables are swapped, as
+    SQLite's schema change procedure requires, and the result is checked
+    with foreign_key_check before it is committed.
+
+    Args:
+        engine: The engine of the database being upgraded.
+        tables: The SQLAlchemy tables being upgraded.
+    """
+    with transaction(engine, foreign_keys=False) as connection:
+        for table in reversed(tables):
+            connection.exec_driver_sql(f"DROP TABLE {table.name}")
+        for table in tables:
+            connection.exec_driver_sql(
+                f"ALTER TABLE {table.name}__new RENAME TO {table.name}"
+            )
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+            if table is Note.__table__:
+                for statement in NOTE_SEARCH_DDL:
+                    connection.exec_driver_sql(statement)
+        connection.exec_driver_sql("DROP TABLE upgrade_progress")
+        violations = connection.exec_driver_sql(
+            "PRAGMA foreign_key_check"
+        ).all()
+        if violations:
+            raise RuntimeError(f"Foreign key violations: {violations}")
+
+
+def upgrade_database(db, chunk_size=UPGRADE_CHUNK_SIZE, progress=print):
+    """
+    Upgrade the tables of an existing database without dropping its data.
+
+    Every table whose definition differs from the models is copied into a
+    new table in bounded chunks while triggers mirror concurrent writes.
+    The new tables then replace the old ones in a single transaction. If
+    the upgrade is interrupted, the old tables are untouched and running it
+    again resumes the copy where it stopped.
+
+    Args:
+        db: The SQLAlchemy database object to use.
+        chunk_size: The number of rows to copy per transaction.
+        progress: A callable receiving progress messages.
+
+    Returns:
+        The names of the upgraded tables.
+    """
+    db.create_all()
+    tables = outdated_tables(db)
+    if not tables:
+        progress("Database schema is up to date")
+        return []
+
+    with transaction(db.engine) as connection:
+        for table in tables:
+            prepare_upgrade(connection, table)
+    for table in tables:
+        copy_rows(db.engine, table, chunk_size, progress)
+    swap_tables(db.engine, tables)
+    progress(f"Upgraded tables: {', '.join(table.name for table in tables)}")
+    return [table.name for table in tables]
+
+
+if __name__ == "__main__":
+    with default_app().app_context():
+        try:
+            has_people = db.session.query(Person.id).first() is not None
+        except OperationalError:
+            has_people = False
+        db.session.close()
 
-    if not existing_people:
-        create_database(db)
-    else:
-        update_database(db, existing_people, existing_notes)
+        if not has_people:
+            create_database(db)
+        else:
+            upgrade_database(db)
+        upgrade(db.engine)
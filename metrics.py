@@ -0,0 +1,411 @@
+"""
+Per-request instrumentation and a Prometheus /metrics endpoint.
+
+Every request records its latency under the operationId it was routed to,
+along with the number and total duration of the SQL statements it ran and
+the time it spent serializing its response. The breakdown is sent back in a
+Server-Timing header, and the totals are served at /metrics in the
+Prometheus text format.
+
+Recording a request costs a few perf_counter() calls and one short lock, so
+the instrumentation stays on. Metrics live in the memory of the process, so
+every worker of a multi-process server reports its own.
+"""
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from functools import wraps
+from time import perf_counter
+
+from flask import Response, current_app, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+
+# The upper bounds, in seconds, of the request latency histogram buckets.
+BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+# The content type of the Prometheus text exposition format.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# The Timings of the request handled by the current thread or task, or None
+# outside of requests.
+current_timings = ContextVar("current_timings", default=None)
+
+
+class Timings:
+    """
+    The time one request spent in the database and in serialization.
+
+    Args:
+        operation: The operationId or endpoint name of the request.
+
+    Attributes:
+        operation (str): The operationId or endpoint name of the request.
+        started (float): The perf_counter() value the request started at.
+        sql_statements (int): The number of SQL statements executed.
+        sql_seconds (float): The time the SQL statements took.
+        serialize_seconds (float): The time spent serializing.
+        serializing (bool): Whether a timed serializer is running, so nested
+            serializers aren't counted twice.
+    """
+
+    __slots__ = (
+        "operation",
+        "started",
+        "sql_statements",
+        "sql_seconds",
+        "serialize_seconds",
+        "serializing",
+    )
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.started = perf_counter()
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.serializing = False
+
+    def server_timing(self, elapsed):
+        """
+        Format the timings as a Server-Timing header value.
+
+        Args:
+            elapsed: The total time of the request, in seconds.
+
+        Returns:
+            The header value, with durations in milliseconds.
+        """
+        return (
+            f'db;dur={self.sql_seconds * 1000:.3f};'
+            f'desc="{self.sql_statements} statements", '
+            f"serialize;dur={self.serialize_seconds * 1000:.3f}, "
+            f"total;dur={elapsed * 1000:.3f}"
+        )
+
+
+def timed_serializer(func):
+    """
+    Count the time a function takes as serialization time of the request.
+
+    Args:
+        func: The serializing function.
+
+    Returns:
+        The wrapped function. Outside of requests it calls func directly.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        timings = current_timings.get()
+        if timings is None or timings.serializing:
+            return func(*args, **kwargs)
+        timings.serializing = True
+        started = perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings.serialize_seconds += perf_counter() - started
+            timings.serializing = False
+
+    return wrapper
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, timing the responses Connexion serializes."""
+
+    dumps = timed_serializer(DefaultJSONProvider.dumps)
+
+
+class Histogram:
+    """
+    A cumulative histogram of observed values.
+
+    Args:
+        buckets: The sorted upper bounds of the buckets.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        # One count per bucket and one for values above the last bound.
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self):
+        """
+        List the cumulative bucket counts, the sum and the count.
+
+        Returns:
+            A list of (suffix, extra labels, value) tuples.
+        """
+        samples = []
+        total = 0
+        bounds = [*(repr(bound) for bound in self.buckets), "+Inf"]
+        for bound, count in zip(bounds, self.counts):
+            total += count
+            samples.append(("_bucket", f',le="{bound}"', total))
+        samples.append(("_sum", "", self.sum))
+        samples.append(("_count", "", total))
+        return samples
+
+
+class Metrics:
+    """
+    The metrics an app has recorded, kept in app.extensions["metrics"].
+
+    Attributes:
+        operations (dict): Maps endpoint names to operationIds.
+        collectors (list): Callables returning more metric families to
+            render, as (name, kind, description, samples) tuples.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.operations = {}
+        self.latency = defaultdict(Histogram)
+        self.requests = Counter()
+        self.sql_statements = Counter()
+        self.sql_seconds = Counter()
+        self.serialize_seconds = Counter()
+        self.routes = Counter()
+        self.collectors = []
+
+    def operation(self, endpoint):
+        """Name the operation of an endpoint, e.g. "people.read_one"."""
+        return self.operations.get(endpoint, endpoint)
+
+    def record(self, operation, status, elapsed, timings):
+        """
+        Add a finished request to the metrics.
+
+        Args:
+            operation: The operationId or endpoint name of the request.
+            status: The response status code.
+            elapsed: The latency of the request, in seconds.
+            timings: The request's Timings.
+        """
+        with self.lock:
+            self.latency[operation].observe(elapsed)
+            self.requests[operation, status] += 1
+            self.sql_statements[operation] += timings.sql_statements
+            self.sql_seconds[operation] += timings.sql_seconds
+            self.serialize_seconds[operation] += timings.serialize_seconds
+
+    def record_route(self, operation, target, reason):
+        """
+        Count where a request's reads were routed, see routing.py.
+
+        Args:
+            operation: The operationId or endpoint name of the request.
+            target: "primary" or "replica".
+            reason: Why, e.g. "read_your_writes".
+        """
+        with self.lock:
+            self.routes[operation, target, reason] += 1
+
+    def render(self):
+        """
+        Format the metrics in the Prometheus text exposition format.
+
+        Returns:
+            The metrics as a string.
+        """
+        lines = []
+
+        def family(name, kind, description, samples):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{name}{suffix}{{{labels}}} {value}")
+
+        with self.lock:
+            family(
+                "maigee_request_duration_seconds",
+                "histogram",
+                "Request latency by operation.",
+                [
+                    (suffix, f'operation="{operation}"{extra}', value)
+                    for operation, histogram in sorted(self.latency.items())
+                    for suffix, extra, value in histogram.samples()
+                ],
+            )
+            family(
+                "maigee_requests_total",
+                "counter",
+                "Requests by operation and status code.",
+                [
+                    ("", f'operation="{operation}",status="{status}"', count)
+                    for (operation, status), count in sorted(
+                        self.requests.items()
+                    )
+                ],
+            )
+            for name, counter, description in (
+                (
+                    "maigee_sql_statements_total",
+                    self.sql_statements,
+                    "SQL statements executed by operation.",
+                ),
+                (
+                    "maigee_sql_duration_seconds_total",
+                    self.sql_seconds,
+                    "Time spent executing SQL statements by operation.",
+                ),
+                (
+                    "maigee_serialization_duration_seconds_total",
+                    self.serialize_seconds,
+                    "Time spent serializing responses by operation.",
+                ),
+            ):
+                family(
+                    name,
+                    "counter",
+                    description,
+                    [
+                        ("", f'operation="{operation}"', value)
+                        for operation, value in sorted(counter.items())
+                    ],
+                )
+            family(
+                "maigee_db_routes_total",
+                "counter",
+                "Requests by operation and the database their reads used.",
+                [
+                    (
+                        "",
+                        f'operation="{operation}",target="{target}",'
+                        f'reason="{reason}"',
+                        count,
+                    )
+                    for (operation, target, reason), count in sorted(
+                        self.routes.items()
+                    )
+                ],
+            )
+        for collect in self.collectors:
+            for name, kind, description, samples in collect():
+                family(name, kind, description, samples)
+        return "\n".join(lines) + "\n"
+
+
+def operation_ids(api):
+    """
+    Map the endpoint names of a Connexion API to their operationIds.
+
+    Args:
+        api: The FlaskApi returned by add_api().
+
+    Returns:
+        A dict mapping endpoint names to operationIds.
+    """
+    from connexion.apis.flask_utils import flaskify_endpoint
+
+    operations = [
+        operation["operationId"]
+        for item in api.specification["paths"].values()
+        for operation in item.values()
+        if isinstance(operation, dict) and "operationId" in operation
+    ]
+    return {
+        f"{api.blueprint.name}.{flaskify_endpoint(operation_id)}": operation_id
+        for operation_id in operations
+    }
+
+
+def instrument_engine(engine):
+    """
+    Count the SQL statements a request runs on an engine, and their time.
+
+    Args:
+        engine: The SQLAlchemy engine.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_statement(conn, cursor, statement, params, context, many):
+        if current_timings.get() is not None:
+            conn.info.setdefault("statement_started", []).append(
+                perf_counter()
+            )
+
+    def finish(conn):
+        timings = current_timings.get()
+        started = conn.info.get("statement_started")
+        if timings is not None and started:
+            timings.sql_statements += 1
+            timings.sql_seconds += perf_counter() - started.pop()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def finish_statement(conn, cursor, statement, params, context, many):
+        finish(conn)
+
+    @event.listens_for(engine, "handle_error")
+    def fail_statement(exception_context):
+        if exception_context.connection is not None:
+            finish(exception_context.connection)
+
+
+def start_request():
+    metrics = current_app.extensions["metrics"]
+    endpoint = request.url_rule.endpoint if request.url_rule else "unrouted"
+    current_timings.set(Timings(metrics.operation(endpoint)))
+
+
+def finish_request(response):
+    """
+    Record the request and add its Server-Timing header.
+
+    Streamed bodies are produced after this runs, so their latency is the
+    time to the first byte.
+    """
+    timings = current_timings.get()
+    if timings is None:
+        return response
+    elapsed = perf_counter() - timings.started
+    current_app.extensions["metrics"].record(
+        timings.operation, response.status_code, elapsed, timings
+    )
+    response.headers["Server-Timing"] = timings.server_timing(elapsed)
+    return response
+
+
+def reset_request(error=None):
+    current_timings.set(None)
+
+
+def export():
+    """Serve the metrics in the Prometheus text format."""
+    return Response(
+        current_app.extensions["metrics"].render(), content_type=CONTENT_TYPE
+    )
+
+
+def init_app(app, engine, *apis):
+    """
+    Instrument a Flask app and serve its metrics at /metrics.
+
+    Args:
+        app: The Flask app.
+        engine: The database engine the app's requests use. The replica
+            engines of the app, if any, are instrumented too.
+        *apis: The Connexion APIs added to the app, whose requests are
+            labelled with their operationId.
+    """
+    metrics = app.extensions["metrics"] = Metrics()
+    for api in apis:
+        metrics.operations.update(operation_ids(api))
+    app.json = JSONProvider(app)
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.teardown_request(reset_request)
+    app.add_url_rule("/metrics", "metrics", export)
+    instrument_engine(engine)
+    replicas = app.extensions.get("replicas")
+    for replica in replicas.engines if replicas else ():
+        instrument_engine(replica)
@@ -0,0 +1,190 @@
+"""
+Schema migrations for existing databases.
+
+Each entry in MIGRATIONS upgrades the schema by one version. The version a
+database is at is kept in SQLite's user_version pragma, so a migration runs
+once per database, inside the same transaction that records it.
+
+Run ``python migrations.py`` to upgrade the configured database in place,
+or ``python migrations.py rebuild-search`` to rebuild the note search index
+from the note table.
+"""
+import sys
+from contextlib import contextmanager
+
+from sqlalchemy import MetaData
+from sqlalchemy.schema import CreateTable
+
+from config import db, default_app
+from models import NOTE_SEARCH_DDL, Note, Person
+
+
+def add_indexes(connection):
+    """
+    Add the indexes declared on the note and person tables.
+
+    Args:
+        connection: The connection the migration runs on.
+    """
+    for table in (Note.__table__, Person.__table__):
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+    connection.exec_driver_sql("ANALYZE")
+
+
+def add_note_search(connection):
+    """
+    Add the full-text search index over note content and fill it.
+
+    Args:
+        connection: The connection the migration runs on.
+    """
+    for statement in NOTE_SEARCH_DDL:
+        connection.exec_driver_sql(statement)
+    rebuild_note_search(connection)
+
+
+def rebuild_note_search(connection):
+    """
+    Rebuild the note search index from the current contents of the note table.
+
+    Args:
+        connection: The connection to rebuild the index on.
+    """
+    connection.exec_driver_sql(
+        "INSERT INTO note_fts (note_fts) VALUES ('rebuild')"
+    )
+    connection.exec_driver_sql(
+        "INSERT INTO note_fts (note_fts) VALUES ('optimize')"
+    )
+
+
+def cascade_note_deletes(connection):
+    """
+    Rebuild the note table, so its foreign key deletes the notes of a
+    deleted person.
+
+    SQLite can't alter a foreign key in place, so the table is copied into
+    a new one created from the model, which replaces it along with its
+    indexes and search triggers. Foreign keys are checked when the migration
+    commits. Tables already deleting their notes, e.g. those created from
+    the models, are left as they are.
+
+    Args:
+        connection: The connection the migration runs on.
+    """
+    if any(
+        row.table == "person" and row.on_delete == "CASCADE"
+        for row in connection.exec_driver_sql("PRAGMA foreign_key_list(note)")
+    ):
+        return
+    table = Note.__table__
+    existing = {
+        row.name
+        for row in connection.exec_driver_sql("PRAGMA table_info(note)")
+    }
+    names = ", ".join(
+        column.name for column in table.columns if column.name in existing
+    )
+
+    connection.exec_driver_sql("PRAGMA defer_foreign_keys = ON")
+    # The copy's foreign key points at the person table of the models.
+    scratch = MetaData()
+    for other in db.metadata.sorted_tables:
+        other.to_metadata(scratch)
+    connection.execute(
+        CreateTable(table.to_metadata(scratch, name="note__new"))
+    )
+    connection.exec_driver_sql(
+        f"INSERT INTO note__new ({names}) SELECT {names} FROM note"
+    )
+    connection.exec_driver_sql("DROP TABLE note")
+    connection.exec_driver_sql("ALTER TABLE note__new RENAME TO note")
+    for index in table.indexes:
+        index.create(connection)
+    for statement in NOTE_SEARCH_DDL:
+        connection.exec_driver_sql(statement)
+
+
+MIGRATIONS = [add_indexes, add_note_search, cascade_note_deletes]
+
+
+def current_version(connection):
+    """
+    Read the schema version of a database.
+
+    Args:
+        connection: A connection to the database.
+
+    Returns:
+        The number of migrations already applied.
+    """
+    return connection.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+@contextmanager
+def transaction(engine, foreign_keys=True):
+    """
+    Open a connection whose statements, DDL included, run in one transaction.
+
+    pysqlite only opens a transaction implicitly before INSERT, UPDATE and
+    DELETE, so DDL would otherwise be committed statement by statement. The
+    connection runs in autocommit mode and the transaction is managed here.
+
+    Args:
+        engine: The engine to connect with.
+        foreign_keys: Pass False to switch foreign key enforcement off for
+            the transaction, as SQLite requires when tables are rebuilt.
+
+    Yields:
+        The connection, inside a transaction that is committed on success
+        and rolled back on error.
+    """
+    with engine.connect().execution_options(
+        isolation_level="AUTOCOMMIT"
+    ) as connection:
+        enforced = connection.exec_driver_sql("PRAGMA foreign_keys").scalar()
+        if not foreign_keys:
+            connection.exec_driver_sql("PRAGMA foreign_keys = OFF")
+        try:
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.exec_driver_sql("ROLLBACK")
+                raise
+            connection.exec_driver_sql("COMMIT")
+        finally:
+            connection.exec_driver_sql(f"PRAGMA foreign_keys = {enforced}")
+
+
+def upgrade(engine):
+    """
+    Apply all pending migrations to a database.
+
+    Args:
+        engine: The engine of the database to upgrade.
+
+    Returns:
+        The schema version the database is at afterwards.
+    """
+    with transaction(engine) as connection:
+        version = current_version(connection)
+        for number, migration in enumerate(
+            MIGRATIONS[version:], start=version + 1
+        ):
+            migration(connection)
+            connection.exec_driver_sql(f"PRAGMA user_version = {number}")
+            print(f"Applied migration {number}: {migration.__name__}")
+            version = number
+    return version
+
+
+if __name__ == "__main__":
+    with default_app().app_context():
+        if sys.argv[1:] == ["rebuild-search"]:
+            with transaction(db.engine) as connection:
+                rebuild_note_search(connection)
+            print("Rebuilt the note search index")
+        else:
+            print(f"Database is at version {upgrade(db.engine)}")
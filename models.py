@@ -1,7 +1,14 @@
 from datetime import datetime
 
+from flask import current_app
 from marshmallow_sqlalchemy import fields
+from sqlalchemy import DDL, event
+from sqlalchemy.orm import joinedload, selectinload
+
 from config import db, ma
+from metrics import timed_serializer
+
+NOTES_LOADERS = {"selectin": selectinload, "joined": joinedload}
 
 
 class Note(db.Model):
@@ -16,12 +23,59 @@ class Note(db.Model):
     """
     __tablename__ = "note"
     id = db.Column(db.Integer, primary_key=True)
-    person_id = db.Column(db.Integer, db.ForeignKey("person.id"))
+    # The database deletes the notes of a deleted person itself, see
+    # Person.notes.
+    person_id = db.Column(
+        db.Integer, db.ForeignKey("person.id", ondelete="CASCADE")
+    )
     content = db.Column(db.String, nullable=False)
     timestamp = db.Column(
         db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
     )
 
+    # Serves both lookups by person_id and the newest-first ordering of
+    # Person.notes without a separate sort.
+    __table_args__ = (
+        db.Index(
+            "ix_note_person_id_timestamp", person_id, timestamp.desc()
+        ),
+    )
+
+
+# An external-content FTS5 index over Note.content. It stores only the index,
+# not a copy of the text, and triggers keep it in sync with every insert,
+# update and delete on the note table, whichever code path issues them.
+NOTE_SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS note_fts USING fts5(
+        content, content='note', content_rowid='id',
+        tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS note_fts_insert AFTER INSERT ON note BEGIN
+        INSERT INTO note_fts (rowid, content) VALUES (new.id, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS note_fts_delete AFTER DELETE ON note BEGIN
+        INSERT INTO note_fts (note_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS note_fts_update AFTER UPDATE ON note BEGIN
+        INSERT INTO note_fts (note_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+        INSERT INTO note_fts (rowid, content) VALUES (new.id, new.content);
+    END""",
+]
+
+for statement in NOTE_SEARCH_DDL:
+    event.listen(
+        Note.__table__,
+        "after_create",
+        DDL(statement).execute_if(dialect="sqlite"),
+    )
+event.listen(
+    Note.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS note_fts").execute_if(dialect="sqlite"),
+)
+
 
 class NoteSchema(ma.SQLAlchemyAutoSchema):
     """
@@ -39,6 +93,8 @@ class NoteSchema(ma.SQLAlchemyAutoSchema):
         sqla_session = db.session
         include_fk = True
 
+    dump = timed_serializer(ma.SQLAlchemyAutoSchema.dump)
+
 
 class Person(db.Model):
     """
@@ -53,17 +109,20 @@ class Person(db.Model):
     """
     __tablename__ = "person"
     id = db.Column(db.Integer, primary_key=True)
-    lname = db.Column(db.String(32), nullable=False)
+    lname = db.Column(db.String(32), nullable=False, index=True)
     fname = db.Column(db.String(32))
     timestamp = db.Column(
         db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
     )
 
+    # passive_deletes leaves the notes of a deleted person to the ON DELETE
+    # CASCADE foreign key instead of loading and deleting them one by one.
     notes = db.relationship(
         Note,
         backref="person",
         cascade="all, delete, delete-orphan",
         single_parent=True,
+        passive_deletes=True,
         order_by="desc(Note.timestamp)",
     )
 
@@ -86,6 +145,24 @@ class PersonSchema(ma.SQLAlchemyAutoSchema):
 
     notes = fields.Nested(NoteSchema, many=True)
 
+    dump = timed_serializer(ma.SQLAlchemyAutoSchema.dump)
+
+
+def load_notes(strategy=None):
+    """
+    Build a loader option that eager loads Person.notes.
+
+    Args:
+        strategy: "selectin" or "joined". Defaults to the
+            NOTES_LOADING_STRATEGY setting of the current app.
+
+    Returns:
+        A loader option to pass to Query.options().
+    """
+    if strategy is None:
+        strategy = current_app.config.get("NOTES_LOADING_STRATEGY", "selectin")
+    return NOTES_LOADERS[strategy](Person.notes)
+
 
 note_schema = NoteSchema()
 person_schema = PersonSchema()
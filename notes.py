@@ -1,7 +1,55 @@
-from flask import abort, make_response
+import base64
+from html import escape
+from urllib.parse import urlencode
 
+from flask import abort, make_response, request
+from sqlalchemy import (
+    and_,
+    column,
+    func,
+    literal_column,
+    or_,
+    select,
+    table,
+)
+from sqlalchemy.exc import OperationalError
+
+import batch
+import conditional
+import updates
+from cache import invalidate, note_key, response_cache
+from changes import publish
 from config import db
-from models import Note, Person, note_schema
+from group_commit import queued_insert, write_queue
+from models import Note, NoteSchema, Person, note_schema
+from routing import on_replica
+from serializers import (
+    columns,
+    dump_note,
+    encode,
+    encoded_response,
+    json_response,
+    parse_datetime,
+)
+
+note_fts = table("note_fts", column("rowid"))
+
+# Mark the matches in search snippets, so the snippet's text can be
+# HTML-escaped before they're replaced with <em> tags. They're control
+# characters, which don't occur in note text, and a stray one could only add
+# an <em> tag, never other markup.
+SNIPPET_START = "\x02"
+SNIPPET_END = "\x03"
+
+# Notes per page of a person's notes, unless the request asks for another
+# size, and on the note page of a person payload.
+NOTES_PAGE_SIZE = 20
+
+# Loads the fields of PUT and PATCH bodies as a plain dict.
+update_schema = NoteSchema(load_instance=False, only=("content",))
+
+# Loads POST bodies as a plain dict, for the write queue and batch creates.
+insert_schema = NoteSchema(load_instance=False, exclude=("id", "timestamp"))
 
 
 def read_one(note_id):
@@ -12,40 +60,127 @@ def read_one(note_id):
     - note_id: The ID of the note to be retrieved.
     
     Returns:
-    - If the note exists, returns the serialized version of the note.
+    - If the note exists, returns the serialized version of the note, from
+      the response cache when possible, or a 304 status code if the
+      client's copy is still current.
     - If the note does not exist, returns a 404 error message.
     """
-    note = Note.query.get(note_id)
+    key = note_key(note_id)
+    cached = response_cache().get(key) if key else None
 
-    if note is not None:
-        return note_schema.dump(note)
-    else:
-        abort(404, f"Note with ID {note_id} not found")
+    if cached is None:
+        generation = response_cache().generation(key) if key else None
+        note = Note.query.get(note_id)
+        if note is None:
+            abort(404, f"Note with ID {note_id} not found")
+        current = note_validators(note)
+        response = conditional.not_modified(current)
+        if response is not None:
+            return response
+        cached = (encode(dump_note(note)), current)
+        # What a replica returns may already be stale, see routing.py.
+        if key and not on_replica():
+            response_cache().set(key, cached, generation)
+        return encoded_response(cached[0], 200, conditional.headers(current))
+
+    data, current = cached
+    response = conditional.not_modified(current)
+    if response is not None:
+        return response
+    return encoded_response(data, 200, conditional.headers(current))
 
 
+def note_validators(note):
+    """
+    Build the validators of a note from its ID and timestamp.
+
+    Args:
+    - note: The Note object.
+
+    Returns:
+    - The note's Validators.
+    """
+    return conditional.validators(
+        "note", note.id, note.timestamp, timestamps=(note.timestamp,)
+    )
+
 
 def update(note_id, note):
     """
-    Update an existing note based on the note_id and the new content provided.
+    Replace the content of an existing note with a single UPDATE statement.
     
     Args:
     - note_id: The ID of the note to be updated.
     - note: The new content to be added to the note.
     
     Returns:
-    - If the note exists, returns the serialized version of the updated note and a 201 status code.
+    - If the note exists, returns the serialized version of the updated note and a 201 status code,
+      with the note's new ETag.
     - If the note does not exist, returns a 404 error message.
+    - If If-Match doesn't match the note's current ETag, returns a 412 error message.
+    - If the content is invalid, returns the validation errors and a 422 status code.
     """
-    existing_note = Note.query.get(note_id)
+    return _update(note_id, note, False, 201)
 
-    if existing_note:
-        update_note = note_schema.load(note, session=db.session)
-        existing_note.content = update_note.content
-        db.session.merge(existing_note)
-        db.session.commit()
-        return note_schema.dump(existing_note), 201
-    else:
+
+def patch(note_id, note):
+    """
+    Update only the supplied fields of an existing note with a single UPDATE
+    statement.
+
+    Args:
+    - note_id: The ID of the note to be updated.
+    - note: The fields to change.
+
+    Returns:
+    - If the note exists, returns the serialized version of the updated note
+      and a 200 status code, with the note's new ETag.
+    - If the note does not exist, returns a 404 error message.
+    - If If-Match doesn't match the note's current ETag, returns a 412 error
+      message.
+    - If a field is invalid, returns the validation errors and a 422 status
+      code.
+    """
+    return _update(note_id, note, True, 200)
+
+
+def _update(note_id, fields, partial, status):
+    """
+    Validate the fields of a PUT or PATCH body and apply them.
+
+    The note is only read beforehand to check If-Match, in the write
+    transaction of the update, see conditional.begin_write(). Otherwise the
+    UPDATE statement returns the new row, or no row if the note does not
+    exist.
+
+    Args:
+    - note_id: The ID of the note to be updated.
+    - fields: The raw request body.
+    - partial: True to validate only the supplied fields.
+    - status: The status code of a successful update.
+
+    Returns:
+    - The response of the update.
+    """
+    values, errors = updates.load(update_schema, fields, partial)
+    if errors:
+        return {"errors": errors}, 422
+    if "If-Match" in request.headers:
+        conditional.begin_write(db.session.connection())
+        existing_note = db.session.get(Note, note_id)
+        if existing_note is None:
+            abort(404, f"Note with ID {note_id} not found")
+        conditional.require_match(note_validators(existing_note), request.headers)
+
+    statement = updates.update_statement(Note, note_id, values)
+    row = db.session.execute(statement).one_or_none()
+    if row is None:
         abort(404, f"Note with ID {note_id} not found")
+    db.session.commit()
+    invalidate(person_ids=[row.person_id], note_ids=[row.id])
+    publish("note.updated", [dump_note(row)])
+    headers = conditional.headers(note_validators(row))
+    return dump_note(row), status, headers
 
 
 def delete(note_id):
@@ -58,12 +193,22 @@ def delete(note_id):
     Returns:
     - If the note exists, returns a 204 status code and a success message.
     - If the note does not exist, returns a 404 error message.
+    - If If-Match doesn't match the note's current ETag, returns a 412 error message.
     """
+    if "If-Match" in request.headers:
+        conditional.begin_write(db.session.connection())
     existing_note = Note.query.get(note_id)
 
     if existing_note:
+        conditional.require_match(note_validators(existing_note), request.headers)
+        deleted = {
+            "id": existing_note.id,
+            "person_id": existing_note.person_id,
+        }
         db.session.delete(existing_note)
         db.session.commit()
+        invalidate(person_ids=[deleted["person_id"]], note_ids=[note_id])
+        publish("note.deleted", [deleted])
         return make_response(f"{note_id} successfully deleted", 204)
     else:
         abort(404, f"Note with ID {note_id} not found")
@@ -78,19 +223,426 @@ def create(note):
     
     Returns:
     - If the person exists, returns the serialized version of the new note and a 201 status code.
+      With WRITE_QUEUE on, the note is inserted by the next group commit.
     - If the person does not exist, returns a 404 error message.
     """
     person_id = note.get("person_id")
     person = Person.query.get(person_id)
 
-def create(note):
-    person_id = note.get("person_id")
-    person = Person.query.get(person_id)
-
     if person:
-        new_note = note_schema.load(note, session=db.session)
-        person.notes.append(new_note)
-        db.session.commit()
-        return note_schema.dump(new_note), 201
+        if write_queue() is not None:
+            payload = dump_note(queued_insert(Note, insert_schema.load(note)))
+        else:
+            new_note = note_schema.load(note, session=db.session)
+            person.notes.append(new_note)
+            db.session.commit()
+            payload = note_schema.dump(new_note)
+        invalidate(person_ids=[person_id])
+        publish("note.created", [payload])
+        return payload, 201
     else:
         abort(404, f"Person not found for ID: {person_id}")
+
+
+def create_batch(notes, mode="atomic"):
+    """
+    Create many notes with a single INSERT statement.
+
+    Args:
+    - notes: A list of note data, each with a person_id and content.
+    - mode: "atomic" to create no notes if any note is invalid, or "partial"
+      to create the valid notes and skip the others.
+
+    Returns:
+    - A JSON object with the new IDs in request order and the errors of the
+      invalid notes, including notes whose person does not exist.
+    - In atomic mode, invalid input returns a 422 status code.
+    """
+    rows, errors = batch.validate(insert_schema, notes)
+
+    person_ids = {row.get("person_id") for row in rows if row is not None}
+    existing = set(
+        db.session.execute(
+            select(Person.id).where(Person.id.in_(person_ids))
+        ).scalars()
+    )
+    reject_missing_people(rows, errors, existing)
+
+    body, status = batch.create(Note, rows, errors, mode)
+    invalidate(
+        person_ids={row["person_id"] for row in rows if row is not None}
+    )
+    publish("note.created", batch.created(rows, body))
+    return body, status
+
+
+def reject_missing_people(rows, errors, existing):
+    """
+    Mark the notes of a batch whose person does not exist as invalid.
+
+    Args:
+    - rows: The loaded rows, with None for invalid notes. Updated in place.
+    - errors: The errors of the invalid notes, by index. Updated in place.
+    - existing: The set of IDs of the people that exist.
+    """
+    for index, row in enumerate(rows):
+        person_id = None if row is None else row.get("person_id")
+        if row is not None and person_id not in existing:
+            errors[index] = {
+                "person_id": [f"Person not found for ID: {person_id}"]
+            }
+            rows[index] = None
+
+
+def search(q, limit=20, offset=0):
+    """
+    Search note content with the full-text index, best matches first.
+
+    Args:
+    - q: The words to search for. A word ending in * matches as a prefix.
+    - limit: The maximum number of notes to return.
+    - offset: The number of matching notes to skip.
+
+    Returns:
+    - A list of serialized notes, each with a highlighted "snippet" and its
+      bm25 "rank", where lower is better.
+    - When more matches are available, a Link header with rel="next" points
+      to the following page.
+    """
+    expression = match_expression(q)
+    if not expression:
+        return json_response([])
+
+    try:
+        rows = db.session.execute(
+            search_statement(expression, limit, offset)
+        ).all()
+    except OperationalError as error:
+        abort(400, f"Invalid search query: {error.orig}")
+
+    results, headers = search_page(request.base_url, rows, q, limit, offset)
+    return json_response(results, 200, headers)
+
+
+def search_statement(expression, limit, offset):
+    """
+    Build the full-text search query of a page of notes.
+
+    One more note than the page holds is selected, to tell whether another
+    page follows.
+
+    Args:
+    - expression: The FTS5 query built by match_expression().
+    - limit: The maximum number of notes on the page.
+    - offset: The number of matching notes to skip.
+
+    Returns:
+    - A select statement.
+    """
+    fts = literal_column("note_fts")
+    rank = func.bm25(fts).label("rank")
+    snippet = func.snippet(fts, 0, SNIPPET_START, SNIPPET_END, "...", 16)
+    return (
+        select(*Note.__table__.columns, snippet.label("snippet"), rank)
+        .select_from(note_fts)
+        .join(Note, Note.id == note_fts.c.rowid)
+        .where(fts.op("MATCH")(expression))
+        .order_by(rank, Note.id)
+        .limit(limit + 1)
+        .offset(offset)
+    )
+
+
+def search_page(base_url, rows, q, limit, offset):
+    """
+    Serialize the rows returned by search_statement().
+
+    Args:
+    - base_url: The URL of the search endpoint without its query string.
+    - rows: The result rows.
+    - q, limit, offset: The search parameters.
+
+    Returns:
+    - A tuple of the serialized notes and the response headers, with a Link
+      header with rel="next" when more matches are available.
+    """
+    results = [
+        {**dump_note(row), "snippet": highlight(row.snippet), "rank": row.rank}
+        for row in rows[:limit]
+    ]
+    headers = {}
+    if len(rows) > limit:
+        params = urlencode({"q": q, "limit": limit, "offset": offset + limit})
+        headers["Link"] = f'<{base_url}?{params}>; rel="next"'
+    return results, headers
+
+
+def highlight(snippet):
+    """
+    Turn a snippet of search_statement() into HTML.
+
+    Args:
+    - snippet: The snippet, with its matches between SNIPPET_START and
+      SNIPPET_END.
+
+    Returns:
+    - The snippet's text, HTML-escaped, with its matches wrapped in <em>
+      tags.
+    """
+    return (
+        escape(snippet)
+        .replace(SNIPPET_START, "<em>")
+        .replace(SNIPPET_END, "</em>")
+    )
+
+
+def match_expression(q):
+    """
+    Turn a search string into an FTS5 query matching all of its words.
+
+    Every word is quoted, so FTS5 operators in the search string are matched
+    as plain text instead of raising syntax errors.
+
+    Args:
+    - q: The search string.
+
+    Returns:
+    - The FTS5 query, or an empty string if q has no words.
+    """
+    terms = []
+    for word in q.split():
+        suffix = ""
+        if word.endswith("*") and word.strip("*"):
+            word, suffix = word.rstrip("*"), "*"
+        terms.append('"' + word.replace('"', '""') + '"' + suffix)
+    return " ".join(terms)
+
+
+def read_by_person(
+    person_id,
+    limit=NOTES_PAGE_SIZE,
+    cursor=None,
+    since=None,
+    until=None,
+    count=False,
+):
+    """
+    Retrieve a page of a person's notes, newest first.
+
+    Pages are keyset paginated on (timestamp desc, id), which the
+    (person_id, timestamp desc) index returns in order, so every page costs
+    the same however deep it is.
+
+    Args:
+    - person_id: The ID of the person.
+    - limit: The maximum number of notes to return.
+    - cursor: The cursor of the page, from the Link header of the previous
+      page. Without it the first page is returned.
+    - since: Only return notes changed at or after this ISO 8601 datetime.
+    - until: Only return notes changed before this ISO 8601 datetime.
+    - count: Return the number of matching notes instead of a page.
+
+    Returns:
+    - A list of serialized notes, or an object with the "count" of matching
+      notes, or a 304 status code if the client's copy is still current.
+    - When more notes are available, a Link header with rel="next" points
+      to the following page.
+    - If the person does not exist, returns a 404 error message.
+    - If a cursor or datetime is invalid, returns a 400 error message.
+    """
+    criteria, position = person_notes_filters(person_id, cursor, since, until)
+    stats = conditional.aggregate(*person_notes_sources(person_id, criteria))
+    current = person_notes_validators(
+        person_id, (limit, cursor, since, until, count), stats
+    )
+    if current is None:
+        abort(404, f"Person with ID {person_id} not found")
+    response = conditional.not_modified(current)
+    if response is not None:
+        return response
+
+    headers = conditional.headers(current)
+    if count:
+        return json_response({"count": stats[1][0]}, 200, headers)
+    rows = db.session.execute(
+        person_notes_statement(criteria, position, limit)
+    ).all()
+    results, next_cursor = person_notes_page(rows, limit)
+    if next_cursor is not None:
+        headers["Link"] = person_notes_link(
+            request.base_url, limit, next_cursor, since, until
+        )
+    return json_response(results, 200, headers)
+
+
+def person_notes_filters(person_id, cursor, since, until):
+    """
+    Turn the parameters of a page of a person's notes into criteria.
+
+    Args:
+    - person_id: The ID of the person.
+    - cursor: The cursor of the page, or None for the first page.
+    - since, until: The ISO 8601 bounds of the time range, or None.
+
+    Returns:
+    - A tuple of the criteria selecting all the matching notes and the
+      position the page starts after, or None for the first page.
+
+    Raises:
+    - 400 error: If the cursor or a datetime is invalid.
+    """
+    criteria = [Note.person_id == person_id]
+    try:
+        if since is not None:
+            criteria.append(Note.timestamp >= parse_datetime(since))
+        if until is not None:
+            criteria.append(Note.timestamp < parse_datetime(until))
+        position = None if cursor is None else decode_cursor(cursor)
+    except ValueError as error:
+        abort(400, f"Invalid parameter: {error}")
+    return criteria, position
+
+
+def person_notes_sources(person_id, criteria):
+    """
+    List the rows a page of a person's notes depends on, for
+    conditional.aggregate().
+
+    Args:
+    - person_id: The ID of the person.
+    - criteria: The criteria from person_notes_filters().
+
+    Returns:
+    - A list of (model, criteria...) tuples: the person, which must exist,
+      and all the matching notes, whose count is the count mode's answer.
+    """
+    return [(Person, Person.id == person_id), (Note, *criteria)]
+
+
+def person_notes_validators(person_id, parameters, stats):
+    """
+    Build the validators of a page of a person's notes.
+
+    Args:
+    - person_id: The ID of the person.
+    - parameters: The request parameters the page depends on.
+    - stats: The aggregates of the page's person_notes_sources().
+
+    Returns:
+    - The page's Validators, or None if the person does not exist.
+    """
+    (found, _), (notes, modified) = stats
+    if not found:
+        return None
+    return conditional.validators(
+        "person-notes",
+        person_id,
+        *parameters,
+        notes,
+        modified,
+        timestamps=(modified,),
+    )
+
+
+def person_notes_statement(criteria, position, limit):
+    """
+    Select a page of a person's notes, newest first.
+
+    One more note than the page holds is selected, to tell whether another
+    page follows. Notes with the same timestamp are ordered by ID.
+
+    Args:
+    - criteria: The criteria from person_notes_filters().
+    - position: The (timestamp, id) the page starts after, or None.
+    - limit: The maximum number of notes on the page.
+
+    Returns:
+    - A select statement returning note rows.
+    """
+    statement = select(*(getattr(Note, name) for name in columns(Note)))
+    statement = statement.where(*criteria)
+    if position is not None:
+        timestamp, note_id = position
+        # The first condition bounds the index range the page is read from.
+        statement = statement.where(
+            Note.timestamp <= timestamp,
+            or_(
+                Note.timestamp < timestamp,
+                and_(Note.timestamp == timestamp, Note.id > note_id),
+            ),
+        )
+    return statement.order_by(Note.timestamp.desc(), Note.id).limit(
+        limit + 1
+    )
+
+
+def person_notes_page(rows, limit):
+    """
+    Serialize the rows returned by person_notes_statement().
+
+    Args:
+    - rows: The result rows.
+    - limit: The maximum number of notes on the page.
+
+    Returns:
+    - A tuple of the serialized notes and the cursor of the next page, or
+      None on the last page.
+    """
+    results = [dump_note(row) for row in rows[:limit]]
+    if len(rows) <= limit:
+        return results, None
+    return results, encode_cursor(rows[limit - 1])
+
+
+def person_notes_link(base_url, limit, cursor, since, until):
+    """
+    Build the Link header value pointing to the next page of notes.
+
+    Args:
+    - base_url: The URL of the current page without its query string.
+    - limit: The page size.
+    - cursor: The cursor of the next page.
+    - since, until: The time range of the current page, or None.
+
+    Returns:
+    - The Link header value.
+    """
+    params = {"limit": limit, "cursor": cursor}
+    if since is not None:
+        params["since"] = since
+    if until is not None:
+        params["until"] = until
+    return f'<{base_url}?{urlencode(params)}>; rel="next"'
+
+
+def encode_cursor(note):
+    """
+    Encode the position of a note as an opaque page cursor.
+
+    Args:
+    - note: The last note row of a page.
+
+    Returns:
+    - The cursor, safe to use in a URL.
+    """
+    position = f"{note.timestamp.isoformat()} {note.id}".encode()
+    return base64.urlsafe_b64encode(position).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor made by encode_cursor().
+
+    Args:
+    - cursor: The cursor.
+
+    Returns:
+    - The (timestamp, id) position the cursor points after.
+
+    Raises:
+    - ValueError: If the cursor is malformed.
+    """
+    timestamp, note_id = (
+        base64.urlsafe_b64decode(cursor.encode()).decode().split(" ")
+    )
+    return parse_datetime(timestamp), int(note_id)
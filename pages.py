@@ -0,0 +1,81 @@
+from flask import Response, current_app, stream_template
+
+import conditional
+from fragments import people_page_url, person_fragments
+from notes import NOTES_PAGE_SIZE
+from people import page_boundary, page_sources
+
+# Characters of the rendered home page sent per chunk.
+HOME_BUFFER_SIZE = 16 * 1024
+
+
+def home():
+    """
+    Displays the home page with the first HOME_PAGE_SIZE people in the
+    database, each with the first page of their notes.
+
+    The page is validated by the count and newest timestamp of the people on
+    it and their notes, so an unchanged page is answered with a 304 without
+    loading anyone. Otherwise it is streamed, and the card of each person is
+    served from the fragment cache unless they or their notes changed. The
+    browser loads the other people and notes from the API as the page
+    scrolls.
+
+    :return: The streamed home page.
+    """
+    size = current_app.config["HOME_PAGE_SIZE"]
+    last_id = page_boundary(size, 0)
+    stats = conditional.aggregate(*page_sources(0, last_id, ("notes",)))
+    current = conditional.validators(
+        "home",
+        size,
+        last_id,
+        *stats,
+        timestamps=[newest for count, newest in stats],
+    )
+    response = conditional.not_modified(current)
+    if response is not None:
+        return response
+
+    people_next = None
+    if last_id is not None:
+        people_next = people_page_url(size, last_id)
+    page = stream_template(
+        "home.html",
+        fragments=person_fragments(last_id, size, NOTES_PAGE_SIZE),
+        people_next=people_next,
+    )
+    return Response(
+        buffered(page, HOME_BUFFER_SIZE),
+        mimetype="text/html",
+        headers=conditional.headers(current),
+    )
+
+
+def buffered(fragments, size):
+    """
+    Join the small fragments a streamed template yields into larger chunks.
+
+    Args:
+        fragments: An iterable of strings.
+        size: The number of characters to collect before yielding a chunk.
+
+    Yields:
+        Chunks of at least size characters, except for the last one.
+    """
+    chunk = []
+    length = 0
+    try:
+        for fragment in fragments:
+            chunk.append(fragment)
+            length += len(fragment)
+            if length >= size:
+                yield "".join(chunk)
+                chunk = []
+                length = 0
+        if chunk:
+            yield "".join(chunk)
+    finally:
+        close = getattr(fragments, "close", None)
+        if close is not None:
+            close()
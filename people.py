@@ -1,4 +1,287 @@
-fro
+from urllib.parse import urlencode
+
+from flask import Response, abort, make_response, request, stream_with_context
+from sqlalchemy import select
+
+import batch
+import conditional
+import deletes
+import updates
+from cache import invalidate, person_key, response_cache
+from changes import publish
+from config import db
+from group_commit import queued_insert, write_queue
+from models import Note, Person, PersonSchema, load_notes, person_schema
+from notes import NOTES_PAGE_SIZE, person_notes_page, person_notes_statement
+from routing import on_replica
+from serializers import (
+    columns,
+    dump_note,
+    dump_people,
+    dump_person,
+    encode,
+    encode_items,
+    encoded_response,
+    json_response,
+)
+
+# Pages at or above this size are streamed as chunked JSON instead of being
+# serialized in one piece.
+STREAM_THRESHOLD = 500
+
+# Number of rows fetched from the database and serialized per streamed chunk.
+STREAM_CHUNK_SIZE = 100
+
+# Loads the fields of PUT and PATCH bodies as a plain dict.
+update_schema = PersonSchema(load_instance=False, only=("fname", "lname"))
+
+# Loads POST bodies as a plain dict, for the write queue and batch creates.
+insert_schema = PersonSchema(
+    load_instance=False, exclude=("id", "timestamp", "notes")
+)
+
+
+def read_all(limit=100, after=0, fields=None, include=("notes",)):
+    """
+    Retrieve a page of people using keyset pagination on the person ID.
+
+    Args:
+        limit: The maximum number of people to return.
+        after: Only return people whose ID is greater than this cursor.
+        fields: An optional list of field names to include for each person.
+        include: The relationships to include. Pass an empty list to leave
+            out the notes of each person.
+
+    Returns:
+        A JSON list of people, or a 304 if the client's copy of the page is
+        still current. When more people are available, a ``Link`` header
+        with ``rel="next"`` points to the following page.
+
+    Raises:
+        400 error: If ``fields`` names a field the person schema doesn't have.
+    """
+    only, include = page_fields(fields, include)
+    last_id = page_boundary(limit, after)
+    stats = conditional.aggregate(*page_sources(after, last_id, include))
+    current = page_validators(after, last_id, only, include, stats)
+    response = conditional.not_modified(current)
+    if response is not None:
+        return response
+
+    if "notes" in include:
+        query = Person.query
+    else:
+        # Without notes the page is dumped straight from column-only rows.
+        names = columns(Person) if only is None else only or ("id",)
+        query = db.session.query(*(getattr(Person, name) for name in names))
+    query = query.filter(Person.id > after).order_by(Person.id)
+    if last_id is not None:
+        query = query.filter(Person.id <= last_id)
+    else:
+        query = query.limit(limit)
+
+    headers = conditional.headers(current)
+    if last_id is not None:
+        headers["Link"] = next_link(
+            request.base_url, limit, last_id, fields, include
+        )
+
+    if limit < STREAM_THRESHOLD:
+        if "notes" in include:
+            query = query.options(load_notes())
+        payload = dump_people(query.all(), only, include)
+        return json_response(payload, 200, headers)
+
+    # Joined eager loading of a collection can't be combined with yield_per.
+    if "notes" in include:
+        query = query.options(load_notes("selectin"))
+
+    return Response(
+        stream_with_context(_stream_people(query, only, include)),
+        mimetype="application/json",
+        headers=headers,
+    )
+
+
+def page_fields(fields, include):
+    """
+    Work out which columns and relationships to dump for a page of people.
+
+    Args:
+        fields: An optional list of field names to restrict the output to.
+        include: The relationships to include.
+
+    Returns:
+        A tuple of the column names to dump, or None for all of them, and a
+        tuple of the relationships to include.
+
+    Raises:
+        400 error: If ``fields`` names a field the person schema doesn't have.
+    """
+    include = tuple(name for name in ("notes",) if name in include)
+    if not fields:
+        return None, include
+
+    unknown = set(fields) - set(person_schema.fields)
+    if unknown:
+        abort(400, f"Unknown fields: {', '.join(sorted(unknown))}")
+    if "notes" not in fields:
+        include = ()
+    return tuple(name for name in fields if name != "notes"), include
+
+
+def page_boundary(limit, after):
+    """
+    Find the ID of the last person on the page, if another page follows it.
+
+    Only the primary key index is read, so the boundary is known before the
+    page itself is loaded or streamed.
+
+    Args:
+        limit: The page size.
+        after: The cursor the page starts after.
+
+    Returns:
+        The ID of the last person on the page, or None on the last page.
+    """
+    ids = db.session.execute(page_boundary_statement(limit, after)).all()
+    if len(ids) < 2:
+        return None
+    return ids[0].id
+
+
+def page_boundary_statement(limit, after):
+    """
+    Select the IDs of the last person on a page and of the person after it.
+
+    Args:
+        limit: The page size.
+        after: The cursor the page starts after.
+
+    Returns:
+        A select statement returning at most two IDs.
+    """
+    return (
+        select(Person.id)
+        .where(Person.id > after)
+        .order_by(Person.id)
+        .offset(limit - 1)
+        .limit(2)
+    )
+
+
+def page_sources(after, last_id, include):
+    """
+    List the collections a page of people depends on, for
+    conditional.aggregate().
+
+    Args:
+        after: The cursor the page starts after.
+        last_id: The ID of the last person on the page, or None on the last
+            page.
+        include: The relationships to include.
+
+    Returns:
+        A list of (model, criteria...) tuples.
+    """
+    people = [Person.id > after]
+    notes = [Note.person_id > after]
+    if last_id is not None:
+        people.append(Person.id <= last_id)
+        notes.append(Note.person_id <= last_id)
+    sources = [(Person, *people)]
+    if "notes" in include:
+        sources.append((Note, *notes))
+    return sources
+
+
+def page_validators(after, last_id, only, include, stats):
+    """
+    Build the validators of a page of people from aggregates over its range.
+
+    Args:
+        after: The cursor the page starts after.
+        last_id: The ID of the last person on the page, or None on the last
+            page.
+        only: The column names to dump, or None for all of them.
+        include: The relationships to include.
+        stats: The aggregates of the page's page_sources().
+
+    Returns:
+        The page's Validators.
+    """
+    return conditional.validators(
+        "people",
+        after,
+        last_id,
+        only,
+        include,
+        *stats,
+        timestamps=[newest for count, newest in stats],
+    )
+
+
+def next_link(base_url, limit, last_id, fields, include):
+    """
+    Build the ``Link`` header value pointing to the next page.
+
+    Args:
+        base_url: The URL of the current page without its query string.
+        limit: The page size.
+        last_id: The ID of the last person on the current page.
+        fields: The field names requested for the current page.
+        include: The relationships requested for the current page.
+
+    Returns:
+        The ``Link`` header value.
+    """
+    params = {"limit": limit, "after": last_id}
+    if fields:
+        params["fields"] = ",".join(fields)
+    if "notes" not in include:
+        params["include"] = ",".join(include)
+    return f'<{base_url}?{urlencode(params)}>; rel="next"'
+
+
+def _stream_people(query, only, include):
+    """
+    Serialize the people matched by a query as a chunked JSON list.
+
+    Args:
+        query: The query selecting the people of the page.
+        only: The column names to dump, or None for all of them.
+        include: The relationships to include.
+
+    Yields:
+        Fragments of the JSON list, one chunk of people at a time.
+    """
+    yield b"["
+    chunk = []
+    separator = b""
+    for person in query.yield_per(STREAM_CHUNK_SIZE):
+        chunk.append(person)
+        if len(chunk) == STREAM_CHUNK_SIZE:
+            yield separator + encode_chunk(chunk, only, include)
+            separator = b","
+            chunk = []
+    if chunk:
+        yield separator + encode_chunk(chunk, only, include)
+    yield b"]"
+
+
+def encode_chunk(people, only, include):
+    """
+    Serialize a chunk of people as comma-separated JSON objects.
+
+    Args:
+        people: The Person objects or rows to dump.
+        only: The column names to dump, or None for all of them.
+        include: The relationships to include.
+
+    Returns:
+        The JSON objects as bytes, without surrounding brackets.
+    """
+    return encode_items(dump_people(people, only, include))
 
 
 def create(person):
@@ -9,65 +292,313 @@ def create(person):
         person: A dictionary containing the information for the new person.
 
     Returns:
-        A JSON representation of the newly created person.
+        A JSON representation of the newly created person. With WRITE_QUEUE
+        on, the person is inserted by the next group commit.
     """
-    new_person = person_schema.load(person, session=db.session)
-    db.session.add(new_person)
-    db.session.commit()
-    return person_schema.dump(new_person), 201
+    if write_queue() is not None:
+        created = dump_person(
+            queued_insert(Person, insert_schema.load(person)), include=()
+        )
+        payload = {**created, "notes": []}
+    else:
+        new_person = person_schema.load(person, session=db.session)
+        db.session.add(new_person)
+        db.session.commit()
+        payload = person_schema.dump(new_person)
+        created = dump_person(new_person, include=())
+    publish("person.created", [created])
+    return payload, 201
+
+
+def create_batch(people, mode="atomic"):
+    """
+    Create many people with a single INSERT statement.
+
+    Args:
+        people: A list of dictionaries with the information for each person.
+        mode: "atomic" to create nobody if any person is invalid, or
+            "partial" to create the valid people and skip the others.
+
+    Returns:
+        A JSON object with the new IDs in request order and the errors of
+        the invalid people. In atomic mode, invalid input returns a 422.
+    """
+    rows, errors = batch.validate(insert_schema, people)
+    body, status = batch.create(Person, rows, errors, mode)
+    publish("person.created", batch.created(rows, body))
+    return body, status
 
 
-def read_one(person_id):
+def read_one(person_id, include=("notes",)):
     """
     Retrieve a single person by their ID.
 
     Args:
         person_id: The ID of the person to retrieve.
+        include: The relationships to include. Pass an empty list to leave
+            out the person's notes, or "note_page" for their count and
+            first page only.
 
     Returns:
-        A JSON representation of the requested person.
+        A JSON representation of the requested person, served from the
+        response cache when possible, or a 304 if the client's copy is still
+        current.
 
     Raises:
         404 error: If the person with the given ID does not exist.
     """
-    person = Person.query.get(person_id)
+    key = person_key(person_id, include)
+    cached = response_cache().get(key) if key else None
 
-    if person is not None:
-        return person_schema.dump(person)
-    else:
-        abort(404, f"Person with ID {person_id} not found")
+    if cached is None:
+        # Taken before loading, so the payload isn't cached if a write
+        # invalidates it in the meantime, see cache.py.
+        generation = response_cache().generation(key) if key else None
+        # The validators are read before the person, so a concurrent write
+        # can only make them older than the payload, never newer.
+        stats = conditional.aggregate(*person_sources(person_id))
+        current = person_validators(person_id, stats)
+        if current is None:
+            abort(404, f"Person with ID {person_id} not found")
+        response = conditional.not_modified(current)
+        if response is not None:
+            return response
+
+        if "notes" in include and "note_page" not in include:
+            person = Person.query.options(load_notes()).get(person_id)
+        else:
+            person = Person.query.get(person_id)
+        if person is None:
+            abort(404, f"Person with ID {person_id} not found")
+        if "note_page" in include:
+            statement = person_notes_statement(
+                [Note.person_id == person_id], None, NOTES_PAGE_SIZE
+            )
+            rows = db.session.execute(statement).all()
+            payload = dump_note_page(person, stats, rows)
+        else:
+            payload = dump_person(person, include=include)
+        cached = (encode(payload), current)
+        # What a replica returns may already be stale, see routing.py.
+        if key and not on_replica():
+            response_cache().set(key, cached, generation)
+
+    data, current = cached
+    response = conditional.not_modified(current)
+    if response is not None:
+        return response
+    return encoded_response(data, 200, conditional.headers(current))
+
+
+def dump_note_page(person, stats, rows):
+    """
+    Serialize a person with the count and the first page of their notes,
+    instead of all of them.
+
+    Args:
+        person: The Person instance or row.
+        stats: The aggregates of the person's person_sources().
+        rows: The note rows returned by person_notes_statement() for the
+            first page.
+
+    Returns:
+        A dict representation of the person, with "note_count", the first
+        page of "notes" and the "notes_cursor" of the next page, or None.
+    """
+    _, (note_count, _) = stats
+    page, cursor = person_notes_page(rows, NOTES_PAGE_SIZE)
+    return {
+        **dump_person(person, include=()),
+        "note_count": note_count,
+        "notes": page,
+        "notes_cursor": cursor,
+    }
+
+
+def _validators(person_id):
+    """
+    Read the validators of a person.
+
+    Args:
+        person_id: The ID of the person.
+
+    Returns:
+        The person's Validators, or None if the person does not exist.
+    """
+    stats = conditional.aggregate(*person_sources(person_id))
+    return person_validators(person_id, stats)
+
+
+def person_sources(person_id):
+    """
+    List the rows a person's payload depends on, for conditional.aggregate().
+
+    Args:
+        person_id: The ID of the person.
+
+    Returns:
+        A list of (model, criteria...) tuples.
+    """
+    return [
+        (Person, Person.id == person_id),
+        (Note, Note.person_id == person_id),
+    ]
+
+
+def person_validators(person_id, stats):
+    """
+    Build the validators of a person from their timestamp and the count and
+    newest timestamp of their notes.
+
+    The notes are part of the validators whether or not they are included,
+    so every representation of a person shares them and If-Match works with
+    any of them.
+
+    Args:
+        person_id: The ID of the person.
+        stats: The aggregates of the person's person_sources().
+
+    Returns:
+        The person's Validators, or None if the person does not exist.
+    """
+    (found, modified), (notes, notes_modified) = stats
+    if not found:
+        return None
+    return conditional.validators(
+        "person",
+        person_id,
+        modified,
+        notes,
+        notes_modified,
+        timestamps=(modified, notes_modified),
+    )
 
 
 def update(person_id, person):
     """
-    Update an existing person.
+    Replace the fields of an existing person with a single UPDATE statement.
 
     Args:
         person_id: The ID of the person to update.
-        person: A dictionary containing the updated information for the person.
+        person: A dictionary containing the updated information for the
+            person. A missing first name is cleared.
 
     Returns:
-        A JSON representation of the updated person.
+        A JSON representation of the updated person, with its new ETag, or
+        the validation errors with a 422.
 
     Raises:
         404 error: If the person with the given ID does not exist.
+        412 error: If If-Match doesn't match the person's current ETag.
     """
-    existing_person = Person.query.get(person_id)
+    return _update(person_id, {"fname": None, **person}, False, 201)
 
-    if existing_person:
-        update_person = person_schema.load(person, session=db.session)
-        existing_person.fname = update_person.fname
-        existing_person.lname = update_person.lname
-        db.session.merge(existing_person)
-        db.session.commit()
-        return person_schema.dump(existing_person), 201
-    else:
+
+def patch(person_id, person):
+    """
+    Update only the supplied fields of an existing person with a single
+    UPDATE statement.
+
+    Args:
+        person_id: The ID of the person to update.
+        person: A dictionary with the fields to change.
+
+    Returns:
+        A JSON representation of the updated person, with its new ETag, or
+        the validation errors with a 422.
+
+    Raises:
+        404 error: If the person with the given ID does not exist.
+        412 error: If If-Match doesn't match the person's current ETag.
+    """
+    return _update(person_id, person, True, 200)
+
+
+def _update(person_id, fields, partial, status):
+    """
+    Validate the fields of a PUT or PATCH body and apply them.
+
+    The person is only read beforehand to check If-Match, in the write
+    transaction of the update, see conditional.begin_write(). Otherwise the
+    UPDATE statement returns the new row, or no row if the person does not
+    exist, and only the notes are read for the response.
+
+    Args:
+        person_id: The ID of the person to update.
+        fields: The raw request body.
+        partial: True to validate only the supplied fields.
+        status: The status code of a successful update.
+
+    Returns:
+        The response of the update.
+    """
+    values, errors = updates.load(update_schema, fields, partial)
+    if errors:
+        return {"errors": errors}, 422
+    if "If-Match" in request.headers:
+        conditional.begin_write(db.session.connection())
+        current = _validators(person_id)
+        if current is None:
+            abort(404, f"Person with ID {person_id} not found")
+        conditional.require_match(current, request.headers)
+
+    statement = updates.update_statement(Person, person_id, values)
+    row = db.session.execute(statement).one_or_none()
+    if row is None:
         abort(404, f"Person with ID {person_id} not found")
+    notes = db.session.execute(notes_statement(person_id)).all()
+    db.session.commit()
+    invalidate(person_ids=[row.id])
+    publish("person.updated", [dump_person(row, include=())])
+    payload, current = updated_person(person_id, row, notes)
+    return payload, status, conditional.headers(current)
+
+
+def notes_statement(person_id):
+    """
+    Select the columns of a person's notes, newest first like Person.notes.
+
+    Args:
+        person_id: The ID of the person.
+
+    Returns:
+        A select statement returning note rows.
+    """
+    return (
+        select(*(getattr(Note, name) for name in columns(Note)))
+        .where(Note.person_id == person_id)
+        .order_by(Note.timestamp.desc())
+    )
+
+
+def updated_person(person_id, person, notes):
+    """
+    Build the payload and validators of a person just after an update.
+
+    The validators are computed from the rows themselves and equal those
+    aggregated by _validators(), which would cost another query.
+
+    Args:
+        person_id: The ID of the person.
+        person: The person row returned by the UPDATE statement.
+        notes: The person's note rows, newest first.
+
+    Returns:
+        A tuple of the person's dict representation, with their notes, and
+        their Validators.
+    """
+    newest = notes[0].timestamp if notes else None
+    stats = ((1, person.timestamp), (len(notes), newest))
+    payload = dump_person(person, include=())
+    payload["notes"] = [dump_note(note) for note in notes]
+    return payload, person_validators(person_id, stats)
 
 
 def delete(person_id):
     """
-    Delete an existing person.
+    Delete an existing person with a single DELETE statement.
+
+    The person's notes are deleted by the database, without being loaded.
 
     Args:
         person_id: The ID of the person to delete.
@@ -77,12 +608,76 @@ def delete(person_id):
 
     Raises:
         404 error: If the person with the given ID does not exist.
+        412 error: If If-Match doesn't match the person's current ETag.
     """
-    existing_person = Person.query.get(person_id)
+    if "If-Match" in request.headers:
+        conditional.begin_write(db.session.connection())
+        current = _validators(person_id)
+        if current is None:
+            abort(404, f"Person with ID {person_id} not found")
+        conditional.require_match(current, request.headers)
 
-    if existing_person:
-        db.session.delete(existing_person)
-        db.session.commit()
-        return make_response(f"{person_id} successfully deleted", 200)
-    else:
+    person_ids, note_ids = _delete(Person.id == person_id)
+    if not person_ids:
         abort(404, f"Person with ID {person_id} not found")
+    db.session.commit()
+    invalidate(person_ids=person_ids, note_ids=note_ids)
+    publish("person.deleted", [{"id": row_id} for row_id in person_ids])
+    return make_response(f"{person_id} successfully deleted", 200)
+
+
+def purge(purge, batch_size=deletes.PURGE_BATCH_SIZE):
+    """
+    Delete many people, by ID or by age, in batches.
+
+    Each batch is deleted with a single DELETE statement in its own
+    transaction, and the notes of the deleted people are deleted by the
+    database. Memory use and lock hold times are bounded by the batch size,
+    however many people and notes are deleted.
+
+    Args:
+        purge: A dictionary with either ``ids``, the IDs of the people to
+            delete, or ``before``, an ISO 8601 datetime to delete the people
+            last changed before.
+        batch_size: The number of people deleted per batch.
+
+    Returns:
+        A JSON object with the number of people deleted and of batches run.
+
+    Raises:
+        400 error: If the body has both or neither of ``ids`` and
+            ``before``, or if ``before`` isn't a datetime.
+    """
+    try:
+        ids, before = deletes.purge_selection(purge)
+    except ValueError as error:
+        abort(400, str(error))
+
+    deleted = batches = 0
+    for condition in deletes.purge_conditions(ids, before, batch_size):
+        person_ids, note_ids = _delete(condition)
+        db.session.commit()
+        invalidate(person_ids=person_ids, note_ids=note_ids)
+        publish("person.deleted", [{"id": row_id} for row_id in person_ids])
+        deleted += len(person_ids)
+        batches += 1
+        if deletes.is_last(ids, person_ids, batch_size):
+            break
+    return {"deleted": deleted, "batches": batches}, 200
+
+
+def _delete(condition):
+    """
+    Delete the people matching a condition with a single DELETE statement.
+
+    Args:
+        condition: The criterion selecting the people.
+
+    Returns:
+        A tuple of the IDs of the deleted people and of their notes, read
+        beforehand for cache invalidation.
+    """
+    statement = deletes.note_ids_statement(condition)
+    note_ids = db.session.execute(statement).scalars().all()
+    statement = deletes.delete_statement(condition)
+    return db.session.execute(statement).scalars().all(), note_ids
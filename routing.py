@@ -0,0 +1,163 @@
+"""
+Read/write routing of the sync app's database session.
+
+GET and HEAD requests read from one of the replica engines created from
+DATABASE_REPLICAS, picked in turn, and all other requests go to the primary
+engine, as does every flush and DML statement. Replicas lag behind the
+primary, so a client that wrote in the last READ_YOUR_WRITES_SECONDS reads
+from the primary too: every successful write response sets a cookie with
+the time of the write, which the client sends back with its reads. Requests
+that read from a replica don't fill the response cache, so it only ever
+holds what the primary returned.
+
+Every routing decision is counted in the app's metrics, by operation,
+target and reason. Without replicas nothing is routed and every request
+uses the primary.
+
+A replica is any database URI: a PostgreSQL standby, or for local testing
+a copy of the SQLite file, made and refreshed by copy_database() or
+``flask --app flask_app maigee copy-replica``.
+"""
+import sqlite3
+import time
+from itertools import cycle
+
+from flask import current_app, g, has_app_context, request
+from flask_sqlalchemy.session import Session
+
+# The cookie holding the time of a client's last write.
+WRITE_COOKIE = "maigee_last_write"
+
+# The methods whose requests can read from a replica.
+READ_METHODS = ("GET", "HEAD")
+
+
+class RoutingSession(Session):
+    """
+    A session binding the reads of a request routed to a replica to that
+    replica, and everything else to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = g.get("replica") if has_app_context() else None
+        if (
+            replica is not None
+            and bind is None
+            and not self._flushing
+            and not getattr(clause, "is_dml", False)
+        ):
+            return replica
+        return super().get_bind(mapper, clause, bind, **kwargs)
+
+
+class Replicas:
+    """
+    The replica engines of an app, kept in app.extensions["replicas"].
+
+    Args:
+        engines: The replica engines.
+        window: The seconds after a write during which a client reads from
+            the primary.
+    """
+
+    def __init__(self, engines, window):
+        self.engines = engines
+        self.window = window
+        self.next = cycle(engines).__next__
+
+    def route(self, method, last_write):
+        """
+        Choose where a request reads from.
+
+        Args:
+            method: The HTTP method of the request.
+            last_write: The time of the client's last write, from its cookie,
+                or None.
+
+        Returns:
+            A tuple of the replica engine, or None for the primary, and the
+            reason of the choice: "write", "read_your_writes" or "read".
+        """
+        if method not in READ_METHODS:
+            return None, "write"
+        if last_write is not None and time.time() - last_write < self.window:
+            return None, "read_your_writes"
+        return self.next(), "read"
+
+
+def start_request():
+    """Pick the engine the request reads from and count the decision."""
+    replicas = current_app.extensions["replicas"]
+    try:
+        last_write = float(request.cookies[WRITE_COOKIE])
+    except (KeyError, ValueError):
+        last_write = None
+    g.replica, reason = replicas.route(request.method, last_write)
+
+    metrics = current_app.extensions.get("metrics")
+    if metrics is not None:
+        endpoint = (
+            request.url_rule.endpoint if request.url_rule else "unrouted"
+        )
+        target = "primary" if g.replica is None else "replica"
+        metrics.record_route(metrics.operation(endpoint), target, reason)
+
+
+def finish_request(response):
+    """Remember the time of a successful write in the client's cookie."""
+    if request.method not in READ_METHODS and response.status_code < 400:
+        window = current_app.extensions["replicas"].window
+        response.set_cookie(
+            WRITE_COOKIE,
+            repr(time.time()),
+            max_age=max(1, round(window)),
+            httponly=True,
+            samesite="Lax",
+        )
+    return response
+
+
+def on_replica():
+    """
+    Tell whether the current request reads from a replica.
+
+    Returns:
+        True if it does, so what it reads may be behind the primary.
+    """
+    return has_app_context() and g.get("replica") is not None
+
+
+def init_app(app, engines):
+    """
+    Route the reads of an app's requests to replica engines.
+
+    Args:
+        app: The Flask app, with the READ_YOUR_WRITES_SECONDS setting.
+        engines: The replica engines. Nothing is routed without any.
+    """
+    if not engines:
+        return
+    app.extensions["replicas"] = Replicas(
+        engines, app.config["READ_YOUR_WRITES_SECONDS"]
+    )
+    app.before_request(start_request)
+    app.after_request(finish_request)
+
+
+def copy_database(engine, path):
+    """
+    Copy a SQLite database to a file, e.g. to refresh a local replica.
+
+    The copy is made with SQLite's online backup API, so it is consistent
+    even while the database is being written to.
+
+    Args:
+        engine: The SQLAlchemy engine of the database to copy.
+        path: The file to write the copy to. It is replaced if it exists.
+    """
+    target = sqlite3.connect(path)
+    try:
+        with engine.connect() as connection:
+            connection.connection.driver_connection.backup(target)
+    finally:
+        target.close()
@@ -0,0 +1,241 @@
+"""
+Fast-path serializers for the read endpoints.
+
+The marshmallow schemas in models.py introspect every field on every dump.
+The serializers here are compiled once per model and field selection from the
+SQLAlchemy column metadata into plain Python functions that build dicts
+straight from ORM instances or from column-only result rows. Their output is
+identical to the marshmallow schemas, and encode() produces the same bytes
+Connexion would send for those dicts.
+"""
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from flask import Response, json
+from sqlalchemy import inspect
+
+from metrics import timed_serializer
+from models import Note, Person
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Nested collections each serializer can include, keyed by model.
+NESTED = {Person: {"notes": Note}}
+
+
+def columns(model):
+    """
+    List the serializable column attributes of a model.
+
+    Args:
+        model: The SQLAlchemy model class.
+
+    Returns:
+        A tuple of column attribute names in mapper order.
+    """
+    return tuple(attr.key for attr in inspect(model).column_attrs)
+
+
+@lru_cache(maxsize=None)
+def serializer(model, only=None, include=()):
+    """
+    Compile a function that dumps one object of the given model to a dict.
+
+    Args:
+        model: The SQLAlchemy model class.
+        only: An optional tuple of column names to restrict the output to.
+        include: A tuple of nested collections to include, e.g. ("notes",).
+
+    Returns:
+        A function taking an ORM instance or result row and returning a dict.
+    """
+    mapper = inspect(model)
+    names = [name for name in columns(model) if only is None or name in only]
+    namespace = {}
+    lines = ["def dump(obj):"]
+    items = []
+    for name in names:
+        column = mapper.columns[name]
+        if column.type.python_type is datetime:
+            lines.append(f"    {name} = obj.{name}")
+            items.append(
+                f"{name!r}: None if {name} is None else {name}.isoformat()"
+            )
+        else:
+            items.append(f"{name!r}: obj.{name}")
+    for name in include:
+        namespace[f"dump_{name}"] = serializer(NESTED[model][name])
+        items.append(f"{name!r}: [dump_{name}(item) for item in obj.{name}]")
+    lines.append(f"    return {{{', '.join(items)}}}")
+
+    code = compile("\n".join(lines), f"<serializer {model.__name__}>", "exec")
+    exec(code, namespace)
+    return namespace["dump"]
+
+
+@timed_serializer
+def dump_person(person, only=None, include=("notes",)):
+    """
+    Serialize a person the way person_schema.dump does.
+
+    Args:
+        person: A Person instance or a result row with person columns.
+        only: An optional iterable of column names to restrict the output to.
+        include: The nested collections to include.
+
+    Returns:
+        A dict representation of the person.
+    """
+    return _person_serializer(only, include)(person)
+
+
+@timed_serializer
+def dump_people(people, only=None, include=("notes",)):
+    """
+    Serialize many people the way people_schema.dump does.
+
+    Args:
+        people: An iterable of Person instances or result rows.
+        only: An optional iterable of column names to restrict the output to.
+        include: The nested collections to include.
+
+    Returns:
+        A list of dict representations of the people.
+    """
+    dump = _person_serializer(only, include)
+    return [dump(person) for person in people]
+
+
+@timed_serializer
+def dump_note(note):
+    """
+    Serialize a note the way note_schema.dump does.
+
+    Args:
+        note: A Note instance or a result row with note columns.
+
+    Returns:
+        A dict representation of the note.
+    """
+    return serializer(Note)(note)
+
+
+def parse_datetime(text):
+    """
+    Parse an ISO 8601 datetime from a request into a naive UTC datetime,
+    comparable with the stored timestamps.
+
+    Args:
+        text: The datetime, with or without a UTC offset. Without one it is
+            taken as UTC.
+
+    Returns:
+        The naive datetime.
+
+    Raises:
+        ValueError: If the text isn't an ISO 8601 datetime.
+    """
+    value = datetime.fromisoformat(text)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _person_serializer(only, include):
+    """Normalize the arguments so equal selections share one serializer."""
+    if only is not None:
+        only = tuple(sorted(set(only) - {"notes"}))
+    include = tuple(name for name in ("notes",) if name in include)
+    return serializer(Person, only, include)
+
+
+@timed_serializer
+def encode(payload):
+    """
+    Encode a payload to the same JSON bytes Connexion produces for it.
+
+    orjson is used when it is installed. It always writes UTF-8, so payloads
+    with non-ASCII text fall back to Flask's encoder, which escapes them.
+
+    Args:
+        payload: A JSON-serializable dict or list.
+
+    Returns:
+        The encoded payload as bytes, indented and ending with a newline.
+    """
+    if orjson is not None:
+        data = orjson.dumps(
+            payload, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+        )
+        if data.isascii():
+            return data + b"\n"
+    return (json.dumps(payload, indent=2) + "\n").encode()
+
+
+@timed_serializer
+def encode_items(items):
+    """
+    Encode a list of items compactly, without the surrounding brackets.
+
+    Args:
+        items: A list of JSON-serializable dicts.
+
+    Returns:
+        The items as comma-separated JSON bytes.
+    """
+    if orjson is not None:
+        return orjson.dumps(items, option=orjson.OPT_SORT_KEYS)[1:-1]
+    return json.dumps(items, separators=(",", ":"))[1:-1].encode()
+
+
+@timed_serializer
+def encode_lines(items):
+    """
+    Encode items as newline-delimited JSON.
+
+    Args:
+        items: A list of JSON-serializable dicts.
+
+    Returns:
+        The items as bytes, one compact JSON object per line.
+    """
+    if orjson is not None:
+        return b"".join(orjson.dumps(item) + b"\n" for item in items)
+    return "".join(
+        json.dumps(item, separators=(",", ":")) + "\n" for item in items
+    ).encode()
+
+
+def json_response(payload, status=200, headers=None):
+    """
+    Build a JSON response from an already serialized payload.
+
+    Args:
+        payload: A JSON-serializable dict or list.
+        status: The HTTP status code.
+        headers: Optional response headers.
+
+    Returns:
+        A Flask Response carrying the encoded payload.
+    """
+    return encoded_response(encode(payload), status, headers)
+
+
+def encoded_response(data, status=200, headers=None):
+    """
+    Build a JSON response from an already encoded payload.
+
+    Args:
+        data: The JSON body as bytes.
+        status: The HTTP status code.
+        headers: Optional response headers.
+
+    Returns:
+        A Flask Response carrying the body.
+    """
+    return Response(
+        data, status=status, headers=headers, mimetype="application/json"
+    )
@@ -0,0 +1,232 @@
+"""
+A log of the SQL statements that run longer than a threshold.
+
+Every slow statement is written to a rotating log as one JSON object per
+line, with its SQL, the shape of its bound parameters (their types, never
+their values), its duration and the operation that ran it, e.g.
+"notes.create". On SQLite the first occurrence of each statement also
+records its EXPLAIN QUERY PLAN, and the plan steps that scan a whole table
+or index are listed under "scans".
+
+Timing a statement costs two perf_counter() calls. Repeats of a statement
+that was already logged are only written for a sampled fraction, so a slow
+hot path can't flood the log.
+"""
+import json
+import logging
+import random
+import threading
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from time import perf_counter
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+from metrics import current_timings
+
+
+
+def parameter_shape(parameters, many=False):
+    """
+    Describe bound parameters by their types, leaving out the values.
+
+    Args:
+        parameters: The DBAPI parameters: a sequence, a mapping, or for
+            executemany() a sequence of either.
+        many: Whether the statement ran with executemany().
+
+    Returns:
+        A JSON-serializable description, e.g. ["int", "str"].
+    """
+    if many:
+        rows = list(parameters)
+        return {
+            "rows": len(rows),
+            "row": parameter_shape(rows[0]) if rows else None,
+        }
+    if isinstance(parameters, dict):
+        return {
+            name: type(value).__name__ for name, value in parameters.items()
+        }
+    return [type(value).__name__ for value in parameters or ()]
+
+
+def query_plan(cursor, statement, parameters, many=False):
+    """
+    Run EXPLAIN QUERY PLAN for a statement on a SQLite DBAPI connection.
+
+    Args:
+        cursor: The DBAPI cursor the statement ran on.
+        statement: The SQL of the statement.
+        parameters: Its bound parameters.
+        many: Whether the statement ran with executemany().
+
+    Returns:
+        A list of plan step descriptions, or None if the statement can't
+        be explained.
+    """
+    if many:
+        parameters = next(iter(parameters), ())
+    plan_cursor = cursor.connection.cursor()
+    try:
+        plan_cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return [row[3] for row in plan_cursor.fetchall()]
+    except Exception:
+        return None
+    finally:
+        plan_cursor.close()
+
+
+def operation():
+    """Name the operation running the current statement, if any."""
+    timings = current_timings.get()
+    if timings is not None:
+        return timings.operation
+    if has_request_context():
+        return request.endpoint
+    return None
+
+
+class SlowQueryLog:
+    """
+    Times statements on an engine and logs the slow ones.
+
+    Args:
+        log: The logging.Logger to write the JSON entries to.
+        threshold: The duration in seconds from which a statement is slow.
+        sample_rate: The fraction of repeated slow statements to log.
+        explain: Whether to record the query plan of new statements.
+
+    Attributes:
+        seen (set): The statements logged at least once.
+    """
+
+    def __init__(self, log, threshold, sample_rate=1.0, explain=True):
+        self.log = log
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.explain = explain
+        self.seen = set()
+        self.lock = threading.Lock()
+
+    def attach(self, engine):
+        """
+        Start timing the statements of an engine.
+
+        Args:
+            engine: The SQLAlchemy engine.
+        """
+        explain = self.explain and engine.dialect.name == "sqlite"
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def start_statement(conn, cursor, statement, params, context, many):
+            conn.info.setdefault("slow_query_started", []).append(
+                perf_counter()
+            )
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def finish_statement(conn, cursor, statement, params, context, many):
+            duration = perf_counter() - conn.info["slow_query_started"].pop()
+            if duration >= self.threshold:
+                self.record(cursor, statement, params, many, duration, explain)
+
+        @event.listens_for(engine, "handle_error")
+        def fail_statement(exception_context):
+            connection = exception_context.connection
+            if connection is not None:
+                started = connection.info.get("slow_query_started")
+                if started:
+                    started.pop()
+
+    def record(self, cursor, statement, parameters, many, duration, explain):
+        """
+        Log a slow statement, sampling the ones logged before.
+
+        Args:
+            cursor: The DBAPI cursor the statement ran on.
+            statement: The SQL of the statement.
+            parameters: Its bound parameters.
+            many: Whether the statement ran with executemany().
+            duration: How long it took, in seconds.
+            explain: Whether to record the plan of a new statement.
+        """
+        with self.lock:
+            first = statement not in self.seen
+            self.seen.add(statement)
+        if not first and random.random() >= self.sample_rate:
+            return
+
+        entry = {
+            "time": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(duration * 1000, 3),
+            "operation": operation(),
+            "statement": statement,
+            "parameters": parameter_shape(parameters, many),
+            "first": first,
+            "sample_rate": 1.0 if first else self.sample_rate,
+        }
+        if first and explain:
+            plan = query_plan(cursor, statement, parameters, many)
+            entry["plan"] = plan
+            entry["scans"] = [
+                step for step in plan or () if step.startswith("SCAN ")
+            ]
+        self.log.info(json.dumps(entry))
+
+
+def init_app(app, engine):
+    """
+    Log the slow statements of an engine as configured on an app.
+
+    The log is switched off when SLOW_QUERY_THRESHOLD_MS is negative or
+    SLOW_QUERY_LOG is empty.
+
+    Args:
+        app: The Flask app with the SLOW_QUERY_* settings.
+        engine: The SQLAlchemy engine to watch.
+
+    Returns:
+        The SlowQueryLog, or None if the log is switched off.
+    """
+    threshold = app.config["SLOW_QUERY_THRESHOLD_MS"]
+    path = app.config["SLOW_QUERY_LOG"]
+    if threshold < 0 or not path:
+        return None
+
+    slow_query_log = SlowQueryLog(
+        file_logger(
+            path,
+            app.config["SLOW_QUERY_LOG_MAX_BYTES"],
+            app.config["SLOW_QUERY_LOG_BACKUPS"],
+        ),
+        threshold / 1000,
+        app.config["SLOW_QUERY_SAMPLE_RATE"],
+        app.config["SLOW_QUERY_EXPLAIN"],
+    )
+    slow_query_log.attach(engine)
+    return slow_query_log
+
+
+def file_logger(path, max_bytes, backups):
+    """
+    Get a logger writing bare messages to a rotating file.
+
+    Args:
+        path: The log file.
+        max_bytes: The size from which the file is rotated.
+        backups: The number of rotated files to keep.
+
+    Returns:
+        A logging.Logger, the same one for every call with the same path.
+    """
+    logger = logging.getLogger(f"maigee.slow_queries.{path}")
+    if not logger.handlers:
+        handler = RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backups, delay=True
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
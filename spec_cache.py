@@ -0,0 +1,94 @@
+"""
+A compiled copy of swagger.yml that loads without parsing YAML.
+
+Connexion parses the YAML spec every time an app is created, which is a
+large part of creating one. load() instead returns the spec from a JSON
+artifact, which is compiled from the YAML on the first load and recompiled
+whenever the YAML changes. Deployments can compile the artifact ahead of
+time with ``flask --app flask_app maigee compile-spec``.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import yaml
+
+
+def digest(source):
+    """Fingerprint the YAML source the artifact is compiled from."""
+    return hashlib.sha256(source).hexdigest()
+
+
+def load(path, artifact=None):
+    """
+    Load a spec, from its compiled artifact when it's up to date.
+
+    Args:
+        path: The YAML spec file.
+        artifact: The JSON artifact file, or None to always parse the YAML.
+
+    Returns:
+        The spec as a dict, which connexion's add_api() accepts.
+    """
+    source = Path(path).read_bytes()
+    if not artifact:
+        return yaml.safe_load(source)
+
+    fingerprint = digest(source)
+    try:
+        with open(artifact, "rb") as file:
+            compiled = json.load(file)
+        if compiled["source"] == fingerprint:
+            return compiled["spec"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    spec = yaml.safe_load(source)
+    try:
+        write(artifact, fingerprint, spec)
+    except OSError:
+        pass  # A read-only deployment still starts, it just parses the YAML.
+    return spec
+
+
+def compile_spec(path, artifact):
+    """
+    Compile a YAML spec to its JSON artifact.
+
+    Args:
+        path: The YAML spec file.
+        artifact: The JSON artifact file to write.
+
+    Returns:
+        The spec as a dict.
+    """
+    source = Path(path).read_bytes()
+    spec = yaml.safe_load(source)
+    write(artifact, digest(source), spec)
+    return spec
+
+
+def write(artifact, fingerprint, spec):
+    """
+    Write an artifact atomically, so concurrent workers never read half of
+    one.
+
+    Args:
+        artifact: The JSON artifact file.
+        fingerprint: The digest() of the YAML source.
+        spec: The parsed spec.
+    """
+    artifact = Path(artifact)
+    artifact.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(
+        dir=artifact.parent, prefix=artifact.name, suffix=".tmp"
+    )
+    try:
+        with os.fdopen(descriptor, "w") as file:
+            json.dump({"source": fingerprint, "spec": spec}, file)
+        os.replace(temporary, artifact)
+    except BaseException:
+        os.unlink(temporary)
+        raise
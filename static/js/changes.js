@@ -0,0 +1,27 @@
+import { addPersonCard, removePersonCard, updatePersonCard } from "./people.js";
+import { addNoteCard, removeNoteCard, updateNoteCard } from "./notes.js";
+
+// Applies the changes other clients make, streamed by /api/changes, to the
+// page. The browser reconnects a closed stream with the ID of the last event
+// it received, and the server sends the events it missed. A stream served
+// by another worker process starts from its newest event instead.
+export class Changes {
+  constructor() {
+    this.source = new EventSource("/api/changes");
+    this.listen("person.created", addPersonCard);
+    this.listen("person.updated", updatePersonCard);
+    this.listen("person.deleted", removePersonCard);
+    this.listen("note.created", addNoteCard);
+    this.listen("note.updated", updateNoteCard);
+    this.listen("note.deleted", removeNoteCard);
+    // The server issued the last event but no longer keeps those after it,
+    // so the page is out of date.
+    this.source.addEventListener("reset", () => window.location.reload());
+  }
+
+  listen(name, apply) {
+    this.source.addEventListener(name, (event) => {
+      JSON.parse(event.data).forEach(apply);
+    });
+  }
+}
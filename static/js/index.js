@@ -1,10 +1,14 @@
 import { People } from "./people.js";
 import { Notes } from "./notes.js";
 import { DebugForm } from "./debug.js";
+import { Changes } from "./changes.js";
+import { LazyLoader } from "./lazy.js";
 
 function main() {
   new People();
   new Notes();
+  new Changes();
+  new LazyLoader();
   if (document.querySelector(".debug-card")) {
     const debug = new DebugForm();
     debug.showResponse("");
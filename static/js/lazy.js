@@ -0,0 +1,63 @@
+import { getPage } from "./request.js";
+import { addPersonCard, findPersonCard } from "./people.js";
+import { appendNoteCard } from "./notes.js";
+
+// Notes loaded per request, like the first page of notes of a person card.
+const NOTES_PAGE_SIZE = 20;
+
+// Loads the people after the first page, and the notes after the first page
+// of each person, from the API when their placeholder scrolls into view. A
+// placeholder's data-next attribute holds the URL of the next page to load.
+export class LazyLoader {
+  constructor() {
+    this.observer = new IntersectionObserver(
+      this.handleIntersect.bind(this),
+      { rootMargin: "400px" }
+    );
+    document
+      .querySelectorAll(".people-more, .note-more")
+      .forEach((placeholder) => this.observer.observe(placeholder));
+  }
+
+  handleIntersect(entries) {
+    entries.forEach((entry) => {
+      if (entry.isIntersecting) {
+        this.load(entry.target);
+      }
+    });
+  }
+
+  load(placeholder) {
+    this.observer.unobserve(placeholder);
+    const endpoint = placeholder.getAttribute("data-next");
+    getPage(endpoint, (items, next) => {
+      if (placeholder.classList.contains("people-more")) {
+        items.forEach((person) => this.addPerson(person));
+      } else {
+        items.forEach(appendNoteCard);
+      }
+      if (next) {
+        placeholder.setAttribute("data-next", next);
+        this.observer.observe(placeholder);
+      } else {
+        placeholder.remove();
+      }
+    });
+  }
+
+  addPerson(person) {
+    addPersonCard(person);
+    const noteList = findPersonCard(person.id).querySelector(".note-list");
+    if (noteList.querySelector(".note-more")) {
+      return;
+    }
+    const placeholder = document.createElement("li");
+    placeholder.classList.add("note-more");
+    placeholder.setAttribute(
+      "data-next",
+      "/api/people/" + person.id + "/notes?limit=" + NOTES_PAGE_SIZE
+    );
+    noteList.appendChild(placeholder);
+    this.observer.observe(placeholder);
+  }
+}
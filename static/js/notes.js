@@ -43,13 +43,50 @@ export class NoteCreateForm {
   }
 
   addNoteToList(rawData) {
-    const data = JSON.parse(rawData);
-    const noteList = document
-      .querySelector("[data-person-id= '" + data.person_id + "']")
-      .querySelector(".note-list");
-    const newNoteCard = document.querySelector(".note-card").cloneNode(true);
-    newNoteCard.querySelector(".note-content").textContent = data.content;
-    newNoteCard.setAttribute("data-note-id", data.id);
-    noteList.insertBefore(newNoteCard, noteList.children[1]);
+    addNoteCard(JSON.parse(rawData));
+  }
+}
+
+function findNoteCard(noteID) {
+  return document.querySelector(".note-card[data-note-id='" + noteID + "']");
+}
+
+export function addNoteCard(data) {
+  insertNoteCard(data, (noteList) => noteList.children[1]);
+}
+
+// Adds a note after the ones loaded so far, for notes loaded oldest last.
+export function appendNoteCard(data) {
+  insertNoteCard(data, (noteList) => noteList.querySelector(".note-more"));
+}
+
+function insertNoteCard(data, findNext) {
+  const personCard = document.querySelector(
+    ".person-card[data-person-id='" + data.person_id + "']"
+  );
+  if (!personCard || findNoteCard(data.id)) {
+    return;
+  }
+  const noteList = personCard.querySelector(".note-list");
+  const template = document.querySelector(".note-card-template");
+  const newNoteCard = template.content
+    .querySelector(".note-card")
+    .cloneNode(true);
+  newNoteCard.querySelector(".note-content").textContent = data.content;
+  newNoteCard.setAttribute("data-note-id", data.id);
+  noteList.insertBefore(newNoteCard, findNext(noteList));
+}
+
+export function updateNoteCard(data) {
+  const noteCard = findNoteCard(data.id);
+  if (noteCard) {
+    noteCard.querySelector(".note-content").textContent = data.content;
+  }
+}
+
+export function removeNoteCard(data) {
+  const noteCard = findNoteCard(data.id);
+  if (noteCard) {
+    noteCard.remove();
   }
 }
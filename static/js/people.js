@@ -37,29 +37,57 @@ class CreatePersonForm {
   }
 
   addPersonToList(rawData) {
-    const data = JSON.parse(rawData);
+    addPersonCard(JSON.parse(rawData));
+  }
+}
 
-    const personCard = document.querySelector(".person-card").cloneNode(true);
-    const personContent = personCard.querySelector(".person-content");
+export function findPersonCard(personID) {
+  return document.querySelector(
+    ".person-card[data-person-id='" + personID + "']"
+  );
+}
 
-    const personFirstName = personContent.querySelector("[data-person-fname]");
-    personFirstName.textContent = data.fname;
-    personFirstName.setAttribute("data-person-fname", data.fname);
+export function addPersonCard(data) {
+  if (findPersonCard(data.id)) {
+    return;
+  }
+  const template = document.querySelector(".person-card-template");
+  const personCard = template.content
+    .querySelector(".person-card")
+    .cloneNode(true);
+  personCard.setAttribute("data-person-id", data.id);
+  setPersonNames(personCard, data);
+  new PersonControl(personCard);
+  new NoteCreateForm(personCard.querySelector(".note-list"), data.id);
+  document.querySelector(".people-list").appendChild(personCard);
+}
 
-    const personLastName = personContent.querySelector("[data-person-lname]");
-    personLastName.textContent = data.lname;
-    personLastName.setAttribute("data-person-lname", data.lname);
+export function updatePersonCard(data) {
+  const personCard = findPersonCard(data.id);
+  if (personCard) {
+    setPersonNames(personCard, data);
+  }
+}
 
-    personCard.setAttribute("data-person-id", data.id);
-    new PersonControl(personCard);
-    new NoteCreateForm(personCard.querySelector(".note-list"), data.id);
-    personCard
-      .querySelectorAll(".note-card")
-      .forEach((noteCard) => noteCard.remove());
-    document.querySelector(".people-list").appendChild(personCard);
+export function removePersonCard(data) {
+  const personCard = findPersonCard(data.id);
+  if (personCard) {
+    personCard.remove();
   }
 }
 
+function setPersonNames(personCard, data) {
+  const personContent = personCard.querySelector(".person-content");
+
+  const personFirstName = personContent.querySelector("[data-person-fname]");
+  personFirstName.textContent = data.fname;
+  personFirstName.setAttribute("data-person-fname", data.fname);
+
+  const personLastName = personContent.querySelector("[data-person-lname]");
+  personLastName.textContent = data.lname;
+  personLastName.setAttribute("data-person-lname", data.lname);
+}
+
 class PersonControl {
   constructor(personCard) {
     this.personCard = personCard;
@@ -127,17 +155,8 @@ class PersonControl {
     this.cancelBtn.click();
   }
 
-  updatePersonInList(rawData, inputForm) {
-    const data = JSON.parse(rawData);
-    const personCard = inputForm.closest(".person-card");
-
-    const personFirstName = personCard.querySelector("[data-person-fname]");
-    personFirstName.textContent = data.fname;
-    personFirstName.setAttribute("data-person-fname", data.fname);
-
-    const personLastName = personCard.querySelector("[data-person-lname]");
-    personLastName.textContent = data.lname;
-    personLastName.setAttribute("data-person-lname", data.lname);
+  updatePersonInList(rawData) {
+    updatePersonCard(JSON.parse(rawData));
   }
 
   fillControlForm() {
@@ -9,6 +9,19 @@ export function getData(endpoint, callback) {
   request.send();
 }
 
+export function getPage(endpoint, callback) {
+  const request = new XMLHttpRequest();
+  request.onreadystatechange = () => {
+    if (request.readyState === 4 && request.status === 200) {
+      const link = request.getResponseHeader("Link") || "";
+      const next = link.match(/<([^>]*)>;\s*rel="next"/);
+      callback(JSON.parse(request.response), next ? next[1] : null);
+    }
+  };
+  request.open("GET", endpoint);
+  request.send();
+}
+
 export function sendForm(form, action, endpoint, callback) {
   const formData = new FormData(form);
   const dataJSON = JSON.stringify(Object.fromEntries(formData));
@@ -0,0 +1,467 @@
+import asyncio
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from sqlalchemy import create_engine
+
+import people
+from config import db
+from flask_app import create_app as create_sync_app
+
+try:
+    from aiohttp.test_utils import TestClient, TestServer
+
+    from aio.app import create_app
+except ImportError:
+    create_app = None
+
+
+class ApiTests:
+    """
+    Tests of the HTTP API, run against both the sync and the async app.
+
+    Subclasses start an app on the database file at self.database_uri and
+    implement request().
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.database_uri = f"sqlite:///{Path(self.tmp.name) / 'people.db'}"
+        engine = create_engine(self.database_uri)
+        db.metadata.create_all(engine)
+        engine.dispose()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def request(self, method, path, body=None, headers=None):
+        """
+        Send a request to the app.
+
+        Returns:
+            A tuple of the status code, the headers and the body as bytes.
+        """
+        raise NotImplementedError
+
+    def json(self, method, path, body=None, headers=None):
+        status, headers, data = self.request(method, path, body, headers)
+        return status, headers, json.loads(data) if data else None
+
+    def add_person(self, lname="Fairy", notes=()):
+        status, _, person = self.json("POST", "/api/people", {"lname": lname})
+        self.assertEqual(status, 201)
+        for content in notes:
+            body = {"person_id": str(person["id"]), "content": content}
+            self.assertEqual(self.json("POST", "/api/notes", body)[0], 201)
+        return person["id"]
+
+    def test_create_and_read_person(self):
+        person_id = self.add_person(notes=["Do you pay per gram?"])
+
+        status, _, person = self.json("GET", f"/api/people/{person_id}")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(person["lname"], "Fairy")
+        self.assertEqual(
+            [note["content"] for note in person["notes"]],
+            ["Do you pay per gram?"],
+        )
+        status, _, person = self.json(
+            "GET", f"/api/people/{person_id}?include="
+        )
+        self.assertNotIn("notes", person)
+
+    def test_missing_person(self):
+        self.assertEqual(self.request("GET", "/api/people/99")[0], 404)
+
+    def test_read_all_pages(self):
+        for index in range(3):
+            self.add_person(f"Doe{index}", notes=[f"note {index}"])
+
+        status, headers, page = self.json("GET", "/api/people?limit=2")
+
+        self.assertEqual(status, 200)
+        lnames = [person["lname"] for person in page]
+        self.assertEqual(lnames, ["Doe0", "Doe1"])
+        self.assertIn("after=2", headers["Link"])
+        _, headers, page = self.json("GET", "/api/people?limit=2&after=2")
+        self.assertEqual([person["lname"] for person in page], ["Doe2"])
+        self.assertNotIn("Link", headers)
+        _, _, page = self.json("GET", "/api/people?fields=id,lname")
+        self.assertEqual(page[0], {"id": 1, "lname": "Doe0"})
+
+    def test_streamed_page(self):
+        for index in range(3):
+            self.add_person(f"Doe{index}", notes=[f"note {index}"])
+
+        _, _, page = self.json(
+            "GET", f"/api/people?limit={people.STREAM_THRESHOLD}"
+        )
+
+        self.assertEqual(page, self.json("GET", "/api/people")[2])
+
+    def test_conditional_requests(self):
+        person_id = self.add_person(notes=["first"])
+        path = f"/api/people/{person_id}"
+        _, headers, _ = self.request("GET", path)
+        etag = headers["ETag"]
+
+        status, _, _ = self.request("GET", path, None, {"If-None-Match": etag})
+        self.assertEqual(status, 304)
+
+        body = {"lname": "Bunny"}
+        status, headers, _ = self.request(
+            "PUT", path, body, headers={"If-Match": etag}
+        )
+        self.assertEqual(status, 201)
+        status, _, _ = self.request("PUT", path, body, {"If-Match": etag})
+        self.assertEqual(status, 412)
+        status, _, _ = self.request(
+            "PUT", path, body, {"If-Match": headers["ETag"]}
+        )
+        self.assertEqual(status, 201)
+
+    def test_note_lifecycle(self):
+        person_id = self.add_person(notes=["first"])
+
+        status, headers, note = self.json("GET", "/api/notes/1")
+        self.assertEqual((status, note["person_id"]), (200, person_id))
+        status, _, note = self.json("PUT", "/api/notes/1", {"content": "new"})
+        self.assertEqual((status, note["content"]), (201, "new"))
+        self.assertEqual(
+            self.json("GET", f"/api/people/{person_id}")[2]["notes"][0][
+                "content"
+            ],
+            "new",
+        )
+        status, _, _ = self.request(
+            "DELETE", "/api/notes/1", headers={"If-Match": headers["ETag"]}
+        )
+        self.assertEqual(status, 412)
+        self.assertEqual(self.request("DELETE", "/api/notes/1")[0], 204)
+        self.assertEqual(self.request("GET", "/api/notes/1")[0], 404)
+        self.assertEqual(
+            self.json("GET", f"/api/people/{person_id}")[2]["notes"], []
+        )
+
+    def test_patch_person(self):
+        person_id = self.add_person(notes=["first"])
+        path = f"/api/people/{person_id}"
+        self.json("PUT", path, {"fname": "Tooth", "lname": "Fairy"})
+
+        status, headers, person = self.json("PATCH", path, {"lname": "Bunny"})
+
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            (person["fname"], person["lname"]), ("Tooth", "Bunny")
+        )
+        self.assertEqual(
+            [note["content"] for note in person["notes"]], ["first"]
+        )
+        _, read_headers, read = self.json("GET", path)
+        self.assertEqual(read, person)
+        self.assertEqual(read_headers["ETag"], headers["ETag"])
+        status, _, _ = self.request(
+            "PATCH", path, {"fname": None}, {"If-Match": '"stale"'}
+        )
+        self.assertEqual(status, 412)
+        status, _, person = self.json(
+            "PATCH", path, {"fname": None}, {"If-Match": headers["ETag"]}
+        )
+        self.assertEqual((status, person["fname"]), (200, None))
+        status, _, result = self.json("PATCH", path, {"lname": "x" * 33})
+        self.assertEqual(status, 422)
+        self.assertIn("lname", result["errors"])
+        self.assertEqual(self.request("PATCH", path, {})[0], 400)
+        status, _, _ = self.request("PATCH", "/api/people/99", {"lname": "X"})
+        self.assertEqual(status, 404)
+        status, _, person = self.json("PUT", path, {"lname": "Fairy"})
+        self.assertEqual((status, person["fname"]), (201, None))
+
+    def test_patch_note(self):
+        self.add_person(notes=["first"])
+        _, headers, _ = self.request("GET", "/api/notes/1")
+
+        status, new_headers, note = self.json(
+            "PATCH", "/api/notes/1", {"content": "new"}
+        )
+
+        self.assertEqual((status, note["content"]), (200, "new"))
+        self.assertNotEqual(new_headers["ETag"], headers["ETag"])
+        self.assertEqual(self.json("GET", "/api/notes/1")[2], note)
+        status, _, _ = self.request(
+            "PATCH",
+            "/api/notes/1",
+            {"content": "x"},
+            {"If-Match": headers["ETag"]},
+        )
+        self.assertEqual(status, 412)
+        status, _, _ = self.request("PATCH", "/api/notes/9", {"content": "x"})
+        self.assertEqual(status, 404)
+        status, _, _ = self.request(
+            "PATCH", "/api/notes/1", {"person_id": "2"}
+        )
+        self.assertEqual(status, 400)
+
+    def test_person_notes_pages(self):
+        person_id = self.add_person(notes=[f"note {n}" for n in range(5)])
+        path = f"/api/people/{person_id}/notes"
+
+        status, headers, page = self.json("GET", f"{path}?limit=2")
+
+        self.assertEqual(status, 200)
+        self.assertEqual([note["id"] for note in page], [5, 4])
+        next_page = urlsplit(headers["Link"][1:].split(">")[0])
+        _, headers, page = self.json(
+            "GET", f"{next_page.path}?{next_page.query}"
+        )
+        self.assertEqual([note["id"] for note in page], [3, 2])
+        self.assertIn("Link", headers)
+        _, headers, page = self.json("GET", f"{path}?limit=4")
+        self.assertEqual([note["id"] for note in page], [5, 4, 3, 2])
+        self.assertIn("cursor=", headers["Link"])
+
+        middle = self.json("GET", "/api/notes/3")[2]["timestamp"]
+        status, _, result = self.json("GET", f"{path}?count=true")
+        self.assertEqual((status, result), (200, {"count": 5}))
+        _, _, result = self.json("GET", f"{path}?count=true&since={middle}")
+        self.assertEqual(result, {"count": 3})
+        _, _, page = self.json("GET", f"{path}?until={middle}")
+        self.assertEqual([note["id"] for note in page], [2, 1])
+        self.assertEqual(self.request("GET", f"{path}?cursor=x")[0], 400)
+        self.assertEqual(self.request("GET", f"{path}?since=x")[0], 400)
+        status, _, _ = self.request("GET", "/api/people/99/notes")
+        self.assertEqual(status, 404)
+
+    def test_person_note_page(self):
+        person_id = self.add_person(notes=["first", "second"])
+
+        status, _, person = self.json(
+            "GET", f"/api/people/{person_id}?include=note_page"
+        )
+
+        self.assertEqual(status, 200)
+        self.assertEqual(person["note_count"], 2)
+        self.assertEqual(
+            [note["content"] for note in person["notes"]], ["second", "first"]
+        )
+        self.assertIsNone(person["notes_cursor"])
+        self.json("POST", "/api/notes", {"person_id": "1", "content": "3rd"})
+        _, _, person = self.json(
+            "GET", f"/api/people/{person_id}?include=note_page"
+        )
+        self.assertEqual(person["note_count"], 3)
+
+    def test_delete_person(self):
+        person_id = self.add_person(notes=["first"])
+
+        status, _, _ = self.request("DELETE", f"/api/people/{person_id}")
+
+        self.assertEqual(status, 200)
+        status, _, _ = self.request("GET", f"/api/people/{person_id}")
+        self.assertEqual(status, 404)
+        self.assertEqual(self.request("GET", "/api/notes/1")[0], 404)
+
+    def test_purge(self):
+        for index in range(5):
+            self.add_person(f"Doe{index}", notes=[f"note {index}"])
+        self.assertEqual(self.request("GET", "/api/notes/1")[0], 200)
+
+        status, _, result = self.json(
+            "POST", "/api/people:purge?batch_size=2", {"ids": [3, 1, 99, 2]}
+        )
+
+        self.assertEqual((status, result), (200, {"deleted": 3, "batches": 2}))
+        self.assertEqual(self.request("GET", "/api/people/1")[0], 404)
+        self.assertEqual(self.request("GET", "/api/notes/1")[0], 404)
+        status, _, result = self.json(
+            "POST",
+            "/api/people:purge?batch_size=1",
+            {"before": "2999-01-01T00:00:00+02:00"},
+        )
+        self.assertEqual((status, result), (200, {"deleted": 2, "batches": 3}))
+        self.assertEqual(self.json("GET", "/api/people")[2], [])
+        self.assertEqual(self.request("GET", "/api/notes/5")[0], 404)
+        invalid = ({}, {"ids": [1], "before": "2000-01-01"}, {"before": "x"})
+        for body in invalid:
+            status, _, _ = self.request("POST", "/api/people:purge", body)
+            self.assertEqual(status, 400)
+
+    def test_batches(self):
+        status, _, result = self.json(
+            "POST",
+            "/api/people:batch?mode=partial",
+            [{"lname": "Doe"}, {"fname": "No last name"}],
+        )
+        self.assertEqual(status, 201)
+        self.assertEqual(result["ids"], [1, None])
+
+        status, _, result = self.json(
+            "POST",
+            "/api/notes:batch",
+            [{"person_id": "1", "content": "a"}, {"person_id": "9"}],
+        )
+        self.assertEqual(status, 422)
+        self.assertEqual(result["ids"], [None, None])
+
+    def test_search(self):
+        self.add_person(notes=["Do you pay per gram?", "What about teeth"])
+
+        status, _, results = self.json("GET", "/api/notes/search?q=gram")
+
+        self.assertEqual(status, 200)
+        self.assertEqual([note["id"] for note in results], [1])
+        self.assertIn("<em>gram</em>", results[0]["snippet"])
+
+    def test_search_escapes_html(self):
+        self.add_person(notes=["<img src=x onerror=alert(1)>"])
+
+        _, _, results = self.json("GET", "/api/notes/search?q=onerror")
+
+        self.assertEqual(
+            results[0]["snippet"],
+            "&lt;img src=x <em>onerror</em>=alert(1)&gt;",
+        )
+
+    def changes(self, last_event_id=None):
+        """
+        Read the events of a change stream that ends at once.
+
+        Returns:
+            A tuple of the ID the stream starts after and the list of
+            (ID, name, data) events.
+        """
+        headers = {}
+        if last_event_id is not None:
+            headers["Last-Event-ID"] = last_event_id
+        status, response_headers, data = self.request(
+            "GET", "/api/changes?timeout=0", headers=headers
+        )
+        self.assertEqual(status, 200)
+        self.assertTrue(
+            response_headers["Content-Type"].startswith("text/event-stream")
+        )
+        blocks = [
+            dict(line.split(": ", 1) for line in block.splitlines())
+            for block in data.decode().split("\n\n")
+            if block
+        ]
+        events = [
+            (block["id"], block["event"], json.loads(block["data"]))
+            for block in blocks[1:]
+        ]
+        return blocks[0]["id"], events
+
+    def test_changes(self):
+        start, events = self.changes()
+        self.assertEqual(events, [])
+
+        person_id = self.add_person(notes=["first"])
+        self.request("PATCH", f"/api/people/{person_id}", {"fname": "Tooth"})
+        self.request("PATCH", "/api/notes/1", {"content": "second"})
+        self.request(
+            "POST", "/api/notes:batch", [{"person_id": "1", "content": "3"}]
+        )
+        self.request("DELETE", "/api/notes/1")
+        self.request("DELETE", f"/api/people/{person_id}")
+
+        _, events = self.changes(start)
+        ids = [
+            (name, [item["id"] for item in items]) for _, name, items in events
+        ]
+        self.assertEqual(
+            ids,
+            [
+                ("person.created", [1]),
+                ("note.created", [1]),
+                ("person.updated", [1]),
+                ("note.updated", [1]),
+                ("note.created", [2]),
+                ("note.deleted", [1]),
+                ("person.deleted", [1]),
+            ],
+        )
+        self.assertEqual(events[2][2][0]["fname"], "Tooth")
+        self.assertEqual(events[5][2], [{"id": 1, "person_id": 1}])
+        # Resuming from an event sends only the ones after it.
+        self.assertEqual(self.changes(events[4][0])[1], events[5:])
+        # An ID the bus never issued, e.g. another worker's, resumes from
+        # the newest event.
+        self.assertEqual(self.changes("0"), (events[-1][0], []))
+
+    def test_health(self):
+        status, _, health = self.json("GET", "/api/health")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(health["database"]["pragmas"]["journal_mode"], "wal")
+
+
+class TestSyncApi(ApiTests, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        app = create_sync_app(
+            {
+                "SQLALCHEMY_DATABASE_URI": self.database_uri,
+                "SLOW_QUERY_LOG": "",
+            }
+        )
+        self.app = app.app
+        self.client = app.app.test_client()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.engine.dispose()
+        super().tearDown()
+
+    def request(self, method, path, body=None, headers=None):
+        response = self.client.open(
+            path, method=method, json=body, headers=headers or {}
+        )
+        return response.status_code, response.headers, response.get_data()
+
+    def test_patch_issues_one_update(self):
+        self.add_person(notes=["first"])
+
+        _, headers, _ = self.request("PATCH", "/api/notes/1", {"content": "x"})
+
+        # The UPDATE ... RETURNING, without reading the note first.
+        self.assertIn('desc="1 statements"', headers["Server-Timing"])
+        _, headers, _ = self.request("PATCH", "/api/people/1", {"fname": "x"})
+        # The UPDATE ... RETURNING and the notes of the response.
+        self.assertIn('desc="2 statements"', headers["Server-Timing"])
+
+
+
+@unittest.skipIf(create_app is None, "aiohttp and aiosqlite are required")
+class TestAsyncApi(ApiTests, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.loop = asyncio.new_event_loop()
+        app = create_app({"SQLALCHEMY_DATABASE_URI": self.database_uri})
+        self.client = self.loop.run_until_complete(self.start(app.app))
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.client.close())
+        self.loop.close()
+        super().tearDown()
+
+    async def start(self, application):
+        client = TestClient(TestServer(application))
+        await client.start_server()
+        return client
+
+    def request(self, method, path, body=None, headers=None):
+        async def send():
+            response = await self.client.request(
+                method, path, json=body, headers=headers or {}
+            )
+            return response.status, response.headers, await response.read()
+
+        return self.loop.run_until_complete(send())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+
+from flask import Flask
+from sqlalchemy import event
+
+import notes
+import people
+from config import db
+from models import Note, Person
+
+
+class TestBatchCreate(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.inserts = []
+        event.listen(db.engine, "before_cursor_execute", self.record)
+
+    def tearDown(self):
+        event.remove(db.engine, "before_cursor_execute", self.record)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def record(self, conn, cursor, statement, parameters, context, many):
+        if statement.startswith("INSERT"):
+            self.inserts.append(statement)
+
+    def test_create_people_in_one_statement(self):
+        body, status = people.create_batch(
+            [{"lname": f"Doe{index}", "fname": "John"} for index in range(50)]
+        )
+
+        self.assertEqual(status, 201)
+        self.assertEqual(body["errors"], [])
+        self.assertEqual(len(self.inserts), 1)
+        created = Person.query.order_by(Person.id).all()
+        self.assertEqual(body["ids"], [person.id for person in created])
+        self.assertEqual(created[7].lname, "Doe7")
+        self.assertIsNotNone(created[0].timestamp)
+
+    def test_atomic_mode_creates_nothing(self):
+        body, status = people.create_batch(
+            [{"lname": "Doe"}, {"fname": "John"}, {"lname": "x" * 33}]
+        )
+
+        self.assertEqual(status, 422)
+        self.assertEqual(body["ids"], [None, None, None])
+        self.assertEqual([error["index"] for error in body["errors"]], [1, 2])
+        self.assertEqual(Person.query.count(), 0)
+
+    def test_partial_mode_creates_valid_items(self):
+        body, status = people.create_batch(
+            [{"lname": "Doe"}, {"fname": "John"}, {"lname": "Roe"}],
+            mode="partial",
+        )
+
+        self.assertEqual(status, 201)
+        self.assertEqual(body["ids"][1], None)
+        self.assertEqual(body["errors"][0]["index"], 1)
+        self.assertIn("lname", body["errors"][0]["errors"])
+        self.assertEqual(
+            [Person.query.get(id).lname for id in body["ids"] if id],
+            ["Doe", "Roe"],
+        )
+
+    def test_create_notes(self):
+        person = Person(lname="Doe")
+        db.session.add(person)
+        db.session.commit()
+        self.inserts.clear()
+
+        body, status = notes.create_batch(
+            [
+                {"person_id": str(person.id), "content": "first"},
+                {"person_id": "999", "content": "orphan"},
+                {"person_id": str(person.id)},
+                {"person_id": person.id, "content": "second"},
+            ],
+            mode="partial",
+        )
+
+        self.assertEqual(status, 201)
+        self.assertEqual(len(self.inserts), 1)
+        self.assertEqual(body["ids"][1:3], [None, None])
+        self.assertEqual([error["index"] for error in body["errors"]], [1, 2])
+        self.assertIn("person_id", body["errors"][0]["errors"])
+        self.assertEqual(
+            sorted(note.content for note in Note.query.all()),
+            ["first", "second"],
+        )
+
+    def test_create_notes_atomic(self):
+        body, status = notes.create_batch(
+            [{"person_id": "1", "content": "no such person"}]
+        )
+
+        self.assertEqual(status, 422)
+        self.assertEqual(Note.query.count(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
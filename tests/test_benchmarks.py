@@ -0,0 +1,72 @@
+import random
+import unittest
+
+from sqlalchemy import create_engine, select
+
+from benchmarks import dataset, load, report
+from models import Note
+
+
+class TestDataset(unittest.TestCase):
+    def test_generate_is_deterministic(self):
+        contents = []
+        for _ in range(2):
+            engine = create_engine("sqlite://")
+            self.assertEqual(dataset.generate(engine, 20, 3, seed=7), (20, 60))
+            with engine.connect() as connection:
+                contents.append(
+                    connection.scalars(
+                        select(Note.content).order_by(Note.id)
+                    ).all()
+                )
+                match = connection.exec_driver_sql(
+                    "SELECT count(*) FROM note_fts WHERE note_fts MATCH ?",
+                    (contents[-1][0].split()[0],),
+                ).scalar()
+            engine.dispose()
+            self.assertGreater(match, 0)
+        self.assertEqual(contents[0], contents[1])
+
+    def test_chunks(self):
+        self.assertEqual(
+            list(dataset.chunks(range(5), 2)), [[0, 1], [2, 3], [4]]
+        )
+
+
+class TestReport(unittest.TestCase):
+    def test_summarize(self):
+        latencies = [index / 1000 for index in range(1, 101)]
+        random.Random(0).shuffle(latencies)
+
+        summary = report.summarize(latencies, elapsed=2.0, errors=1)
+
+        self.assertEqual(summary["requests"], 100)
+        self.assertEqual(summary["errors"], 1)
+        self.assertEqual(summary["throughput"], 50.0)
+        self.assertEqual(
+            (summary["p50_ms"], summary["p95_ms"], summary["p99_ms"]),
+            (50.0, 95.0, 99.0),
+        )
+
+    def test_compare(self):
+        baseline = {"results": {"a": {"throughput": 100.0, "p50_ms": 2.0}}}
+        current = {"results": {"a": {"throughput": 150.0, "p50_ms": 1.0}}}
+
+        self.assertEqual(
+            report.compare(baseline, current),
+            {"a": {"throughput": 1.5, "p50_ms": 0.5}},
+        )
+
+
+class TestLoad(unittest.TestCase):
+    def test_workload_covers_every_operation(self):
+        workload = load.Workload(people=10, notes_per_person=2)
+
+        for operation_id, method, path in load.operations():
+            method, url, _ = workload.request(operation_id, method, path)
+            self.assertTrue(url.startswith("/api/"), url)
+            self.assertNotIn("{", url)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+from sqlalchemy import event
+
+import notes
+import people
+from cache import LRUCache, NullCache, invalidate, response_cache
+from config import apply_sqlite_pragmas, db
+from models import Note, Person
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_hits_misses_and_evictions(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        cache.set("a", b"1")
+        cache.set("b", b"2")
+        cache.get("a")
+        cache.set("c", b"3")
+
+        self.assertEqual(cache.get("a"), b"1")
+        self.assertIsNone(cache.get("b"))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["size"], 2)
+
+    def test_ttl(self):
+        cache = LRUCache(maxsize=2, ttl=10)
+        with patch("cache.time.monotonic", return_value=100):
+            cache.set("a", b"1")
+        with patch("cache.time.monotonic", return_value=109):
+            self.assertEqual(cache.get("a"), b"1")
+        with patch("cache.time.monotonic", return_value=110):
+            self.assertIsNone(cache.get("a"))
+
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_set_after_delete_is_dropped(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        generation = cache.generation("a")
+        cache.delete("a")
+        cache.set("a", b"old", generation)
+        fresh = cache.generation("b")
+        cache.delete("a")
+        cache.set("b", b"2", fresh)
+
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), b"2")
+        self.assertEqual(cache.stats()["outdated"], 1)
+
+    def test_forgotten_deletes_outdate_older_generations(self):
+        cache = LRUCache(maxsize=1, ttl=60)
+        generation = cache.generation("a")
+        cache.delete("a")
+        # Only the deletion of b is remembered now.
+        cache.delete("b")
+        cache.set("a", b"old", generation)
+        cache.set("c", b"3", cache.generation("c"))
+
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("c"), b"3")
+
+    def test_null_cache(self):
+        cache = NullCache()
+        cache.set("a", b"1")
+
+        self.assertIsNone(cache.get("a"))
+
+
+class TestReadThrough(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        db.init_app(self.app)
+        self.ctx = self.app.test_request_context()
+        self.ctx.push()
+        # Deleting a person relies on SQLite's ON DELETE CASCADE.
+        apply_sqlite_pragmas(db.engine, {"foreign_keys": "ON"})
+        db.create_all()
+        person = Person(lname="Fairy", fname="Tooth")
+        person.notes.append(Note(content="Do you pay per gram?"))
+        db.session.add(person)
+        db.session.commit()
+        self.queries = 0
+        event.listen(db.engine, "before_cursor_execute", self.count)
+
+    def tearDown(self):
+        event.remove(db.engine, "before_cursor_execute", self.count)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def count(self, *args):
+        self.queries += 1
+
+    def read_person(self, include=("notes",)):
+        return people.read_one("1", include=include).json
+
+    def test_second_read_skips_database(self):
+        first = self.read_person()
+        queries = self.queries
+
+        self.assertEqual(self.read_person(), first)
+        self.assertEqual(self.queries, queries)
+        self.assertEqual(notes.read_one(1).json, notes.read_one("1").json)
+        self.assertEqual(response_cache().stats()["hits"], 2)
+
+    def test_write_during_read_keeps_stale_payload_out(self):
+        dump_person = people.dump_person
+
+        def dump_then_write(*args, **kwargs):
+            # A write commits, and invalidates the person, after the read
+            # loaded them.
+            invalidate(person_ids=[1])
+            return dump_person(*args, **kwargs)
+
+        with patch.object(people, "dump_person", dump_then_write):
+            self.read_person()
+
+        self.assertIsNone(response_cache().get("person:1:notes"))
+        self.assertEqual(response_cache().stats()["outdated"], 1)
+
+    def test_person_update_invalidates(self):
+        self.read_person()
+        self.read_person(include=[""])
+
+        people.update(1, {"lname": "Bunny", "fname": "Easter"})
+
+        self.assertEqual(self.read_person()["lname"], "Bunny")
+        self.assertEqual(self.read_person(include=[""])["lname"], "Bunny")
+
+    def test_note_writes_invalidate_parent(self):
+        self.read_person()
+        note = notes.read_one(1).json
+
+        notes.update(1, {"content": "Changed"})
+        self.assertEqual(self.read_person()["notes"][0]["content"], "Changed")
+        self.assertEqual(notes.read_one(1).json["content"], "Changed")
+        self.assertNotEqual(note["content"], "Changed")
+
+        notes.create({"person_id": "1", "content": "Another"})
+        self.assertEqual(len(self.read_person()["notes"]), 2)
+
+        notes.create_batch([{"person_id": 1, "content": "Batch"}])
+        self.assertEqual(len(self.read_person()["notes"]), 3)
+
+        notes.delete(1)
+        self.assertEqual(len(self.read_person()["notes"]), 2)
+
+    def test_person_delete_invalidates_notes(self):
+        self.read_person()
+        notes.read_one(1)
+
+        people.delete(1)
+
+        for read in (lambda: people.read_one(1), lambda: notes.read_one(1)):
+            with self.assertRaises(Exception) as raised:
+                read()
+            self.assertEqual(raised.exception.code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
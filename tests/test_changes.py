@@ -0,0 +1,141 @@
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from sqlalchemy import create_engine
+
+from changes import HEARTBEAT, MemoryBus, change_bus, event_stream
+from config import db
+from flask_app import create_app
+
+
+class TestMemoryBus(unittest.TestCase):
+    def test_read_after_an_event(self):
+        bus = MemoryBus(history=3)
+        start = bus.last_id()
+
+        events = [bus.publish("note.created", [{"id": i}]) for i in range(4)]
+
+        self.assertEqual(events[0].id, start + 1)
+        self.assertEqual(events[0].data, b'[{"id":0}]')
+        self.assertEqual(bus.read(events[1].id), events[2:])
+        self.assertEqual(bus.read(events[0].id), events[1:])
+        self.assertEqual(bus.read(events[3].id), [])
+        # The first event is no longer kept, and IDs from the future are
+        # from another bus.
+        self.assertIsNone(bus.read(start))
+        self.assertIsNone(bus.read(events[3].id + 1))
+
+    def test_subscribers_are_called(self):
+        bus = MemoryBus()
+        calls = []
+        bus.subscribe(lambda: calls.append(bus.last_id()))
+
+        event = bus.publish("person.deleted", [{"id": 1}])
+
+        self.assertEqual(calls, [event.id])
+        self.assertEqual(bus.stats()["subscribers"], 1)
+
+    def test_resume_from_another_bus(self):
+        other = MemoryBus()
+        bus = MemoryBus(history=1)
+        event = other.publish("person.created", [{"id": 1}])
+        bus.publish("person.created", [{"id": 2}])
+
+        chunks = list(event_stream(bus, event.id, timeout=0, heartbeat=5))
+
+        # The ID isn't this bus's, so the stream starts from its newest
+        # event instead of resetting the client.
+        self.assertEqual(len(chunks), 1)
+        self.assertIn(b"id: %d\n" % bus.last_id(), chunks[0])
+        self.assertFalse(bus.issued(event.id))
+
+    def test_evicted_events_reset(self):
+        bus = MemoryBus(history=1)
+        first = bus.publish("person.created", [{"id": 1}])
+        bus.publish("person.created", [{"id": 2}])
+
+        stream = event_stream(bus, first.id - 1, timeout=0, heartbeat=5)
+
+        self.assertIn(b"event: reset\n", b"".join(stream))
+
+    def test_stream_waits_for_events(self):
+        bus = MemoryBus()
+        stream = event_stream(bus, None, timeout=5, heartbeat=0.01)
+
+        self.assertTrue(next(stream).startswith(b"retry: "))
+        self.assertEqual(next(stream), HEARTBEAT)
+        timer = threading.Timer(
+            0.05, bus.publish, ("person.created", [{"id": 1}])
+        )
+        timer.start()
+        chunk = next(stream)
+        while chunk == HEARTBEAT:
+            chunk = next(stream)
+        timer.join()
+        self.assertIn(b"event: person.created\n", chunk)
+        stream.close()
+        self.assertEqual(bus.stats()["subscribers"], 0)
+
+
+class TestChangesStream(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        uri = f"sqlite:///{Path(self.tmp.name) / 'people.db'}"
+        engine = create_engine(uri)
+        db.metadata.create_all(engine)
+        engine.dispose()
+        self.app = create_app(
+            {
+                "SQLALCHEMY_DATABASE_URI": uri,
+                "CHANGES_HEARTBEAT": 5,
+                "SLOW_QUERY_LOG": "",
+                "CHANGES_SYNC_STREAMS": 1,
+            }
+        ).app
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_stream_sends_writes_of_other_clients(self):
+        response = self.client.get("/api/changes?timeout=5", buffered=False)
+        chunks = iter(response.response)
+        next(chunks)
+        writer = self.app.test_client()
+        timer = threading.Timer(
+            0.05, writer.post, ("/api/people",), {"json": {"lname": "Doe"}}
+        )
+        timer.start()
+
+        chunk = next(chunks)
+
+        timer.join()
+        self.assertIn(b"event: person.created\n", chunk)
+        self.assertIn(b'"lname":"Doe"', chunk)
+        response.close()
+        with self.app.app_context():
+            self.assertEqual(change_bus().stats()["subscribers"], 0)
+
+    def test_streams_beyond_the_limit_end_at_once(self):
+        response = self.client.get("/api/changes?timeout=5", buffered=False)
+        next(iter(response.response))
+
+        started = time.monotonic()
+        data = self.app.test_client().get("/api/changes?timeout=5").data
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertTrue(data.startswith(b"retry: "))
+        # Closing the open stream frees its slot for the next client.
+        response.close()
+        started = time.monotonic()
+        self.app.test_client().get("/api/changes?timeout=0.2").data
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import gzip
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from flask import Flask
+
+import cli
+from config import db
+from models import Note, Person
+
+
+class TestExportImport(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.app = Flask(__name__)
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        db.init_app(self.app)
+        self.app.cli.add_command(cli.maigee)
+        self.runner = self.app.test_cli_runner()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        for index in range(5):
+            person = Person(lname=f"Doe{index}", fname="Jöhn")
+            person.notes.append(
+                Note(content=f"note {index}", timestamp=datetime(2022, 1, 1))
+            )
+            db.session.add(person)
+        db.session.add(Note(content="orphan", person_id=None))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+        self.tmpdir.cleanup()
+
+    def invoke(self, *args, **kwargs):
+        result = self.runner.invoke(args=["maigee", *args], **kwargs)
+        self.assertEqual(result.exit_code, 0, result.stderr)
+        return result
+
+    def snapshot(self):
+        return (
+            [(p.id, p.lname, p.fname, p.timestamp) for p in Person.query],
+            [(n.id, n.person_id, n.content, n.timestamp) for n in Note.query],
+        )
+
+    def reset(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_round_trip_gzip(self):
+        path = os.path.join(self.tmpdir.name, "backup.ndjson.gz")
+        before = self.snapshot()
+
+        with patch.object(cli, "BATCH_SIZE", 2):
+            result = self.invoke("export", path)
+            self.reset()
+            self.invoke("import", path)
+
+        self.assertRegex(result.stderr, r"Exported 11 rows .* rows/s")
+        self.assertEqual(self.snapshot(), before)
+        with gzip.open(path) as backup:
+            self.assertEqual(len(backup.readlines()), 11)
+
+    def test_round_trip_stdout_stdin(self):
+        before = self.snapshot()
+
+        output = self.invoke("export").stdout_bytes
+        self.reset()
+        result = self.invoke("import", input=output)
+
+        self.assertIn('"type":"person"', output.decode().splitlines()[0])
+        self.assertIn("Imported 11 rows", result.stderr)
+        self.assertEqual(self.snapshot(), before)
+
+    def test_import_conflict(self):
+        output = self.invoke("export").stdout_bytes
+
+        result = self.runner.invoke(args=["maigee", "import"], input=output)
+
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("Could not import person rows", result.stderr)
+
+    def test_unknown_record_type(self):
+        result = self.runner.invoke(
+            args=["maigee", "import"], input=b'{"type": "pet"}\n'
+        )
+
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("unknown record type 'pet'", result.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import gzip
+import tempfile
+import unittest
+from pathlib import Path
+
+from sqlalchemy import create_engine
+
+import compression
+from config import db
+from flask_app import create_app
+from people import STREAM_THRESHOLD
+
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        uri = f"sqlite:///{Path(self.tmp.name) / 'people.db'}"
+        engine = create_engine(uri)
+        db.metadata.create_all(engine)
+        engine.dispose()
+        self.app = create_app(
+            {"SQLALCHEMY_DATABASE_URI": uri, "SLOW_QUERY_LOG": ""}
+        ).app
+        self.client = self.app.test_client()
+        for index in range(20):
+            self.client.post("/api/people", json={"lname": f"Doe{index}"})
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.engine.dispose()
+        self.tmp.cleanup()
+
+    def get(self, path, encoding="gzip", **kwargs):
+        return self.client.get(
+            path, headers={"Accept-Encoding": encoding}, **kwargs
+        )
+
+    def assertCompressed(self, path):
+        plain = self.get(path, "identity")
+        response = self.get(path)
+
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        self.assertEqual(gzip.decompress(response.data), plain.data)
+        self.assertLess(len(response.data), len(plain.data))
+        self.assertNotIn("Content-Encoding", plain.headers)
+
+    def test_large_json_is_compressed(self):
+        self.assertCompressed("/api/people")
+        response = self.get("/api/people")
+        self.assertEqual(
+            response.headers["Content-Length"], str(len(response.data))
+        )
+
+    def test_small_responses_are_not(self):
+        response = self.get("/api/people/1?include=")
+
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+
+    def test_streamed_page_is_compressed_chunk_by_chunk(self):
+        response = self.get(
+            f"/api/people?limit={STREAM_THRESHOLD}", buffered=False
+        )
+
+        self.assertTrue(response.is_streamed)
+        self.assertNotIn("Content-Length", response.headers)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertCompressed(f"/api/people?limit={STREAM_THRESHOLD}")
+
+    def test_home_page_is_streamed(self):
+        response = self.get("/", buffered=False)
+
+        self.assertTrue(response.is_streamed)
+        page = gzip.decompress(response.get_data()).decode()
+        self.assertIn("Doe19", page)
+        self.assertCompressed("/")
+        status = self.client.get(
+            "/", headers={"If-None-Match": response.headers["ETag"]}
+        ).status_code
+        self.assertEqual(status, 304)
+
+    def test_static_files_are_compressed_once(self):
+        compression.compressed_file.cache_clear()
+
+        self.assertCompressed("/static/js/people.js")
+        self.assertCompressed("/static/js/people.js")
+
+        info = compression.compressed_file.cache_info()
+        self.assertEqual((info.misses, info.hits), (1, 1))
+
+    def test_switched_off(self):
+        self.app.config["COMPRESSION_MIN_SIZE"] = -1
+
+        self.assertNotIn("Content-Encoding", self.get("/").headers)
+
+    @unittest.skipIf(compression.brotli is None, "brotli is not installed")
+    def test_brotli_is_preferred(self):
+        response = self.get("/api/people", "gzip, br")
+
+        self.assertEqual(response.headers["Content-Encoding"], "br")
+        self.assertEqual(
+            compression.brotli.decompress(response.data),
+            self.get("/api/people", "identity").data,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,228 @@
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from flask import Flask
+from sqlalchemy import create_engine, event
+from werkzeug.exceptions import PreconditionFailed
+
+import conditional
+import notes
+import people
+from config import db
+from flask_app import create_app
+from models import Note, Person
+
+
+class TestConditionalRequests(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        self.app.config["RESPONSE_CACHE"] = "none"
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        for name in ("Fairy", "Bunny", "Claus"):
+            person = Person(lname=name, fname="Tooth")
+            person.notes.append(Note(content=f"{name} note"))
+            db.session.add(person)
+        db.session.commit()
+        self.statements = []
+        event.listen(db.engine, "before_cursor_execute", self.record)
+
+    def tearDown(self):
+        event.remove(db.engine, "before_cursor_execute", self.record)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def record(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def request(self, call, **headers):
+        with self.app.test_request_context(headers=headers):
+            response = call()
+            db.session.remove()
+            return response
+
+    def test_person_not_modified(self):
+        response = self.request(lambda: people.read_one("1"))
+        etag = response.headers["ETag"]
+        self.assertTrue(response.headers["Last-Modified"])
+
+        self.statements.clear()
+        response = self.request(
+            lambda: people.read_one("1"), **{"If-None-Match": etag}
+        )
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], etag)
+        # Only the validators are queried, the person isn't loaded.
+        self.assertEqual(len(self.statements), 1)
+
+    def test_person_if_modified_since(self):
+        response = self.request(lambda: people.read_one("1"))
+        modified = response.headers["Last-Modified"]
+
+        response = self.request(
+            lambda: people.read_one("1"), **{"If-Modified-Since": modified}
+        )
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_note_changes_person_etag(self):
+        etag = self.request(lambda: people.read_one("1")).headers["ETag"]
+
+        self.request(lambda: notes.create({"person_id": "1", "content": "x"}))
+        response = self.request(
+            lambda: people.read_one("1"), **{"If-None-Match": etag}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_note_not_modified(self):
+        etag = self.request(lambda: notes.read_one("1")).headers["ETag"]
+
+        response = self.request(
+            lambda: notes.read_one("1"), **{"If-None-Match": etag}
+        )
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_note_not_modified_without_serializing(self):
+        etag = self.request(lambda: notes.read_one("1")).headers["ETag"]
+
+        with patch.object(notes, "dump_note") as dump_note:
+            response = self.request(
+                lambda: notes.read_one("1"), **{"If-None-Match": etag}
+            )
+
+        self.assertEqual(response.status_code, 304)
+        dump_note.assert_not_called()
+
+    def test_page_not_modified(self):
+        response = self.request(lambda: people.read_all(limit=2))
+        etag = response.headers["ETag"]
+
+        response = self.request(
+            lambda: people.read_all(limit=2), **{"If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, 304)
+
+        self.request(lambda: people.update(3, {"lname": "Other"}))
+        response = self.request(
+            lambda: people.read_all(limit=2), **{"If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, 304)
+
+        self.request(lambda: notes.update(1, {"content": "changed"}))
+        response = self.request(
+            lambda: people.read_all(limit=2), **{"If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_match_chains_updates(self):
+        etag = self.request(lambda: people.read_one("1")).headers["ETag"]
+        body = {"lname": "Changed", "fname": "Tooth"}
+
+        _, status, headers = self.request(
+            lambda: people.update("1", body), **{"If-Match": etag}
+        )
+        self.assertEqual(status, 201)
+        self.assertNotEqual(headers["ETag"], etag)
+
+        with self.assertRaises(PreconditionFailed):
+            self.request(lambda: people.update("1", body), **{"If-Match": etag})
+        with self.assertRaises(PreconditionFailed):
+            self.request(lambda: people.delete("1"), **{"If-Match": etag})
+
+        _, status, _ = self.request(
+            lambda: people.update("1", body), **{"If-Match": headers["ETag"]}
+        )
+        self.assertEqual(status, 201)
+
+    def test_note_if_match(self):
+        etag = self.request(lambda: notes.read_one("1")).headers["ETag"]
+        self.request(lambda: notes.update("1", {"content": "changed"}))
+
+        with self.assertRaises(PreconditionFailed):
+            self.request(lambda: notes.delete("1"), **{"If-Match": etag})
+
+        response = self.request(lambda: notes.delete("1"), **{"If-Match": "*"})
+        self.assertEqual(response.status_code, 204)
+
+
+class TestConcurrentWrites(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        uri = f"sqlite:///{Path(self.tmp.name) / 'people.db'}"
+        engine = create_engine(uri)
+        db.metadata.create_all(engine)
+        engine.dispose()
+        self.app = create_app(
+            {"SQLALCHEMY_DATABASE_URI": uri, "SLOW_QUERY_LOG": ""}
+        ).app
+        self.client = self.app.test_client()
+        person = self.client.post("/api/people", json={"lname": "Doe"}).json
+        self.client.post(
+            "/api/notes",
+            json={"person_id": str(person["id"]), "content": "Hi"},
+        )
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.engine.dispose()
+        self.tmp.cleanup()
+
+    def race(self, method, url, body=None):
+        """
+        Send two writes with the same If-Match, the second one between the
+        If-Match check of the first and its write.
+
+        Returns:
+            The status codes of both writes, sorted.
+        """
+        etag = self.client.get(url).headers["ETag"]
+        check = conditional.require_match
+        other = {}
+
+        def send():
+            response = self.app.test_client().open(
+                url, method=method, json=body, headers={"If-Match": etag}
+            )
+            other["status"] = response.status_code
+
+        def check_then_race(current, headers):
+            check(current, headers)
+            if "thread" not in other:
+                other["thread"] = threading.Thread(target=send)
+                other["thread"].start()
+                # Give the other write the time to commit, unless it waits.
+                other["thread"].join(0.3)
+
+        with patch.object(conditional, "require_match", check_then_race):
+            response = self.client.open(
+                url, method=method, json=body, headers={"If-Match": etag}
+            )
+        other["thread"].join()
+        return sorted([response.status_code, other["status"]])
+
+    def test_person_updates(self):
+        statuses = self.race("PATCH", "/api/people/1", {"fname": "Tooth"})
+
+        self.assertEqual(statuses, [200, 412])
+
+    def test_note_update_and_delete(self):
+        self.assertEqual(
+            self.race("PATCH", "/api/notes/1", {"content": "Bye"}), [200, 412]
+        )
+        # The second delete finds the note gone.
+        self.assertEqual(self.race("DELETE", "/api/notes/1"), [204, 404])
+
+
+if __name__ == "__main__":
+    unittest.main()
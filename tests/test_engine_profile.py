@@ -0,0 +1,101 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+
+from config import (
+    app,
+    apply_sqlite_pragmas,
+    basedir,
+    engine_profile,
+    env,
+)
+
+
+class TestEngineProfile(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmpdir.name, "test.db")
+        self.engine = create_engine(f"sqlite:///{path}", pool_size=2)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def test_pragmas_are_applied(self):
+        apply_sqlite_pragmas(
+            self.engine,
+            {
+                "foreign_keys": "ON",
+                "journal_mode": "WAL",
+                "synchronous": "NORMAL",
+                "cache_size": -2000,
+                "mmap_size": 0,
+                "temp_store": "MEMORY",
+                "busy_timeout": 1234,
+            },
+        )
+
+        profile = engine_profile(self.engine)
+
+        self.assertEqual(profile["dialect"], "sqlite")
+        self.assertEqual(
+            profile["pragmas"],
+            {
+                "foreign_keys": 1,
+                "journal_mode": "wal",
+                "synchronous": 1,
+                "cache_size": -2000,
+                "mmap_size": 0,
+                "temp_store": 2,
+                "busy_timeout": 1234,
+            },
+        )
+        self.assertEqual(profile["pool"]["class"], "QueuePool")
+        self.assertIn("Pool size: 2", profile["pool"]["status"])
+
+    def test_default_profile(self):
+        pragmas = app.config["SQLITE_PRAGMAS"]
+
+        self.assertEqual(pragmas["journal_mode"], "WAL")
+        self.assertGreater(pragmas["busy_timeout"], 0)
+
+    def test_env(self):
+        with patch.dict(os.environ, {"MAIGEE_SQLITE_CACHE_SIZE": "-500"}):
+            self.assertEqual(env("SQLITE_CACHE_SIZE", 0, int), -500)
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(env("SQLITE_CACHE_SIZE", 0, int), 0)
+
+
+class TestLazyEngines(unittest.TestCase):
+    def test_importing_creates_no_engine(self):
+        script = (
+            "import config, flask_app, init_database, migrations, cli\n"
+            "print(len(config.engines), sorted(config.app.extensions))\n"
+            "config.default_app()\n"
+            "print(len(config.engines), 'sqlalchemy' in config.app.extensions)"
+        )
+        with tempfile.TemporaryDirectory() as tmpdir:
+            environ = dict(
+                os.environ,
+                MAIGEE_DATABASE_URI=f"sqlite:///{tmpdir}/people.db",
+                MAIGEE_SLOW_QUERY_LOG="",
+            )
+            result = subprocess.run(
+                [sys.executable, "-c", script],
+                cwd=basedir,
+                env=environ,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+
+        self.assertEqual(result.stdout.splitlines(), ["0 []", "1 True"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+
+import config
+from config import db
+from flask_app import create_app
+
+
+@unittest.skipUnless(hasattr(os, "fork"), "needs os.fork()")
+class TestAfterFork(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        uri = f"sqlite:///{Path(self.tmp.name) / 'people.db'}"
+        engine = create_engine(uri)
+        db.metadata.create_all(engine)
+        engine.dispose()
+        self.app = create_app(
+            {"SQLALCHEMY_DATABASE_URI": uri, "SLOW_QUERY_LOG": ""}
+        ).app
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.engine.dispose()
+        self.tmp.cleanup()
+
+    def driver_connection(self):
+        """Get the SQLite connection the app's engine hands out."""
+        with self.app.app_context(), db.engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+            return connection.connection.driver_connection
+
+    def in_child(self, func):
+        """Run func in a forked process and return what it returns."""
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.close(read)
+                os.write(write, str(func()).encode())
+            finally:
+                os._exit(0)
+        os.close(write)
+        with os.fdopen(read) as pipe:
+            result = pipe.read()
+        os.waitpid(pid, 0)
+        return result
+
+    def test_children_open_their_own_connections(self):
+        # The parent leaves a connection in the pool for the children to
+        # copy.
+        parent = self.driver_connection()
+
+        def reuses_parent():
+            return self.driver_connection() is parent
+
+        def reuses_parent_after_fork():
+            config.after_fork()
+            return reuses_parent()
+
+        # Without after_fork() a child shares the parent's connection.
+        self.assertEqual(self.in_child(reuses_parent), "True")
+        self.assertEqual(self.in_child(reuses_parent_after_fork), "False")
+        # The child left the parent's connection open.
+        self.assertIs(self.driver_connection(), parent)
+        response = self.app.test_client().get("/api/people")
+        self.assertEqual(response.status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import html
+import re
+import tempfile
+import unittest
+from pathlib import Path
+
+from sqlalchemy import create_engine
+
+from cache import fragment_cache
+from config import db
+from flask_app import create_app
+from notes import NOTES_PAGE_SIZE
+
+
+class TestHomePage(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        uri = f"sqlite:///{Path(self.tmp.name) / 'people.db'}"
+        engine = create_engine(uri)
+        db.metadata.create_all(engine)
+        engine.dispose()
+        self.app = create_app(
+            {
+                "SQLALCHEMY_DATABASE_URI": uri,
+                "HOME_PAGE_SIZE": 2,
+                "SLOW_QUERY_LOG": "",
+            }
+        ).app
+        self.client = self.app.test_client()
+        for index in range(3):
+            self.client.post("/api/people", json={"lname": f"Doe{index}"})
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.engine.dispose()
+        self.tmp.cleanup()
+
+    def home(self):
+        page = self.client.get("/").get_data(as_text=True)
+        # The person card template isn't a card of the page.
+        page = page.split('<template class="person-card-template">')[0]
+        links = {
+            kind: html.unescape(link)
+            for kind, link in re.findall(
+                r'class="(people-more|note-more)" data-next="([^"]*)"', page
+            )
+        }
+        return page, links
+
+    def cache_stats(self):
+        with self.app.app_context():
+            return fragment_cache().stats()
+
+    def test_first_page_links_to_the_others(self):
+        page, links = self.home()
+
+        self.assertIn("Doe1", page)
+        self.assertNotIn("Doe2", page)
+        people = self.client.get(links["people-more"]).json
+        self.assertEqual([person["lname"] for person in people], ["Doe2"])
+        self.assertNotIn("notes", people[0])
+
+    def test_cards_are_cached_by_version(self):
+        self.home()
+        self.assertEqual(self.cache_stats()["misses"], 2)
+
+        self.home()
+        self.assertEqual(self.cache_stats()["hits"], 2)
+
+        self.client.patch("/api/people/1", json={"fname": "Tooth"})
+        self.client.post("/api/notes", json={"person_id": "2", "content": "x"})
+        page, _ = self.home()
+        self.assertIn('data-person-fname="Tooth"', page)
+        self.assertIn(">x</div>", page)
+        self.assertEqual(self.cache_stats()["misses"], 4)
+
+    def test_more_notes_continue_the_first_page(self):
+        for index in range(NOTES_PAGE_SIZE + 2):
+            self.client.post(
+                "/api/notes", json={"person_id": "1", "content": f"n{index}"}
+            )
+
+        page, links = self.home()
+
+        shown = re.findall(r'class="note-content">n(\d+)<', page)
+        self.assertEqual(len(shown), NOTES_PAGE_SIZE)
+        rest = self.client.get(links["note-more"]).json
+        self.assertEqual(
+            sorted(shown + [note["content"][1:] for note in rest], key=int),
+            [str(index) for index in range(NOTES_PAGE_SIZE + 2)],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,173 @@
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+
+from config import db
+from flask_app import create_app
+from group_commit import QueueFull, WriteQueue, WriteTimeout
+from models import Note, Person
+
+
+class TestWriteQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "people.db"
+        self.engine = create_engine(f"sqlite:///{self.path}")
+        db.metadata.create_all(self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_concurrent_writes_share_commits(self):
+        writes = WriteQueue(self.engine, window=0.05)
+        with ThreadPoolExecutor(8) as pool:
+            rows = list(
+                pool.map(
+                    lambda index: writes.submit(
+                        Person, {"lname": f"Doe{index}"}
+                    ),
+                    range(40),
+                )
+            )
+
+        self.assertEqual(
+            [row.lname for row in rows],
+            [f"Doe{index}" for index in range(40)],
+        )
+        self.assertEqual(len({row.id for row in rows}), 40)
+        stats = writes.stats()
+        self.assertEqual(stats["written"], 40)
+        self.assertLess(stats["batches"], 40)
+
+    def test_errors_reach_their_own_writer(self):
+        person = WriteQueue(self.engine).submit(Person, {"lname": "Doe"})
+        writes = WriteQueue(self.engine, window=0.05)
+        contents = ["a", None, "c"]
+
+        def submit(content):
+            try:
+                return writes.submit(
+                    Note, {"person_id": person.id, "content": content}
+                )
+            except IntegrityError as error:
+                return error
+
+        with ThreadPoolExecutor(3) as pool:
+            results = list(pool.map(submit, contents))
+
+        self.assertEqual([results[0].content, results[2].content], ["a", "c"])
+        self.assertIsInstance(results[1], IntegrityError)
+        self.assertEqual(writes.stats()["failed"], 1)
+
+    def test_full_queue_rejects_writes(self):
+        writes = WriteQueue(self.engine, window=0, max_depth=1, timeout=0.3)
+        # Hold the write lock, so the writer waits with its first batch.
+        lock = sqlite3.connect(self.path)
+        lock.execute("BEGIN IMMEDIATE")
+        errors = []
+
+        def submit():
+            try:
+                writes.submit(Person, {"lname": "Doe"})
+            except WriteTimeout as error:
+                errors.append(error)
+
+        threads = []
+        deadline = time.monotonic() + 5
+        while writes.stats()["depth"] < 1 and time.monotonic() < deadline:
+            thread = threading.Thread(target=submit)
+            thread.start()
+            threads.append(thread)
+            time.sleep(0.05)
+
+        with self.assertRaises(QueueFull):
+            writes.submit(Person, {"lname": "Roe"})
+
+        for thread in threads:
+            thread.join()
+        lock.rollback()
+        lock.close()
+        # The writer finishes the write it took, but not the others, whose
+        # requests gave up waiting.
+        writes.submit(Person, {"lname": "Poe"})
+        self.assertEqual(len(errors), len(threads))
+        stats = writes.stats()
+        self.assertEqual(stats["rejected"], 1)
+        self.assertEqual(stats["timed_out"], len(threads))
+        self.assertEqual(stats["written"], 2)
+        with self.engine.connect() as connection:
+            rows = connection.exec_driver_sql("SELECT lname FROM person")
+            self.assertEqual(rows.scalars().all(), ["Doe", "Poe"])
+
+    def test_writer_survives_unexpected_errors(self):
+        writes = WriteQueue(self.engine)
+        with patch.object(writes, "commit", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                writes.submit(Person, {"lname": "Doe"})
+
+        self.assertEqual(writes.submit(Person, {"lname": "Roe"}).lname, "Roe")
+        self.assertEqual(writes.stats()["failed"], 1)
+
+
+class TestQueuedCreate(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        uri = f"sqlite:///{Path(self.tmp.name) / 'people.db'}"
+        engine = create_engine(uri)
+        db.metadata.create_all(engine)
+        engine.dispose()
+        self.app = create_app(
+            {
+                "SQLALCHEMY_DATABASE_URI": uri,
+                "WRITE_QUEUE": True,
+                "SLOW_QUERY_LOG": "",
+            }
+        ).app
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_create_through_the_queue(self):
+        person = self.client.post("/api/people", json={"lname": "Doe"})
+        self.assertEqual(person.status_code, 201)
+        self.assertEqual(person.json["notes"], [])
+        note = self.client.post(
+            "/api/notes",
+            json={"person_id": str(person.json["id"]), "content": "Hi"},
+        )
+        self.assertEqual(note.status_code, 201)
+
+        stored = self.client.get(f"/api/people/{person.json['id']}").json
+        self.assertEqual(stored["notes"], [note.json])
+        self.assertEqual(
+            self.client.get("/api/health").json["write_queue"]["written"], 2
+        )
+        self.assertIn(
+            'maigee_write_queue_writes_total{outcome="written"} 2',
+            self.client.get("/metrics").get_data(as_text=True),
+        )
+
+    def test_timed_out_create(self):
+        with patch.object(
+            WriteQueue, "submit", side_effect=WriteTimeout("Not committed")
+        ):
+            response = self.client.post("/api/people", json={"lname": "Doe"})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import logging
+import os
+import runpy
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from flask import Flask
+
+import config
+
+
+class TestOnStarting(unittest.TestCase):
+    def setUp(self):
+        self.conf = runpy.run_path(str(config.basedir / "gunicorn.conf.py"))
+        self.preloaded = Flask(__name__)
+        self.preloaded.config["RESPONSE_CACHE"] = "lru"
+        environ = patch.dict(os.environ)
+        environ.start()
+        self.addCleanup(environ.stop)
+        os.environ.pop("MAIGEE_RESPONSE_CACHE", None)
+        settings = patch.dict(config.app.config, {"RESPONSE_CACHE": "lru"})
+        settings.start()
+        self.addCleanup(settings.stop)
+
+    def start(self, workers):
+        self.conf["on_starting"](
+            SimpleNamespace(
+                cfg=SimpleNamespace(workers=workers),
+                app=SimpleNamespace(callable=self.preloaded),
+                log=logging.getLogger(__name__),
+            )
+        )
+        return (
+            config.app.config["RESPONSE_CACHE"],
+            self.preloaded.config["RESPONSE_CACHE"],
+        )
+
+    def test_several_workers_switch_the_response_cache_off(self):
+        self.assertEqual(self.start(workers=2), ("none", "none"))
+
+    def test_one_worker_keeps_the_response_cache(self):
+        self.assertEqual(self.start(workers=1), ("lru", "lru"))
+
+    def test_explicit_setting_is_kept(self):
+        os.environ["MAIGEE_RESPONSE_CACHE"] = "lru"
+
+        self.assertEqual(self.start(workers=2), ("lru", "lru"))
+
+
+if __name__ == "__main__":
+    unittest.main()
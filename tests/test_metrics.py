@@ -0,0 +1,88 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from sqlalchemy import create_engine
+
+import metrics
+from config import db
+from flask_app import create_app
+
+
+class TestHistogram(unittest.TestCase):
+    def test_buckets_are_cumulative_and_inclusive(self):
+        histogram = metrics.Histogram(buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+
+        self.assertEqual(
+            histogram.samples(),
+            [
+                ("_bucket", ',le="0.1"', 2),
+                ("_bucket", ',le="1.0"', 3),
+                ("_bucket", ',le="+Inf"', 4),
+                ("_sum", "", 2.65),
+                ("_count", "", 4),
+            ],
+        )
+
+
+class TestInstrumentedApp(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        uri = f"sqlite:///{Path(self.tmp.name) / 'people.db'}"
+        engine = create_engine(uri)
+        db.metadata.create_all(engine)
+        engine.dispose()
+
+        app = create_app(
+            {"SQLALCHEMY_DATABASE_URI": uri, "SLOW_QUERY_LOG": ""}
+        )
+        self.app = app.app
+        self.client = app.app.test_client()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_server_timing(self):
+        response = self.client.post("/api/people", json={"lname": "Fairy"})
+
+        timing = response.headers["Server-Timing"]
+        self.assertRegex(timing, r'^db;dur=[\d.]+;desc="[1-9]\d* statements"')
+        self.assertIn("serialize;dur=", timing)
+        self.assertIn("total;dur=", timing)
+
+    def test_metrics_by_operation(self):
+        self.client.post("/api/people", json={"lname": "Fairy"})
+        self.client.get("/api/people/1")
+        self.client.get("/api/people/99")
+
+        response = self.client.get("/metrics")
+
+        self.assertEqual(response.content_type, metrics.CONTENT_TYPE)
+        text = response.get_data(as_text=True)
+        self.assertIn(
+            'maigee_request_duration_seconds_count{operation="people.read_one"}'
+            " 2",
+            text,
+        )
+        self.assertIn(
+            'maigee_requests_total{operation="people.read_one",status="404"} 1',
+            text,
+        )
+        self.assertIn(
+            'maigee_sql_statements_total{operation="people.create"}', text
+        )
+        self.assertIn("maigee_serialization_duration_seconds_total", text)
+
+    def test_outside_requests(self):
+        with self.app.app_context():
+            db.session.execute(db.select(1))
+
+        self.assertIsNone(metrics.current_timings.get())
+
+
+if __name__ == "__main__":
+    unittest.main()
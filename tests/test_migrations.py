@@ -0,0 +1,144 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from flask import Flask
+from sqlalchemy import create_engine, event
+
+import notes
+from config import db
+from migrations import MIGRATIONS, current_version, upgrade
+from models import Note, Person
+
+LEGACY_SCHEMA = [
+    """CREATE TABLE person (
+        id INTEGER NOT NULL PRIMARY KEY,
+        lname VARCHAR(32) NOT NULL,
+        fname VARCHAR(32),
+        timestamp DATETIME
+    )""",
+    """CREATE TABLE note (
+        id INTEGER NOT NULL PRIMARY KEY,
+        person_id INTEGER REFERENCES person (id),
+        content VARCHAR NOT NULL,
+        timestamp DATETIME
+    )""",
+    "INSERT INTO person (id, lname, fname) VALUES (1, 'Fairy', 'Tooth')",
+    "INSERT INTO note (person_id, content) VALUES (1, 'Do you pay per gram?')",
+]
+
+
+class TestUpgrade(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmpdir.name, "people.db")
+        self.engine = create_engine(f"sqlite:///{path}")
+        with self.engine.begin() as connection:
+            for statement in LEGACY_SCHEMA:
+                connection.exec_driver_sql(statement)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def indexes(self):
+        with self.engine.connect() as connection:
+            return {
+                name
+                for (name,) in connection.exec_driver_sql(
+                    "SELECT name FROM sqlite_master WHERE type = 'index'"
+                )
+            }
+
+    def test_upgrade_adds_indexes_in_place(self):
+        self.assertEqual(upgrade(self.engine), len(MIGRATIONS))
+
+        self.assertLessEqual(
+            {"ix_note_person_id_timestamp", "ix_person_lname"}, self.indexes()
+        )
+        with self.engine.connect() as connection:
+            self.assertEqual(current_version(connection), len(MIGRATIONS))
+            notes = connection.exec_driver_sql("SELECT count(*) FROM note")
+            self.assertEqual(notes.scalar(), 1)
+
+    def test_upgrade_is_idempotent(self):
+        upgrade(self.engine)
+
+        self.assertEqual(upgrade(self.engine), len(MIGRATIONS))
+
+
+class TestQueryPlans(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        person = Person(lname="Fairy", fname="Tooth")
+        person.notes.append(Note(content="I brush my teeth after each meal."))
+        db.session.add(person)
+        db.session.commit()
+        db.session.expunge_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def capture(self, callback):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, many):
+            statements.append((statement, parameters))
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            callback()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+        return statements
+
+    def plan(self, statement, parameters):
+        rows = db.session.connection().exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {statement}", parameters
+        )
+        return " | ".join(row.detail for row in rows)
+
+    def test_person_notes_use_index_without_sort(self):
+        person = Person.query.get(1)
+
+        (statement, parameters), = self.capture(lambda: person.notes)
+        plan = self.plan(statement, parameters)
+
+        self.assertIn("USING INDEX ix_note_person_id_timestamp", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_person_notes_pages_use_index_without_sort(self):
+        position = (datetime(2022, 1, 1), 1)
+        for cursor in (None, position):
+            with self.subTest(cursor=cursor):
+                (statement, parameters), = self.capture(
+                    lambda: db.session.execute(
+                        notes.person_notes_statement(
+                            [Note.person_id == 1], cursor, 20
+                        )
+                    ).all()
+                )
+                plan = self.plan(statement, parameters)
+
+                self.assertIn("USING INDEX ix_note_person_id_timestamp", plan)
+                self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_lname_lookup_uses_index(self):
+        (statement, parameters), = self.capture(
+            lambda: Person.query.filter(Person.lname == "Fairy").all()
+        )
+        plan = self.plan(statement, parameters)
+
+        self.assertIn("USING INDEX ix_person_lname", plan)
+
+
+if __name__ == "__main__":
+    unittest.main()
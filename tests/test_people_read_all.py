@@ -0,0 +1,85 @@
+import unittest
+
+from flask import Flask, json
+from werkzeug.exceptions import BadRequest
+
+import people
+from config import db
+from models import Note, Person
+
+
+class TestReadAll(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        db.init_app(self.app)
+        self.ctx = self.app.test_request_context("/api/people")
+        self.ctx.push()
+        db.create_all()
+        for index in range(5):
+            person = Person(lname=f"Doe{index}", fname="John")
+            person.notes.append(Note(content=f"note {index}"))
+            db.session.add(person)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_first_page_links_to_next(self):
+        response = people.read_all(limit=2)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([person["id"] for person in response.json], [1, 2])
+        self.assertIn("after=2", response.headers["Link"])
+        self.assertIn('rel="next"', response.headers["Link"])
+
+    def test_last_page_has_no_link(self):
+        response = people.read_all(limit=2, after=4)
+
+        self.assertEqual([person["id"] for person in response.json], [5])
+        self.assertNotIn("Link", response.headers)
+
+    def test_exact_last_page_has_no_link(self):
+        response = people.read_all(limit=5)
+
+        self.assertEqual(len(response.json), 5)
+        self.assertNotIn("Link", response.headers)
+
+    def test_fields(self):
+        response = people.read_all(limit=1, fields=["id", "lname"])
+
+        self.assertEqual(response.json, [{"id": 1, "lname": "Doe0"}])
+
+    def test_unknown_field(self):
+        with self.assertRaises(BadRequest):
+            people.read_all(fields=["id", "password"])
+
+    def test_large_page_is_streamed(self):
+        response = people.read_all(limit=people.STREAM_THRESHOLD)
+
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.mimetype, "application/json")
+        data = json.loads(response.get_data())
+        self.assertEqual(data, people.read_all(limit=5).json)
+
+    def test_streamed_chunks(self):
+        chunk_size = people.STREAM_CHUNK_SIZE
+        people.STREAM_CHUNK_SIZE = 2
+        try:
+            response = people.read_all(
+                limit=people.STREAM_THRESHOLD, fields=["id"]
+            )
+            chunks = list(response.response)
+        finally:
+            people.STREAM_CHUNK_SIZE = chunk_size
+
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual(
+            json.loads(b"".join(chunks)), [{"id": i} for i in range(1, 6)]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
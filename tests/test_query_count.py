@@ -0,0 +1,105 @@
+import unittest
+
+from flask import Flask
+from sqlalchemy import event
+
+import people
+from config import db
+from models import Note, Person, load_notes, people_schema
+
+
+class TestQueryCount(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        db.init_app(self.app)
+        self.ctx = self.app.test_request_context("/api/people")
+        self.ctx.push()
+        db.create_all()
+        self.statements = []
+        event.listen(db.engine, "before_cursor_execute", self.count)
+
+    def tearDown(self):
+        event.remove(db.engine, "before_cursor_execute", self.count)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def count(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def add_people(self, count):
+        for index in range(count):
+            person = Person(lname=f"Doe{index}", fname="John")
+            person.notes.append(Note(content=f"first {index}"))
+            person.notes.append(Note(content=f"second {index}"))
+            db.session.add(person)
+        db.session.commit()
+        db.session.expunge_all()
+
+    def queries(self, callback):
+        self.statements.clear()
+        callback()
+        db.session.expunge_all()
+        return len(self.statements)
+
+    def test_people_schema_query_count_is_fixed(self):
+        for strategy, expected in (("selectin", 2), ("joined", 1)):
+            with self.subTest(strategy=strategy):
+                for count in (2, 20):
+                    self.add_people(count)
+
+                    queries = self.queries(
+                        lambda: people_schema.dump(
+                            Person.query.options(load_notes(strategy)).all()
+                        )
+                    )
+
+                    self.assertEqual(queries, expected)
+
+    def test_read_all_query_count_is_fixed(self):
+        self.add_people(2)
+        few = self.queries(lambda: people.read_all())
+        self.add_people(20)
+        many = self.queries(lambda: people.read_all())
+
+        self.assertEqual(few, many)
+
+    def test_read_all_without_notes(self):
+        self.add_people(5)
+        self.statements.clear()
+
+        data = people.read_all(include=[""]).json
+
+        self.assertNotIn("notes", data[0])
+        self.assertFalse(any("FROM note" in sql for sql in self.statements))
+
+    def test_read_one_query_count(self):
+        self.add_people(1)
+        self.app.config["NOTES_LOADING_STRATEGY"] = "joined"
+
+        queries = self.queries(lambda: people.read_one(1))
+
+        # One aggregate for the validators and one joined load.
+        self.assertEqual(queries, 2)
+
+    def test_delete_query_count_is_fixed(self):
+        connection = db.session.connection()
+        connection.exec_driver_sql("PRAGMA foreign_keys = ON")
+        for count in (1, 50):
+            person = Person(lname="Doe", fname="John")
+            person.notes = [Note(content=str(index)) for index in range(count)]
+            db.session.add(person)
+        db.session.commit()
+        db.session.expunge_all()
+
+        few = self.queries(lambda: people.delete(1))
+        many = self.queries(lambda: people.delete(2))
+
+        # The note IDs for the cache and one DELETE, cascaded by SQLite.
+        self.assertEqual((few, many), (2, 2))
+        self.assertEqual(Note.query.count(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from sqlalchemy import create_engine
+
+from cache import response_cache
+from config import db
+from flask_app import create_app
+from routing import WRITE_COOKIE, Replicas, copy_database
+
+
+class TestReplicas(unittest.TestCase):
+    def test_route(self):
+        replicas = Replicas(["a", "b"], window=5)
+
+        self.assertEqual(replicas.route("POST", None), (None, "write"))
+        self.assertEqual(
+            replicas.route("GET", time.time() - 1),
+            (None, "read_your_writes"),
+        )
+        self.assertEqual(
+            replicas.route("GET", time.time() - 10), ("a", "read")
+        )
+        self.assertEqual(replicas.route("HEAD", None), ("b", "read"))
+
+
+class TestReadRouting(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.primary = f"sqlite:///{Path(self.tmp.name) / 'people.db'}"
+        self.replica = Path(self.tmp.name) / "replica.db"
+        engine = create_engine(self.primary)
+        db.metadata.create_all(engine)
+        copy_database(engine, self.replica)
+        engine.dispose()
+        self.app = create_app(
+            {
+                "SQLALCHEMY_DATABASE_URI": self.primary,
+                "DATABASE_REPLICAS": [f"sqlite:///{self.replica}"],
+                "SLOW_QUERY_LOG": "",
+            }
+        ).app
+        self.writer = self.app.test_client()
+        self.reader = self.app.test_client()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.engine.dispose()
+            for engine in self.app.extensions["replicas"].engines:
+                engine.dispose()
+        self.tmp.cleanup()
+
+    def test_writers_read_their_writes(self):
+        response = self.writer.post("/api/people", json={"lname": "Doe"})
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(WRITE_COOKIE, response.headers["Set-Cookie"])
+
+        # The replica hasn't caught up.
+        self.assertEqual(self.reader.get("/api/people/1").status_code, 404)
+        self.assertEqual(self.reader.get("/api/people").json, [])
+        self.assertEqual(self.writer.get("/api/people/1").status_code, 200)
+
+        with self.app.app_context():
+            copy_database(db.engine, self.replica)
+        response = self.reader.get("/api/people/1")
+        self.assertEqual(response.json["lname"], "Doe")
+
+    def test_replica_reads_are_not_cached(self):
+        self.writer.post("/api/people", json={"lname": "Doe"})
+        with self.app.app_context():
+            copy_database(db.engine, self.replica)
+        self.writer.patch("/api/people/1", json={"lname": "Roe"})
+
+        self.assertEqual(self.reader.get("/api/people/1").json["lname"], "Doe")
+        self.assertEqual(self.writer.get("/api/people/1").json["lname"], "Roe")
+        with self.app.app_context():
+            self.assertEqual(response_cache().stats()["size"], 1)
+
+    def test_routes_are_counted(self):
+        self.writer.post("/api/people", json={"lname": "Doe"})
+        self.writer.get("/api/people")
+        self.reader.get("/api/people")
+
+        text = self.reader.get("/metrics").get_data(as_text=True)
+
+        for target, reason in (
+            ("primary", "write"),
+            ("primary", "read_your_writes"),
+            ("replica", "read"),
+        ):
+            self.assertIn(f'target="{target}",reason="{reason}"', text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+
+from flask import Flask
+
+import notes
+from config import db
+from migrations import add_note_search, rebuild_note_search
+from models import Note, Person
+
+
+class TestSearch(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        db.init_app(self.app)
+        self.ctx = self.app.test_request_context("/api/notes/search")
+        self.ctx.push()
+        db.create_all()
+        self.person = Person(lname="Fairy", fname="Tooth")
+        for content in (
+            "I brush my teeth after each meal.",
+            "Teeth, teeth and more teeth.",
+            "Do you pay per gram?",
+        ):
+            self.person.notes.append(Note(content=content))
+        db.session.add(self.person)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def search(self, q, **kwargs):
+        return [note["content"] for note in notes.search(q, **kwargs).json]
+
+    def test_ranked_results_with_snippets(self):
+        response = notes.search("teeth")
+
+        self.assertEqual(
+            [note["content"] for note in response.json],
+            [
+                "Teeth, teeth and more teeth.",
+                "I brush my teeth after each meal.",
+            ],
+        )
+        self.assertIn("<em>teeth</em>", response.json[1]["snippet"])
+        self.assertLess(response.json[0]["rank"], response.json[1]["rank"])
+
+    def test_snippets_escape_html(self):
+        self.person.notes.append(
+            Note(content="<img src=x onerror=alert(1)> & teeth")
+        )
+        db.session.commit()
+
+        response = notes.search("onerror")
+
+        self.assertEqual(
+            response.json[0]["snippet"],
+            "&lt;img src=x <em>onerror</em>=alert(1)&gt; &amp; teeth",
+        )
+
+    def test_stemming_and_prefixes(self):
+        self.assertEqual(self.search("brushing"), self.search("brush"))
+        self.assertEqual(self.search("gr*"), ["Do you pay per gram?"])
+
+    def test_pagination(self):
+        first = notes.search("teeth", limit=1)
+        second = notes.search("teeth", limit=1, offset=1)
+
+        self.assertIn("offset=1", first.headers["Link"])
+        self.assertNotIn("Link", second.headers)
+        self.assertEqual(
+            [first.json[0]["id"], second.json[0]["id"]],
+            [note["id"] for note in notes.search("teeth").json],
+        )
+
+    def test_query_syntax_is_matched_literally(self):
+        for q in ('"', "NEAR(", "teeth OR", "*", "-gram"):
+            with self.subTest(q=q):
+                self.assertEqual(notes.search(q).status_code, 200)
+
+    def test_index_follows_insert_update_and_delete(self):
+        note = Note(content="Flossing matters", person_id=self.person.id)
+        db.session.add(note)
+        db.session.commit()
+        self.assertEqual(self.search("floss*"), ["Flossing matters"])
+
+        note.content = "Mouthwash matters"
+        db.session.commit()
+        self.assertEqual(self.search("floss*"), [])
+        self.assertEqual(self.search("mouthwash"), ["Mouthwash matters"])
+
+        db.session.delete(note)
+        db.session.commit()
+        self.assertEqual(self.search("mouthwash"), [])
+
+    def test_index_follows_batch_create(self):
+        notes.create_batch(
+            [{"person_id": self.person.id, "content": "Batch of braces"}]
+        )
+
+        self.assertEqual(self.search("braces"), ["Batch of braces"])
+
+    def test_rebuild_existing_database(self):
+        connection = db.session.connection()
+        connection.exec_driver_sql("DROP TABLE note_fts")
+
+        add_note_search(connection)
+        rebuild_note_search(connection)
+
+        self.assertEqual(self.search("gram"), ["Do you pay per gram?"])
+
+
+if __name__ == "__main__":
+    unittest.main()
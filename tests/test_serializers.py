@@ -0,0 +1,121 @@
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from flask import Flask, json
+
+import serializers
+from config import db
+from models import Note, Person, PersonSchema, note_schema, people_schema
+from serializers import (
+    columns,
+    dump_note,
+    dump_people,
+    dump_person,
+    encode,
+    encode_items,
+)
+
+
+class TestSerializerParity(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+        fairy = Person(lname="Fairy", fname="Tooth")
+        fairy.notes.append(
+            Note(content="Do you pay per gram?", timestamp=datetime(2022, 3, 5))
+        )
+        fairy.notes.append(Note(content='Quotes " and \\ and \n newlines'))
+        bunny = Person(lname="Bünny", fname=None)
+        bunny.notes.append(Note(content="Ünïcode ✓"))
+        loner = Person(lname="Loner", fname="No notes")
+        db.session.add_all([fairy, bunny, loner])
+        db.session.add(Note(content="orphan", person_id=None))
+        db.session.commit()
+        db.session.expunge_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def assertSameBytes(self, fast, slow):
+        self.assertEqual(fast, slow)
+        self.assertEqual(encode(fast), encode(slow))
+        self.assertEqual(
+            encode(fast), (json.dumps(slow, indent=2) + "\n").encode()
+        )
+
+    def test_note(self):
+        for note in Note.query.all():
+            with self.subTest(note=note.id):
+                self.assertSameBytes(dump_note(note), note_schema.dump(note))
+
+    def test_note_with_null_timestamp(self):
+        note = Note(id=99, content="unsaved")
+
+        self.assertSameBytes(dump_note(note), note_schema.dump(note))
+
+    def test_person(self):
+        for person in Person.query.all():
+            with self.subTest(person=person.id):
+                self.assertSameBytes(
+                    dump_person(person), PersonSchema().dump(person)
+                )
+
+    def test_people(self):
+        people = Person.query.all()
+
+        self.assertSameBytes(dump_people(people), people_schema.dump(people))
+
+    def test_people_without_notes(self):
+        people = Person.query.all()
+        schema = PersonSchema(many=True, exclude=("notes",))
+
+        self.assertSameBytes(
+            dump_people(people, include=()), schema.dump(people)
+        )
+
+    def test_people_only(self):
+        people = Person.query.all()
+        for only in (["id"], ["lname", "timestamp"], ["notes", "fname"]):
+            with self.subTest(only=only):
+                schema = PersonSchema(many=True, only=only)
+                include = ("notes",) if "notes" in only else ()
+
+                self.assertSameBytes(
+                    dump_people(people, only=only, include=include),
+                    schema.dump(people),
+                )
+
+    def test_rows(self):
+        people = Person.query.all()
+        rows = db.session.query(
+            *(getattr(Person, name) for name in columns(Person))
+        ).all()
+        schema = PersonSchema(many=True, exclude=("notes",))
+
+        self.assertSameBytes(
+            dump_people(rows, include=()), schema.dump(people)
+        )
+
+    def test_encode_without_orjson(self):
+        people = people_schema.dump(Person.query.all())
+
+        with patch.object(serializers, "orjson", None):
+            self.assertEqual(
+                encode(people), (json.dumps(people, indent=2) + "\n").encode()
+            )
+            plain = encode_items(people)
+
+        self.assertEqual(json.loads(b"[" + plain + b"]"), people)
+        self.assertEqual(json.loads(b"[" + encode_items(people) + b"]"), people)
+
+
+if __name__ == "__main__":
+    unittest.main()
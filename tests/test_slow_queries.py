@@ -0,0 +1,86 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from sqlalchemy import create_engine, select
+
+import metrics
+import slow_queries
+from config import db
+from models import Note, Person
+
+
+class TestSlowQueryLog(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = create_engine(
+            f"sqlite:///{Path(self.tmp.name) / 'people.db'}"
+        )
+        db.metadata.create_all(self.engine)
+        self.path = Path(self.tmp.name) / "slow.log"
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    def attach(self, threshold=0.0, sample_rate=0.0):
+        log = slow_queries.file_logger(self.path, 1024 * 1024, 1)
+        self.addCleanup(log.handlers[0].close)
+        slow_queries.SlowQueryLog(log, threshold, sample_rate).attach(
+            self.engine
+        )
+
+    def entries(self):
+        with open(self.path) as file:
+            return [json.loads(line) for line in file]
+
+    def test_records_plan_on_first_occurrence(self):
+        self.attach()
+        statement = select(Note).where(Note.content == "x")
+        token = metrics.current_timings.set(metrics.Timings("notes.search"))
+        try:
+            with self.engine.connect() as connection:
+                connection.execute(statement).all()
+                connection.execute(statement).all()
+        finally:
+            metrics.current_timings.reset(token)
+
+        [entry] = self.entries()
+        self.assertEqual(entry["operation"], "notes.search")
+        self.assertEqual(entry["parameters"], ["str"])
+        self.assertTrue(entry["first"])
+        self.assertEqual(entry["scans"], ["SCAN note"])
+
+    def test_indexed_lookup_has_no_scans(self):
+        self.attach()
+
+        with self.engine.connect() as connection:
+            connection.execute(select(Person).where(Person.id == 1)).all()
+
+        [entry] = self.entries()
+        self.assertIsNone(entry["operation"])
+        self.assertEqual(entry["scans"], [])
+        self.assertTrue(entry["plan"][0].startswith("SEARCH person"))
+
+    def test_threshold(self):
+        self.attach(threshold=60.0)
+
+        with self.engine.connect() as connection:
+            connection.execute(select(Person)).all()
+
+        self.assertFalse(self.path.exists())
+
+    def test_parameter_shape(self):
+        self.assertEqual(
+            slow_queries.parameter_shape({"id": 1, "lname": None}),
+            {"id": "int", "lname": "NoneType"},
+        )
+        self.assertEqual(
+            slow_queries.parameter_shape([(1, "a"), (2, "b")], many=True),
+            {"rows": 2, "row": ["int", "str"]},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
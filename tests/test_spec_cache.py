@@ -0,0 +1,67 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import spec_cache
+from config import basedir
+
+
+class TestSpecCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.spec = Path(self.tmp.name) / "swagger.yml"
+        self.spec.write_text("openapi: 3.0.0\ninfo:\n  title: First\n")
+        self.artifact = Path(self.tmp.name) / "cache" / "swagger.json"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_compiles_and_reuses_artifact(self):
+        spec = spec_cache.load(self.spec, self.artifact)
+
+        self.assertEqual(spec["info"]["title"], "First")
+        compiled = json.loads(self.artifact.read_text())
+        self.assertEqual(compiled["spec"], spec)
+        # A matching artifact is used as is.
+        compiled["spec"]["info"]["title"] = "From artifact"
+        self.artifact.write_text(json.dumps(compiled))
+        self.assertEqual(
+            spec_cache.load(self.spec, self.artifact)["info"]["title"],
+            "From artifact",
+        )
+
+    def test_recompiles_when_yaml_changes(self):
+        spec_cache.load(self.spec, self.artifact)
+        self.spec.write_text("openapi: 3.0.0\ninfo:\n  title: Second\n")
+
+        spec = spec_cache.load(self.spec, self.artifact)
+
+        self.assertEqual(spec["info"]["title"], "Second")
+        compiled = json.loads(self.artifact.read_text())
+        self.assertEqual(compiled["spec"]["info"]["title"], "Second")
+
+    def test_corrupt_artifact_is_replaced(self):
+        self.artifact.parent.mkdir()
+        self.artifact.write_text("{")
+
+        spec = spec_cache.load(self.spec, self.artifact)
+
+        self.assertEqual(spec["info"]["title"], "First")
+        self.assertIn("source", json.loads(self.artifact.read_text()))
+
+    def test_without_artifact(self):
+        spec = spec_cache.load(self.spec, None)
+
+        self.assertEqual(spec["info"]["title"], "First")
+        self.assertFalse(self.artifact.exists())
+
+    def test_compiled_swagger_matches_yaml(self):
+        self.assertEqual(
+            spec_cache.compile_spec(basedir / "swagger.yml", self.artifact),
+            spec_cache.load(basedir / "swagger.yml"),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,261 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+
+import init_database
+import migrations
+from config import db
+from flask_app import create_app
+from init_database import outdated_tables, upgrade_database
+from models import Note, Person
+
+LEGACY_SCHEMA = [
+    """CREATE TABLE person (
+        id INTEGER NOT NULL PRIMARY KEY,
+        lname VARCHAR(32) NOT NULL,
+        timestamp DATETIME
+    )""",
+    """CREATE TABLE note (
+        id INTEGER NOT NULL PRIMARY KEY,
+        person_id INTEGER,
+        content VARCHAR,
+        timestamp DATETIME
+    )""",
+]
+
+
+class TestUpgradeDatabase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.app = Flask(__name__)
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = (
+            f"sqlite:///{os.path.join(self.tmpdir.name, 'people.db')}"
+        )
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        with db.engine.begin() as connection:
+            for statement in LEGACY_SCHEMA:
+                connection.exec_driver_sql(statement)
+            for index in range(1, 8):
+                connection.exec_driver_sql(
+                    "INSERT INTO person (id, lname, timestamp) "
+                    "VALUES (?, ?, '2022-01-01 00:00:00')",
+                    (index, f"Doe{index}"),
+                )
+                connection.exec_driver_sql(
+                    "INSERT INTO note (person_id, content) VALUES (?, ?)",
+                    (index, f"note {index}"),
+                )
+        self.messages = []
+
+    def tearDown(self):
+        db.session.remove()
+        db.engine.dispose()
+        self.ctx.pop()
+        self.tmpdir.cleanup()
+
+    def upgrade(self, **kwargs):
+        return upgrade_database(
+            db, chunk_size=3, progress=self.messages.append, **kwargs
+        )
+
+    def tables(self):
+        with db.engine.connect() as connection:
+            return {
+                name
+                for (name,) in connection.exec_driver_sql(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'"
+                )
+            }
+
+    def test_upgrade_keeps_data(self):
+        self.assertEqual(self.upgrade(), ["person", "note"])
+
+        self.assertEqual(outdated_tables(db), [])
+        self.assertEqual(Person.query.count(), 7)
+        self.assertEqual(Person.query.get(3).lname, "Doe3")
+        self.assertIsNone(Person.query.get(3).fname)
+        self.assertEqual(Person.query.get(3).notes[0].content, "note 3")
+        self.assertIn("person: copied 7 of 7 rows", self.messages)
+        self.assertIn("note: copied 3 of 7 rows", self.messages)
+        self.assertFalse(
+            {"person__new", "note__new", "upgrade_progress"} & self.tables()
+        )
+
+    def test_upgrade_of_current_schema_does_nothing(self):
+        self.upgrade()
+        self.messages.clear()
+
+        self.assertEqual(self.upgrade(), [])
+        self.assertEqual(self.messages, ["Database schema is up to date"])
+
+    def test_interrupted_upgrade_resumes(self):
+        with patch.object(
+            init_database, "swap_tables", side_effect=RuntimeError("crash")
+        ):
+            with self.assertRaises(RuntimeError):
+                self.upgrade()
+
+        with db.engine.connect() as connection:
+            columns = connection.exec_driver_sql("PRAGMA table_info(person)")
+            self.assertNotIn("fname", [row.name for row in columns])
+        self.assertIn("upgrade_progress", self.tables())
+
+        self.messages.clear()
+        self.upgrade()
+
+        self.assertFalse(
+            any(message.startswith("person:") for message in self.messages)
+        )
+        self.assertEqual(Person.query.count(), 7)
+        self.assertEqual(Note.query.count(), 7)
+
+    def test_writes_during_copy_are_kept(self):
+        copy_rows = init_database.copy_rows
+
+        def copy_and_write(engine, table, chunk_size, progress):
+            copy_rows(engine, table, chunk_size, progress)
+            if table.name == "person":
+                with engine.begin() as connection:
+                    connection.exec_driver_sql(
+                        "UPDATE person SET lname = 'Changed' WHERE id = 1"
+                    )
+                    connection.exec_driver_sql("DELETE FROM note WHERE id = 2")
+                    connection.exec_driver_sql(
+                        "INSERT INTO person (id, lname) VALUES (8, 'Late')"
+                    )
+
+        with patch.object(init_database, "copy_rows", copy_and_write):
+            self.upgrade()
+
+        self.assertEqual(Person.query.get(1).lname, "Changed")
+        self.assertEqual(Person.query.get(8).lname, "Late")
+        self.assertIsNone(Note.query.get(2))
+        self.assertEqual(Note.query.count(), 6)
+
+    def test_search_index_works_after_upgrade(self):
+        self.upgrade()
+
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql(
+                "INSERT INTO note_fts (note_fts) VALUES ('rebuild')"
+            )
+        db.session.add(Note(person_id=1, content="Fresh flossing"))
+        db.session.commit()
+
+        with db.engine.connect() as connection:
+            matches = connection.exec_driver_sql(
+                "SELECT rowid FROM note_fts WHERE note_fts MATCH 'floss*'"
+            ).all()
+        self.assertEqual(len(matches), 1)
+
+    def test_upgrade_of_migrated_database(self):
+        # The indexes and the search table of the migrations already exist,
+        # under the names the upgraded tables use.
+        migrations.upgrade(db.engine)
+
+        self.upgrade()
+
+        self.assertEqual(outdated_tables(db), [])
+        with db.engine.connect() as connection:
+            indexes = {
+                name
+                for (name,) in connection.exec_driver_sql(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' "
+                    "AND tbl_name = 'note'"
+                )
+            }
+            matches = connection.exec_driver_sql(
+                "SELECT rowid FROM note_fts WHERE note_fts MATCH 'note'"
+            ).all()
+        self.assertIn("ix_note_person_id_timestamp", indexes)
+        self.assertEqual(len(matches), 7)
+
+
+class TestDeleteAfterUpgrade(unittest.TestCase):
+    """A database from before ON DELETE CASCADE."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.uri = f"sqlite:///{os.path.join(self.tmpdir.name, 'people.db')}"
+        self.legacy = Flask(__name__)
+        self.legacy.config["SQLALCHEMY_DATABASE_URI"] = self.uri
+        db.init_app(self.legacy)
+        with self.legacy.app_context():
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql(
+                    "CREATE TABLE person (id INTEGER NOT NULL PRIMARY KEY, "
+                    "lname VARCHAR(32) NOT NULL, fname VARCHAR(32), "
+                    "timestamp DATETIME)"
+                )
+                connection.exec_driver_sql(
+                    "CREATE TABLE note (id INTEGER NOT NULL PRIMARY KEY, "
+                    "person_id INTEGER REFERENCES person (id), "
+                    "content VARCHAR NOT NULL, timestamp DATETIME)"
+                )
+                for index in range(1, 4):
+                    connection.exec_driver_sql(
+                        "INSERT INTO person (id, lname) VALUES (?, ?)",
+                        (index, f"Doe{index}"),
+                    )
+                    connection.exec_driver_sql(
+                        "INSERT INTO note (person_id, content) VALUES (?, ?)",
+                        (index, f"note {index}"),
+                    )
+        self.app = None
+
+    def tearDown(self):
+        if self.app is not None:
+            with self.app.app_context():
+                db.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def upgrade(self, rebuild):
+        """
+        Migrate the database, then rebuild its outdated tables if rebuild is
+        True, and create the app serving it.
+        """
+        with self.legacy.app_context():
+            migrations.upgrade(db.engine)
+            if rebuild:
+                upgrade_database(db, progress=lambda message: None)
+            db.engine.dispose()
+        self.app = create_app(
+            {"SQLALCHEMY_DATABASE_URI": self.uri, "SLOW_QUERY_LOG": ""}
+        ).app
+
+    def note_owners(self):
+        with self.app.app_context(), db.engine.connect() as connection:
+            return [
+                person_id
+                for (person_id,) in connection.exec_driver_sql(
+                    "SELECT person_id FROM note ORDER BY person_id"
+                )
+            ]
+
+    def test_deletes_cascade_after_migrations(self):
+        self.upgrade(rebuild=False)
+
+        self.check_deletes_cascade()
+
+    def test_deletes_cascade_after_upgrade(self):
+        self.upgrade(rebuild=True)
+
+        self.check_deletes_cascade()
+
+    def check_deletes_cascade(self):
+        client = self.app.test_client()
+
+        self.assertEqual(client.delete("/api/people/1").status_code, 200)
+        self.assertEqual(self.note_owners(), [2, 3])
+        response = client.post("/api/people:purge", json={"ids": [2]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.note_owners(), [3])
+
+
+if __name__ == "__main__":
+    unittest.main()
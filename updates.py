@@ -0,0 +1,50 @@
+from marshmallow import ValidationError
+from sqlalchemy import update
+
+from serializers import columns
+
+
+def load(schema, fields, partial):
+    """
+    Validate and deserialize the fields of a PUT or PATCH body.
+
+    Args:
+        schema: A schema created with ``load_instance=False`` and restricted
+            to the updatable fields, so that they are loaded as a plain dict.
+        fields: The raw request body.
+        partial: True to validate only the supplied fields, as PATCH does,
+            or False to require every field, as PUT does.
+
+    Returns:
+        A tuple of the loaded values, or None if the body is invalid, and
+        the error messages, or None if it is valid.
+    """
+    try:
+        return schema.load(fields, partial=partial), None
+    except ValidationError as error:
+        return None, error.messages
+
+
+def update_statement(model, row_id, values):
+    """
+    Build the UPDATE statement of a single row, returning its new columns.
+
+    The row is neither loaded before nor refreshed after the statement, and
+    the column defaults for updates, such as the timestamp, still apply. No
+    row is returned if the ID doesn't exist.
+
+    Args:
+        model: The SQLAlchemy model class to update.
+        row_id: The ID of the row to update.
+        values: A dict mapping column names to their new values.
+
+    Returns:
+        An update statement returning at most one row.
+    """
+    return (
+        update(model)
+        .where(model.id == row_id)
+        .values(values)
+        .returning(*(getattr(model, name) for name in columns(model)))
+        .execution_options(synchronize_session=False)
+    )